@@ -0,0 +1,1097 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Lightweight stand-ins for the Nexus, Quay and SonarQube APIs used by the
+devsecops-api wrappers, for benchmarking without real services.
+
+Every fake has configurable latency, error rate and dataset size. Injected
+errors are 503s with Retry-After: 0 that spare the health checks and the Quay
+landing page. Two control endpoints sit outside of the emulated API:
+
+    GET  /__fake__/stats    request counts, total and per route
+    POST /__fake__/reset    reseed state from a JSON body with any of
+                            size, latency and error_rate, and for Nexus
+                            scripting
+
+Run this module directly to start all three fakes on fixed ports.
+"""
+
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from urllib.parse import urlsplit, parse_qs
+from base64 import b64decode
+from email.parser import BytesParser
+from fnmatch import fnmatchcase
+from typing import Callable, Tuple
+import argparse
+import email.policy
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import uuid
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 128
+
+
+class Request(object):
+    """
+    What a route handler gets to see of an incoming request
+    """
+
+    def __init__(self, method: str, path: str, query: dict, headers,
+                 body: bytes, match) -> None:
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+        self.match = match
+
+    def arg(self, name: str, default: str = None) -> str:
+        return self.query.get(name, [default])[0]
+
+    def json(self):
+        return json.loads(self.body.decode('utf-8') or 'null')
+
+    def form(self) -> dict:
+        """
+        Returns the fields of a multipart/form-data body, by name, as
+        (value, filename) with value in bytes
+        """
+        message = BytesParser(policy=email.policy.HTTP).parsebytes(
+            f'Content-Type: {self.headers.get("Content-Type")}\r\n\r\n'
+            .encode('utf-8') + self.body
+        )
+        return {part.get_param('name', header='content-disposition'):
+                (part.get_payload(decode=True), part.get_filename())
+                for part in message.iter_parts()}
+
+    def cookie(self, name: str) -> str:
+        for part in (self.headers.get('Cookie') or '').split(';'):
+            key, _, value = part.strip().partition('=')
+            if key == name:
+                return value
+        return None
+
+    def basic_auth(self) -> Tuple[str, str]:
+        value = self.headers.get('Authorization') or ''
+        if not value.startswith('Basic '):
+            return (None, None)
+        username, _, password = b64decode(value[6:]).decode().partition(':')
+        return (username, password)
+
+
+class FakeService(object):
+    """
+    Base class for a fake API server. Subclasses register routes as
+    (method, path regex, handler) and seed their dataset in reset().
+    """
+    name = 'fake'
+
+    def __init__(self, latency: float = 0.0, error_rate: float = 0.0,
+                 size: int = 0, seed: int = 0) -> None:
+        self.routes = []
+        self.lock = threading.RLock()
+        self.random = random.Random(seed)
+        self.server = None
+        self.reset(size=size, latency=latency, error_rate=error_rate)
+
+    def route(self, method: str, pattern: str, handler: Callable,
+              flaky: bool = True) -> None:
+        """
+        Register a handler, which error injection leaves alone unless flaky
+        """
+        self.routes.append((method, re.compile(f'^{pattern}$'), handler,
+                            flaky))
+
+    def reset(self, size: int = None, latency: float = None,
+              error_rate: float = None) -> None:
+        with self.lock:
+            if size is not None:
+                self.size = size
+            if latency is not None:
+                self.latency = latency
+            if error_rate is not None:
+                self.error_rate = error_rate
+            self.requests = 0
+            self.by_route = {}
+            self.seed()
+
+    def seed(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {'requests': self.requests,
+                    'by_route': dict(self.by_route)}
+
+    def dispatch(self, request: Request) -> tuple:
+        if request.path == '/__fake__/stats':
+            return 200, self.stats()
+        if request.path == '/__fake__/reset':
+            self.reset(**(request.json() or {}))
+            return 200, self.stats()
+        for method, pattern, handler, flaky in self.routes:
+            match = pattern.match(request.path)
+            if match and method == request.method:
+                with self.lock:
+                    self.requests += 1
+                    key = f'{method} {pattern.pattern[1:-1]}'
+                    self.by_route[key] = self.by_route.get(key, 0) + 1
+                    fail = flaky and self.random.random() < self.error_rate
+                if self.latency:
+                    time.sleep(self.latency)
+                if fail:
+                    return 503, {'error_message': 'injected failure'}, {
+                        'Retry-After': '0'
+                    }
+                request.match = match
+                return handler(request)
+        with self.lock:
+            self.requests += 1
+        return 404, {'error_message': f'no route for {request.path}'}
+
+    def handler_class(self) -> type:
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args) -> None:
+                pass
+
+            def handle_any(self) -> None:
+                length = int(self.headers.get('Content-Length') or 0)
+                if self.headers.get('Transfer-Encoding') == 'chunked':
+                    body = self.read_chunked()
+                else:
+                    body = self.rfile.read(length) if length else b''
+                parts = urlsplit(self.path)
+                request = Request(self.command, parts.path,
+                                  parse_qs(parts.query), self.headers, body,
+                                  None)
+                result = service.dispatch(request)
+                status, payload = result[0], result[1]
+                headers = result[2] if len(result) > 2 else {}
+                if isinstance(payload, (dict, list)):
+                    payload = json.dumps(payload).encode('utf-8')
+                    headers.setdefault('Content-Type', 'application/json')
+                elif isinstance(payload, str):
+                    payload = payload.encode('utf-8')
+                elif payload is None:
+                    payload = b''
+                self.send_response(status)
+                for key, value in headers.items():
+                    if isinstance(value, list):
+                        for item in value:
+                            self.send_header(key, item)
+                    else:
+                        self.send_header(key, value)
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                if self.command != 'HEAD':
+                    try:
+                        self.wfile.write(payload)
+                    except (BrokenPipeError, ConnectionResetError):
+                        # Clients may stop reading once they have what
+                        # they need
+                        self.close_connection = True
+
+            def read_chunked(self) -> bytes:
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().split(b';')[0], 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        return b''.join(chunks)
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = handle_any
+
+        return Handler
+
+    def start(self, host: str = '127.0.0.1', port: int = 0) -> str:
+        """
+        Serve on a background thread, returning the base URL
+        """
+        self.server = Server((host, port), self.handler_class())
+        thread = threading.Thread(target=self.server.serve_forever,
+                                  daemon=True)
+        thread.start()
+        return f'http://{host}:{self.server.server_port}'
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def asset_content(path: str) -> bytes:
+    """
+    The content of a fake asset, derived from its path so it never has to be
+    stored
+    """
+    line = f'{path}\n'.encode()
+    return line * (1 + len(path) % 7 * 16)
+
+
+def error(status: int, message: str) -> tuple:
+    return status, {'error_message': message, 'message': message}
+
+
+BATCH_REPOS = {
+    'add_repo': ('maven2', 'hosted'),
+    'add_proxy_repo': ('maven2', 'proxy'),
+    'add_raw_repo': ('raw', 'hosted'),
+    'add_docker_repo': ('docker', 'hosted'),
+    'add_npm_repo': ('npm', 'hosted')
+}
+
+
+class FakeNexus(FakeService):
+    """
+    Nexus 3 REST API under /service/rest
+    """
+    name = 'nexus'
+
+    def __init__(self, scripting: bool = True, page_size: int = 10,
+                 **kwargs) -> None:
+        self.scripting = scripting
+        self.page_size = page_size
+        super().__init__(**kwargs)
+        rest = '/service/rest'
+        self.route('GET', f'{rest}/v1/status', lambda r: (200, ''),
+                   flaky=False)
+        self.route('POST', f'{rest}/wonderland/authenticate',
+                   lambda r: (200, {'t': uuid.uuid4().hex}))
+        self.route('GET', f'{rest}/(beta|v1)/security/users',
+                   self.list_users)
+        self.route('POST', f'{rest}/(beta|v1)/security/users',
+                   self.add_user)
+        self.route('PUT', f'{rest}/(beta|v1)/security/users/([^/]+)',
+                   self.update_user)
+        self.route('GET', f'{rest}/v1/security/roles', self.list_roles)
+        self.route('POST', f'{rest}/v1/security/roles', self.add_role)
+        self.route('GET', f'{rest}/v1/security/roles/([^/]+)', self.get_role)
+        self.route('PUT', f'{rest}/v1/security/roles/([^/]+)',
+                   self.update_role)
+        self.route('GET', f'{rest}/(beta|v1)/repositories', self.list_repos)
+        self.route('GET', f'{rest}/v1/repositories/([^/]+)/group/([^/]+)',
+                   self.get_group)
+        self.route('POST', f'{rest}/(beta|v1)/repositories/([^/]+)/([^/]+)',
+                   self.add_repo)
+        self.route('PUT',
+                   f'{rest}/(beta|v1)/repositories/([^/]+)/([^/]+)/([^/]+)',
+                   self.update_repo)
+        self.route('GET', f'{rest}/v1/components', self.list_components)
+        self.route('POST', f'{rest}/v1/components', self.add_component)
+        self.route('GET', f'{rest}/v1/assets', self.list_assets)
+        self.route('GET', f'{rest}/v1/search', self.search_components)
+        self.route('GET', f'{rest}/v1/search/assets', self.search_assets)
+        self.route('POST', f'{rest}/v1/script', self.add_script)
+        self.route('GET', '/repository/([^/]+)/(.+)', self.get_content)
+        self.route('GET', f'{rest}/v1/script/([^/]+)', self.get_script)
+        self.route('PUT', f'{rest}/v1/script/([^/]+)', self.update_script)
+        self.route('POST', f'{rest}/v1/script/([^/]+)/run', self.run_script)
+
+    def reset(self, scripting: bool = None, **kwargs) -> None:
+        if scripting is not None:
+            self.scripting = scripting
+        super().reset(**kwargs)
+
+    def seed(self) -> None:
+        self.users = {}
+        self.roles = {}
+        self.repos = {}
+        self.scripts = {'seeded': {'name': 'seeded', 'type': 'groovy',
+                                   'content': 'return true'}}
+        for role_id in ['nx-admin', 'nx-anonymous']:
+            self.roles[role_id] = self.role(role_id)
+        self.repos['maven-public'] = self.repo('maven-public', 'maven2',
+                                               'group')
+        self.repos['maven-public']['group'] = {'memberNames': []}
+        self.repos['maven-releases'] = self.repo('maven-releases', 'maven2',
+                                                 'hosted')
+        self.repos['raw-hosted'] = self.repo('raw-hosted', 'raw', 'hosted')
+        self.components = {'maven-releases': []}
+        self.blobs = {}
+        self.paths = set()
+        for i in range(self.size):
+            user_id = f'user{i:05d}'
+            self.users[user_id] = {
+                'userId': user_id, 'firstName': user_id, 'lastName': user_id,
+                'emailAddress': f'{user_id}@example.com', 'source': 'default',
+                'status': 'active', 'readOnly': False,
+                'roles': ['nx-anonymous'], 'externalRoles': []
+            }
+            self.roles[f'role{i:05d}'] = self.role(f'role{i:05d}')
+            name = f'repo{i:05d}-releases'
+            self.repos[name] = self.repo(name, 'maven2', 'hosted')
+            self.components['maven-releases'].append(self.component(
+                'maven-releases', 'org.example', f'artifact{i:05d}',
+                f'1.0.{i % 10}'
+            ))
+        self.paths.update((component['repository'], asset['path'])
+                          for component in self.components['maven-releases']
+                          for asset in component['assets'])
+
+    @staticmethod
+    def role(role_id: str, privileges: list = []) -> dict:
+        return {'id': role_id, 'source': 'default', 'name': role_id,
+                'description': role_id, 'privileges': list(privileges),
+                'roles': []}
+
+    @staticmethod
+    def asset(repository: str, repo_format: str, path: str,
+              content: bytes) -> dict:
+        return {
+            'id': uuid.uuid5(uuid.NAMESPACE_URL, f'{repository}/{path}').hex,
+            'repository': repository, 'format': repo_format, 'path': path,
+            'contentType': 'application/octet-stream',
+            'checksum': {
+                'sha1': hashlib.sha1(content).hexdigest(),
+                'sha256': hashlib.sha256(content).hexdigest(),
+                'md5': hashlib.md5(content).hexdigest()
+            },
+            'fileSize': len(content),
+            'lastModified': '2024-01-01T00:00:00.000+00:00'
+        }
+
+    def component(self, repository: str, group: str, name: str,
+                  version: str) -> dict:
+        directory = f'{group.replace(".", "/")}/{name}/{version}'
+        assets = []
+        for extension in ['jar', 'pom']:
+            path = f'{directory}/{name}-{version}.{extension}'
+            assets.append(self.asset(repository, 'maven2', path,
+                                     asset_content(path)))
+        return {'id': uuid.uuid5(uuid.NAMESPACE_URL,
+                                 f'{repository}/{directory}').hex,
+                'repository': repository, 'format': 'maven2', 'group': group,
+                'name': name, 'version': version, 'assets': assets}
+
+    def add_component(self, request: Request) -> tuple:
+        repository = request.arg('repository')
+        form = {name: (value.decode('utf-8') if filename is None else value)
+                for name, (value, filename) in request.form().items()}
+        with self.lock:
+            repo = self.repos.get(repository)
+            if repo is None:
+                return error(404, 'Repository not found')
+            if repo['format'] == 'raw':
+                directory = form['raw.directory'].strip('/')
+                name = f'{directory}/{form["raw.asset1.filename"]}' \
+                    .lstrip('/')
+                coordinates = ('/' + directory, name, None)
+                path, content = name, form['raw.asset1']
+            elif repo['format'] == 'maven2':
+                coordinates = (form['maven2.groupId'],
+                               form['maven2.artifactId'],
+                               form['maven2.version'])
+                classifier = form.get('maven2.asset1.classifier')
+                suffix = f'-{classifier}' if classifier else ''
+                group, name, version = coordinates
+                path = (f'{group.replace(".", "/")}/{name}/{version}/'
+                        f'{name}-{version}{suffix}.'
+                        f'{form["maven2.asset1.extension"]}')
+                content = form['maven2.asset1']
+            else:
+                return error(400, f'Uploading {repo["format"]} components '
+                                  'is not supported')
+            components = self.components.setdefault(repository, [])
+            for component in components:
+                if (component['group'], component['name'],
+                        component['version']) == coordinates:
+                    break
+            else:
+                group, name, version = coordinates
+                component = {
+                    'id': uuid.uuid5(uuid.NAMESPACE_URL,
+                                     f'{repository}/{group}/{name}/'
+                                     f'{version}').hex,
+                    'repository': repository, 'format': repo['format'],
+                    'group': group, 'name': name, 'version': version,
+                    'assets': []
+                }
+                components.append(component)
+            component['assets'] = [asset for asset in component['assets']
+                                   if asset['path'] != path]
+            component['assets'].append(self.asset(repository, repo['format'],
+                                                  path, content))
+            self.paths.add((repository, path))
+            self.blobs[(repository, path)] = content
+        return 204, None
+
+    def with_url(self, request: Request, asset: dict) -> dict:
+        host = request.headers.get('Host', 'localhost')
+        return dict(asset, downloadUrl=(f'http://{host}/repository/'
+                                        f'{asset["repository"]}/'
+                                        f'{asset["path"]}'))
+
+    def page(self, request: Request, components: list,
+             match: Callable = None, assets: bool = False) -> tuple:
+        """
+        Returns a page of the components, or their assets, that match. The
+        continuationToken is the position to carry on from, as the component
+        index and the asset index within it.
+        """
+        token = request.arg('continuationToken')
+        i, j = [int(part, 16) for part in token.split('.')] if token \
+            else [0, 0]
+        items = []
+        while i < len(components) and len(items) < self.page_size:
+            component = components[i]
+            if match is None or match(component):
+                if not assets:
+                    items.append(dict(component, assets=[
+                        self.with_url(request, asset)
+                        for asset in component['assets']
+                    ]))
+                else:
+                    taken = component['assets'][j:j + self.page_size -
+                                                len(items)]
+                    items.extend(self.with_url(request, asset)
+                                 for asset in taken)
+                    j += len(taken)
+                    if j < len(component['assets']):
+                        break
+            i, j = i + 1, 0
+        more = i < len(components)
+        return 200, {'items': items,
+                     'continuationToken': f'{i:x}.{j:x}' if more else None}
+
+    def in_repository(self, request: Request) -> list:
+        repository = request.arg('repository')
+        with self.lock:
+            return [component
+                    for name, components in sorted(self.components.items())
+                    if repository in (None, name)
+                    for component in components]
+
+    @staticmethod
+    def matcher(request: Request) -> Callable:
+        patterns = [(key, request.arg(key))
+                    for key in ['format', 'group', 'name', 'version']]
+        keyword = request.arg('q')
+
+        def match(component: dict) -> bool:
+            return all(pattern is None or
+                       fnmatchcase(component[key] or '', pattern)
+                       for key, pattern in patterns) and \
+                (keyword is None or
+                 keyword in f'{component["group"]} {component["name"]}')
+        return match
+
+    def list_components(self, request: Request) -> tuple:
+        if request.arg('repository') not in self.repos:
+            return error(404, 'Repository not found')
+        return self.page(request, self.in_repository(request))
+
+    def list_assets(self, request: Request) -> tuple:
+        if request.arg('repository') not in self.repos:
+            return error(404, 'Repository not found')
+        return self.page(request, self.in_repository(request), assets=True)
+
+    def search_components(self, request: Request) -> tuple:
+        return self.page(request, self.in_repository(request),
+                         self.matcher(request))
+
+    def search_assets(self, request: Request) -> tuple:
+        return self.page(request, self.in_repository(request),
+                         self.matcher(request), assets=True)
+
+    def repo(self, name: str, repo_format: str, repo_type: str) -> dict:
+        url = f'http://localhost/repository/{name}'
+        return {'name': name, 'format': repo_format, 'type': repo_type,
+                'url': url, 'attributes': {}}
+
+    def list_users(self, request: Request) -> tuple:
+        prefix = request.arg('userId', '')
+        source = request.arg('source')
+        with self.lock:
+            users = [user for user_id, user in sorted(self.users.items())
+                     if user_id.startswith(prefix) and
+                     (source is None or user['source'] == source)]
+        return 200, users
+
+    def add_user(self, request: Request) -> tuple:
+        user = request.json()
+        with self.lock:
+            if user['userId'] in self.users:
+                return error(400, f'User {user["userId"]} already exists')
+            user = dict(user, source='default', readOnly=False,
+                        externalRoles=[])
+            user.pop('password', None)
+            self.users[user['userId']] = user
+        return 200, user
+
+    def update_user(self, request: Request) -> tuple:
+        user_id = request.match.group(2)
+        with self.lock:
+            if user_id not in self.users:
+                return error(404, f'User {user_id} not found')
+            self.users[user_id] = dict(self.users[user_id], **request.json())
+        return 204, None
+
+    def list_roles(self, request: Request) -> tuple:
+        source = request.arg('source')
+        with self.lock:
+            return 200, [role for _, role in sorted(self.roles.items())
+                         if source is None or role['source'] == source]
+
+    def get_role(self, request: Request) -> tuple:
+        with self.lock:
+            role = self.roles.get(request.match.group(1))
+        if role is None:
+            return error(404, 'Role not found')
+        return 200, role
+
+    def add_role(self, request: Request) -> tuple:
+        role = request.json()
+        with self.lock:
+            if role['id'] in self.roles:
+                return error(400, f'Role {role["id"]} already exists')
+            self.roles[role['id']] = dict(role, source='default')
+        return 200, self.roles[role['id']]
+
+    def update_role(self, request: Request) -> tuple:
+        role_id = request.match.group(1)
+        with self.lock:
+            if role_id not in self.roles:
+                return error(404, 'Role not found')
+            self.roles[role_id] = dict(request.json(), source='default')
+        return 204, None
+
+    def list_repos(self, request: Request) -> tuple:
+        with self.lock:
+            return 200, [{key: value for key, value in repo.items()
+                          if key != 'group'}
+                         for _, repo in sorted(self.repos.items())]
+
+    def get_group(self, request: Request) -> tuple:
+        with self.lock:
+            repo = self.repos.get(request.match.group(2))
+        if repo is None or repo['type'] != 'group':
+            return error(404, 'Repository not found')
+        return 200, repo
+
+    def add_repo(self, request: Request) -> tuple:
+        repo_format, repo_type = request.match.group(2, 3)
+        data = request.json()
+        name = data['name']
+        with self.lock:
+            if name in self.repos:
+                return error(400, f'Repository {name} already exists')
+            self.repos[name] = self.repo(
+                name, 'maven2' if repo_format == 'maven' else repo_format,
+                repo_type
+            )
+            if 'group' in data:
+                self.repos[name]['group'] = data['group']
+        return 201, None
+
+    def update_repo(self, request: Request) -> tuple:
+        name = request.match.group(4)
+        data = request.json()
+        with self.lock:
+            if name not in self.repos:
+                return error(404, f'Repository {name} not found')
+            if 'group' in data:
+                self.repos[name]['group'] = data['group']
+        return 204, None
+
+    def get_content(self, request: Request) -> tuple:
+        key = request.match.group(1, 2)
+        with self.lock:
+            if key not in self.paths:
+                return error(404, 'Not found')
+            content = self.blobs.get(key) or asset_content(key[1])
+        ranged = re.match(r'bytes=(\d+)-$', request.headers.get('Range') or '')
+        if ranged is None:
+            return 200, content
+        start = int(ranged.group(1))
+        if start >= len(content):
+            return 416, None, {'Content-Range': f'bytes */{len(content)}'}
+        return 206, content[start:], {
+            'Content-Range': f'bytes {start}-{len(content) - 1}/'
+                             f'{len(content)}'
+        }
+
+    def add_script(self, request: Request) -> tuple:
+        if not self.scripting:
+            return error(410, 'Creating and updating scripts is disabled')
+        script = request.json()
+        with self.lock:
+            self.scripts[script['name']] = script
+        return 204, None
+
+    def get_script(self, request: Request) -> tuple:
+        with self.lock:
+            script = self.scripts.get(request.match.group(1))
+        if script is None:
+            return error(404, 'Script not found')
+        return 200, script
+
+    def update_script(self, request: Request) -> tuple:
+        if not self.scripting:
+            return error(410, 'Creating and updating scripts is disabled')
+        with self.lock:
+            self.scripts[request.match.group(1)] = request.json()
+        return 204, None
+
+    def run_script(self, request: Request) -> tuple:
+        name = request.match.group(1)
+        with self.lock:
+            if name not in self.scripts:
+                return error(404, 'Script not found')
+        if not name.startswith('devsecops-batch-'):
+            return 200, {'name': name, 'result': 'null'}
+        # Carry out the operations of the library's batch script
+        results = []
+        for operation in json.loads(request.body.decode('utf-8')):
+            with self.lock:
+                results.append(self.batch_operation(operation['method'],
+                                                    operation['args']))
+        return 200, {'name': name, 'result': json.dumps(results)}
+
+    def batch_operation(self, method: str, args: dict) -> dict:
+        if method == 'add_user':
+            if args['username'] in self.users:
+                return {'ok': False, 'error': 'User already exists'}
+            user_id = args['username']
+            self.users[user_id] = {
+                'userId': user_id, 'firstName': user_id,
+                'lastName': user_id,
+                'emailAddress': f'{user_id}@example.com',
+                'source': 'default', 'status': 'active', 'readOnly': False,
+                'roles': list(args['roles']), 'externalRoles': []
+            }
+        elif method == 'add_role':
+            if args['roleid'] in self.roles:
+                return {'ok': False, 'error': 'Role already exists'}
+            self.roles[args['roleid']] = self.role(args['roleid'],
+                                                   args['privileges'])
+        elif method in BATCH_REPOS:
+            if args['reponame'] in self.repos:
+                return {'ok': False, 'error': 'Repository already exists'}
+            self.repos[args['reponame']] = self.repo(args['reponame'],
+                                                     *BATCH_REPOS[method])
+        else:
+            return {'ok': False, 'error': f'Unsupported operation {method}'}
+        return {'ok': True}
+
+
+class FakeQuay(FakeService):
+    """
+    Quay web UI landing page and API under /api/v1, with cookie sessions and
+    CSRF tokens rotated through X-Next-CSRF-Token on every API response.
+    With strict_csrf, only the most recently issued token is accepted. OAuth
+    tokens minted through oauth/authorizeapp for an application's client_id
+    authorize API requests as bearer tokens, with no session or CSRF token.
+    """
+    name = 'quay'
+
+    def __init__(self, strict_csrf: bool = False, page_size: int = 65536,
+                 **kwargs) -> None:
+        self.strict_csrf = strict_csrf
+        self.page_size = page_size
+        super().__init__(**kwargs)
+        api = '/api/v1'
+        self.route('GET', '/', self.landing_page, flaky=False)
+        self.route('GET', '/health/instance',
+                   lambda r: (200, {'data': {'services': {}},
+                                    'status_code': 200}), flaky=False)
+        self.route('POST', '/oauth/authorizeapp', self.authorize_app)
+        self.route('POST', f'{api}/signin', self.api(self.signin))
+        self.route('POST', f'{api}/signout', self.api(self.signout))
+        self.route('GET', f'{api}/user/', self.api(self.current_user))
+        self.route('POST', f'{api}/user', self.api(self.add_user))
+        self.route('GET', f'{api}/users/([^/]+)', self.api(self.get_user))
+        self.route('POST', f'{api}/organization', self.api(self.add_org))
+        self.route('GET', f'{api}/organization/([^/]+)',
+                   self.api(self.get_org))
+        self.route('POST', f'{api}/organization/([^/]+)/applications',
+                   self.api(self.add_app))
+        self.route('GET', f'{api}/repository', self.api(self.list_repos))
+        self.route('POST', f'{api}/repository', self.api(self.add_repo))
+        self.route('GET', f'{api}/organization/([^/]+)/robots',
+                   self.api(self.list_robots))
+        self.route('GET', f'{api}/organization/([^/]+)/robots/([^/]+)',
+                   self.api(self.get_robot))
+        self.route('PUT', f'{api}/organization/([^/]+)/robots/([^/]+)',
+                   self.api(self.add_robot))
+        self.route('GET',
+                   f'{api}/repository/([^/]+)/([^/]+)/permissions/user/',
+                   self.api(self.list_permissions))
+        self.route('PUT',
+                   f'{api}/repository/([^/]+)/([^/]+)/permissions/user/'
+                   '([^/]+)', self.api(self.set_permission))
+
+    def seed(self) -> None:
+        self.sessions = {}
+        self.users = {}
+        self.orgs = {}
+        self.tokens = {}
+        for i in range(self.size):
+            self.users[f'user{i:05d}'] = {'username': f'user{i:05d}'}
+            org = f'org{i:05d}'
+            self.orgs[org] = {'repos': {}, 'robots': {}, 'apps': {}}
+            self.orgs[org]['repos'][f'repo{i:05d}'] = {
+                'namespace': org, 'name': f'repo{i:05d}', 'is_public': True
+            }
+
+    def session(self, request: Request) -> Tuple[str, dict, dict]:
+        """
+        Returns the session id, session state and any Set-Cookie headers
+        """
+        with self.lock:
+            session_id = request.cookie('_csrf_session')
+            if session_id not in self.sessions:
+                session_id = uuid.uuid4().hex
+                self.sessions[session_id] = {'user': None, 'tokens': []}
+                return session_id, self.sessions[session_id], {
+                    'Set-Cookie': f'_csrf_session={session_id}; Path=/'
+                }
+            return session_id, self.sessions[session_id], {}
+
+    def issue_token(self, session: dict) -> str:
+        token = uuid.uuid4().hex
+        with self.lock:
+            session['tokens'] = (session['tokens'] + [token])[-16:]
+        return token
+
+    def landing_page(self, request: Request) -> tuple:
+        _, session, headers = self.session(request)
+        token = self.issue_token(session)
+        filler = '<!-- ' + 'x' * self.page_size + ' -->\n'
+        page = ('<html>\n<head>\n' + filler +
+                f"<script>window.__token = '{token}';</script>\n" +
+                filler + '</head>\n<body></body>\n</html>\n')
+        return 200, page, dict(headers, **{'Content-Type': 'text/html'})
+
+    def api(self, handler: Callable) -> Callable:
+        """
+        Wrap an API handler with session and CSRF token handling
+        """
+        def wrapped(request: Request) -> tuple:
+            bearer = (request.headers.get('Authorization') or '')
+            if bearer.startswith('Bearer '):
+                with self.lock:
+                    user = self.tokens.get(bearer[7:])
+                if user is None:
+                    return 401, {'message': 'Invalid token'}
+                return handler(request, {'user': user, 'tokens': []})
+            _, session, headers = self.session(request)
+            if request.method != 'GET':
+                token = request.headers.get('X-CSRF-Token')
+                with self.lock:
+                    valid = session['tokens'][-1:] if self.strict_csrf \
+                        else session['tokens']
+                if token not in valid:
+                    return 403, {'message': 'CSRF token was invalid or '
+                                            'missing.'}
+            result = handler(request, session)
+            result_headers = result[2] if len(result) > 2 else {}
+            result_headers.update(headers)
+            result_headers['X-Next-CSRF-Token'] = self.issue_token(session)
+            return result[0], result[1], result_headers
+        return wrapped
+
+    def authorize_app(self, request: Request) -> tuple:
+        _, session, headers = self.session(request)
+        form = {key: values[0] for key, values in
+                parse_qs(request.body.decode('utf-8')).items()}
+        with self.lock:
+            valid = session['tokens'][-1:] if self.strict_csrf \
+                else session['tokens']
+            apps = [app for org in self.orgs.values()
+                    for app in org['apps']]
+        if session['user'] is None or form.get('_csrf_token') not in valid:
+            return 403, {'message': 'Forbidden'}
+        if form.get('client_id') not in apps:
+            location = f'{form.get("redirect_uri")}#error=unauthorized_client'
+        else:
+            token = uuid.uuid4().hex
+            with self.lock:
+                self.tokens[token] = session['user']
+            location = (f'{form.get("redirect_uri")}#access_token={token}'
+                        '&token_type=Bearer&expires_in=315576000')
+        return 302, '', dict(headers, Location=location)
+
+    def signin(self, request: Request, session: dict) -> tuple:
+        session['user'] = request.json()['username']
+        return 200, {'success': True}
+
+    def signout(self, request: Request, session: dict) -> tuple:
+        session['user'] = None
+        return 200, {'success': True}
+
+    def current_user(self, request: Request, session: dict) -> tuple:
+        if session['user'] is None:
+            return 401, {'message': 'Unauthorized'}
+        return 200, {'username': session['user']}
+
+    def add_user(self, request: Request, session: dict) -> tuple:
+        username = request.json()['username']
+        with self.lock:
+            if username in self.users:
+                return error(400, 'The username already exists')
+            self.users[username] = {'username': username}
+        return 200, {'username': username}
+
+    def get_user(self, request: Request, session: dict) -> tuple:
+        username = request.match.group(1)
+        with self.lock:
+            if username not in self.users:
+                return error(404, 'Not Found')
+        return 200, {'username': username, 'is_org': False}
+
+    def add_org(self, request: Request, session: dict) -> tuple:
+        name = request.json()['name']
+        with self.lock:
+            if name in self.orgs or name in self.users:
+                return error(400, 'A user or organization with this name '
+                                  'already exists')
+            self.orgs[name] = {'repos': {}, 'robots': {}, 'apps': {}}
+        return 201, 'Created'
+
+    def org(self, name: str) -> dict:
+        with self.lock:
+            return self.orgs.get(name)
+
+    def get_org(self, request: Request, session: dict) -> tuple:
+        name = request.match.group(1)
+        if self.org(name) is None:
+            return error(404, 'Not Found')
+        return 200, {'name': name, 'email': f'{name}@example.com',
+                     'is_admin': True}
+
+    def add_app(self, request: Request, session: dict) -> tuple:
+        org = self.org(request.match.group(1))
+        if org is None:
+            return error(404, 'Not Found')
+        app = dict(request.json(), client_id=uuid.uuid4().hex.upper()[:20],
+                   client_secret=uuid.uuid4().hex.upper())
+        with self.lock:
+            org['apps'][app['client_id']] = app
+        return 200, app
+
+    def list_repos(self, request: Request, session: dict) -> tuple:
+        namespace = request.arg('namespace')
+        with self.lock:
+            orgs = [namespace] if namespace else sorted(self.orgs)
+            repos = [repo for name in orgs if name in self.orgs
+                     for _, repo in sorted(self.orgs[name]['repos'].items())]
+        page = int(request.arg('next_page') or 0)
+        body = {'repositories': repos[page * 100:(page + 1) * 100]}
+        if (page + 1) * 100 < len(repos):
+            body['next_page'] = str(page + 1)
+        return 200, body
+
+    def add_repo(self, request: Request, session: dict) -> tuple:
+        data = request.json()
+        org = self.org(data['namespace'])
+        if org is None:
+            return error(404, 'Not Found')
+        with self.lock:
+            if data['repository'] in org['repos']:
+                return error(400, 'Repository already exists')
+            org['repos'][data['repository']] = {
+                'namespace': data['namespace'], 'name': data['repository'],
+                'is_public': data.get('visibility') == 'public'
+            }
+        return 201, {'namespace': data['namespace'],
+                     'name': data['repository'], 'kind': 'image'}
+
+    def robot(self, org_name: str, short_name: str, robot: dict,
+              token: bool = True) -> dict:
+        data = {'name': f'{org_name}+{short_name}',
+                'description': robot['description'],
+                'created': 'Thu, 01 Jan 2020 00:00:00 -0000',
+                'last_accessed': None}
+        if token:
+            data['token'] = robot['token']
+        return data
+
+    def list_robots(self, request: Request, session: dict) -> tuple:
+        org_name = request.match.group(1)
+        org = self.org(org_name)
+        if org is None:
+            return error(404, 'Not Found')
+        token = request.arg('token', 'false') == 'true'
+        with self.lock:
+            robots = [self.robot(org_name, name, robot, token)
+                      for name, robot in sorted(org['robots'].items())]
+        return 200, {'robots': robots}
+
+    def get_robot(self, request: Request, session: dict) -> tuple:
+        org_name, short_name = request.match.group(1, 2)
+        org = self.org(org_name)
+        with self.lock:
+            robot = None if org is None else org['robots'].get(short_name)
+        if robot is None:
+            return error(400, 'Could not find robot with specified username')
+        return 200, self.robot(org_name, short_name, robot)
+
+    def add_robot(self, request: Request, session: dict) -> tuple:
+        org_name, short_name = request.match.group(1, 2)
+        org = self.org(org_name)
+        if org is None:
+            return error(404, 'Not Found')
+        with self.lock:
+            if short_name in org['robots']:
+                return error(400, 'Existing robot with name: '
+                                  f'{org_name}+{short_name}')
+            robot = org['robots'][short_name] = {
+                'description': (request.json() or {}).get('description', ''),
+                'token': uuid.uuid4().hex.upper()
+            }
+        return 201, self.robot(org_name, short_name, robot)
+
+    def list_permissions(self, request: Request, session: dict) -> tuple:
+        org = self.org(request.match.group(1))
+        if org is None or request.match.group(2) not in org['repos']:
+            return error(404, 'Not Found')
+        with self.lock:
+            permissions = dict(org['repos'][request.match.group(2)]
+                               .get('permissions', {}))
+        return 200, {'permissions': {
+            name: {'role': role, 'name': name, 'is_robot': '+' in name}
+            for name, role in sorted(permissions.items())
+        }}
+
+    def set_permission(self, request: Request, session: dict) -> tuple:
+        org = self.org(request.match.group(1))
+        if org is None or request.match.group(2) not in org['repos']:
+            return error(404, 'Not Found')
+        name, role = request.match.group(3), request.json()['role']
+        with self.lock:
+            org['repos'][request.match.group(2)].setdefault(
+                'permissions', {}
+            )[name] = role
+        return 200, {'role': role, 'name': name}
+
+
+class FakeSonarQube(FakeService):
+    """
+    SonarQube web API under /api, authenticating with HTTP basic auth
+    """
+    name = 'sonarqube'
+
+    def __init__(self, admin_password: str = 'admin', **kwargs) -> None:
+        self.initial_password = admin_password
+        super().__init__(**kwargs)
+        self.route('GET', '/api/system/status',
+                   lambda r: (200, {'status': 'UP'}), flaky=False)
+        self.route('POST', '/api/authentication/validate', self.validate)
+        self.route('POST', '/api/authentication/logout', lambda r: (200, ''))
+        self.route('POST', '/api/users/search', self.search_users)
+        self.route('POST', '/api/users/create', self.add_user)
+        self.route('POST', '/api/users/change_password',
+                   self.change_password)
+        self.route('POST', '/api/settings/set', self.set_setting)
+
+    def seed(self) -> None:
+        self.admin_password = self.initial_password
+        self.users = {'admin': {'login': 'admin', 'name': 'Administrator'}}
+        self.settings = {}
+        for i in range(self.size):
+            login = f'user{i:05d}'
+            self.users[login] = {'login': login, 'name': login}
+
+    def authorized(self, request: Request) -> bool:
+        username, password = request.basic_auth()
+        return username == 'admin' and password == self.admin_password
+
+    def validate(self, request: Request) -> tuple:
+        return 200, {'valid': self.authorized(request)}
+
+    def search_users(self, request: Request) -> tuple:
+        if not self.authorized(request):
+            return 401, {'errors': [{'msg': 'Unauthorized'}]}
+        query = request.arg('q', '')
+        with self.lock:
+            users = [user for login, user in sorted(self.users.items())
+                     if query in login]
+        return 200, {'paging': {'pageIndex': 1, 'pageSize': 50,
+                                'total': len(users)},
+                     'users': users[:50]}
+
+    def add_user(self, request: Request) -> tuple:
+        if not self.authorized(request):
+            return 401, {'errors': [{'msg': 'Unauthorized'}]}
+        login = request.arg('login')
+        with self.lock:
+            if login in self.users:
+                return 400, {'errors': [{'msg': f'User already exists with '
+                                                f'login: {login}'}]}
+            self.users[login] = {'login': login,
+                                 'name': request.arg('name', login)}
+        return 200, {'user': self.users[login]}
+
+    def change_password(self, request: Request) -> tuple:
+        if not self.authorized(request):
+            return 401, {'errors': [{'msg': 'Unauthorized'}]}
+        self.admin_password = request.arg('password')
+        return 204, None
+
+    def set_setting(self, request: Request) -> tuple:
+        if not self.authorized(request):
+            return 401, {'errors': [{'msg': 'Unauthorized'}]}
+        with self.lock:
+            self.settings[request.arg('key')] = request.arg('value')
+        return 204, None
+
+
+FAKES = [FakeNexus, FakeQuay, FakeSonarQube]
+
+
+def serve_all(conn=None, ports: dict = {}, **options) -> None:
+    """
+    Start every fake, send their base URLs through conn if given, and serve
+    until interrupted
+    """
+    urls = {}
+    for fake_class in FAKES:
+        fake = fake_class(**options)
+        urls[fake.name] = fake.start(port=ports.get(fake.name, 0))
+    if conn is not None:
+        conn.send(urls)
+    else:
+        for name, url in urls.items():
+            print(f'{name}: {url}', flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0]
+    )
+    parser.add_argument('--nexus-port', type=int, default=8081)
+    parser.add_argument('--quay-port', type=int, default=8082)
+    parser.add_argument('--sonarqube-port', type=int, default=9000)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--size', type=int, default=0)
+    args = parser.parse_args()
+    serve_all(ports={'nexus': args.nexus_port, 'quay': args.quay_port,
+                     'sonarqube': args.sonarqube_port},
+              latency=args.latency, error_rate=args.error_rate,
+              size=args.size)
+
+
+if __name__ == '__main__':
+    main()
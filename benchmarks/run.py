@@ -0,0 +1,734 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+"""
+Benchmark the devsecops-api library and CLI against local fake servers.
+
+Each scenario runs once per scale, against fakes reseeded with that many
+users, roles, repositories and organizations, and is measured for the API
+requests the fakes served, wall time and peak Python memory. Results can be
+saved as JSON and compared against an earlier run to catch regressions:
+
+    python -m benchmarks.run --scale 10 --scale 100 --json base.json
+    python -m benchmarks.run --scale 10 --scale 100 --baseline base.json
+
+It can also be run as a script from a checkout, without installing the
+package first:
+
+    python benchmarks/run.py --scale 10
+"""
+
+from contextlib import redirect_stdout
+from multiprocessing import Pipe, Process
+from time import perf_counter
+from typing import Callable, List
+import argparse
+import asyncio
+import fnmatch
+import json
+import os
+import requests
+import sys
+import tempfile
+import tracemalloc
+import warnings
+
+# Run as a script, only benchmarks/ itself is on the path, so add the
+# checkout for the benchmarks package and its src/ for devsecops
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for path in (ROOT, os.path.join(ROOT, 'src')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from benchmarks import fakes  # noqa: E402
+
+USERNAME = 'admin'
+PASSWORD = 'admin'
+
+SCENARIOS = []
+
+
+def scenario(name: str, service: str) -> Callable:
+    """
+    Register a benchmark taking the fake base URL and the scale
+    """
+    def decorator(func: Callable) -> Callable:
+        SCENARIOS.append((name, service, func))
+        return func
+    return decorator
+
+
+def names(prefix: str, n: int) -> List[str]:
+    return [f'{prefix}{i:05d}' for i in range(n)]
+
+
+def cli(*args) -> int:
+    """
+    Run a devsecops-api command in process with its output discarded,
+    returning its exit code
+    """
+    from devsecops.cli import main
+
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull), \
+            warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        try:
+            main.main(args=[str(arg) for arg in args],
+                      prog_name='devsecops-api', standalone_mode=False)
+        except SystemExit as e:
+            return e.code or 0
+    return 0
+
+
+def login(url: str) -> list:
+    return [url, '-U', USERNAME, '-P', PASSWORD]
+
+
+def new_users(n: int) -> list:
+    return ['-u', ','.join(names('cli-user', n)),
+            '-p', ','.join([PASSWORD] * n)]
+
+
+# Library scenarios
+
+@scenario('lib nexus add_user', 'nexus')
+def lib_nexus_add_user(url: str, n: int) -> None:
+    from devsecops.nexus.nexus import Nexus
+
+    with Nexus(url, USERNAME, PASSWORD) as api:
+        for username in names('new-user', n):
+            api.add_user(username, PASSWORD)
+
+
+@scenario('lib nexus add_repo', 'nexus')
+def lib_nexus_add_repo(url: str, n: int) -> None:
+    from devsecops.nexus.nexus import Nexus
+
+    with Nexus(url, USERNAME, PASSWORD) as api:
+        for repo in names('new-repo', n):
+            if not api.search_repos(repo):
+                api.add_repo(repo)
+
+
+@scenario('lib nexus list_repos', 'nexus')
+def lib_nexus_list_repos(url: str, n: int) -> None:
+    from devsecops.nexus.nexus import Nexus
+
+    with Nexus(url, USERNAME, PASSWORD) as api:
+        for _ in range(10):
+            api.list_repos()
+
+
+@scenario('lib nexus iter_users', 'nexus')
+def lib_nexus_iter_users(url: str, n: int) -> None:
+    from devsecops.nexus.nexus import Nexus
+
+    with Nexus(url, USERNAME, PASSWORD) as api:
+        for _ in api.iter_users(source='default'):
+            pass
+
+
+@scenario('lib nexus search_roles', 'nexus')
+def lib_nexus_search_roles(url: str, n: int) -> None:
+    from devsecops.nexus.nexus import Nexus
+
+    with Nexus(url, USERNAME, PASSWORD) as api:
+        for role_id in names('role', min(n, 50)):
+            api.search_roles(role_id)
+
+
+@scenario('lib nexus iter_assets', 'nexus')
+def lib_nexus_iter_assets(url: str, n: int) -> None:
+    from devsecops.nexus.nexus import Nexus
+
+    with Nexus(url, USERNAME, PASSWORD) as api:
+        for _ in api.iter_assets('maven-releases'):
+            pass
+
+
+@scenario('lib nexus async add_repo', 'nexus')
+def lib_nexus_async_add_repo(url: str, n: int) -> None:
+    from devsecops.nexus.nexus import AsyncNexus
+
+    async def run() -> None:
+        async with AsyncNexus(url, USERNAME, PASSWORD) as api:
+            await asyncio.gather(*[api.add_repo(repo)
+                                   for repo in names('async-repo', n)])
+
+    asyncio.get_event_loop().run_until_complete(run())
+
+
+@scenario('lib quay add_user', 'quay')
+def lib_quay_add_user(url: str, n: int) -> None:
+    from devsecops.quay.quay import Quay
+
+    with Quay(url, USERNAME, PASSWORD) as api:
+        for username in names('new-user', n):
+            api.add_user(username, PASSWORD)
+
+
+@scenario('lib quay sign_in', 'quay')
+def lib_quay_sign_in(url: str, n: int) -> None:
+    from devsecops.quay.quay import Quay
+
+    with Quay(url, USERNAME, PASSWORD) as api:
+        for _ in range(n):
+            api.sign_in()
+
+
+@scenario('lib quay add_robot', 'quay')
+def lib_quay_add_robot(url: str, n: int) -> None:
+    from devsecops.quay.quay import Quay
+
+    with Quay(url, USERNAME, PASSWORD) as api:
+        for org in names('org', n):
+            if not api.get_robot(org, 'deployer'):
+                api.add_robot(org, 'deployer')
+
+
+@scenario('lib quay add_robot parallel 8', 'quay')
+def lib_quay_add_robot_parallel(url: str, n: int) -> None:
+    from devsecops.base.bulk import run_bulk
+    from devsecops.quay.quay import Quay
+
+    with Quay(url, USERNAME, PASSWORD) as api:
+        run_bulk(lambda org: api.add_robot(org, 'deployer'),
+                 [(org,) for org in names('org', n)], 8)
+
+
+@scenario('lib quay add_robot bearer parallel 8', 'quay')
+def lib_quay_add_robot_bearer(url: str, n: int) -> None:
+    from devsecops.base.bulk import run_bulk
+    from devsecops.quay.quay import Quay
+
+    with Quay(url, USERNAME, PASSWORD) as api:
+        app = api.add_app('org00000', 'bench').json()
+    with Quay(url, USERNAME, PASSWORD, client_id=app['client_id']) as api:
+        run_bulk(lambda org: api.add_robot(org, 'deployer'),
+                 [(org,) for org in names('org', n)], 8)
+
+
+@scenario('lib sonarqube add_user', 'sonarqube')
+def lib_sonarqube_add_user(url: str, n: int) -> None:
+    from devsecops.sonarqube.sonarqube import SonarQube
+
+    with SonarQube(url, USERNAME, PASSWORD) as api:
+        for username in names('new-user', n):
+            if not api.search_users(username):
+                api.add_user(username, PASSWORD)
+
+
+# CLI scenarios, bulk commands get n items and the rest run once against a
+# dataset of size n
+
+@scenario('cli status', 'all')
+def cli_status(urls: dict, n: int) -> int:
+    return cli('status', '--nexus', urls['nexus'], '--quay', urls['quay'],
+               '--sonarqube', urls['sonarqube'])
+
+
+@scenario('cli nexus add-user', 'nexus')
+def cli_nexus_add_user(url: str, n: int) -> int:
+    return cli('nexus', 'add-user', *login(url),
+               *new_users(n))
+
+
+@scenario('cli nexus add-role', 'nexus')
+def cli_nexus_add_role(url: str, n: int) -> int:
+    return cli('nexus', 'add-role', *login(url), '-r', 'cli-role',
+               '--privileges', 'nx-all')
+
+
+@scenario('cli nexus grant-role-to-user', 'nexus')
+def cli_nexus_grant_role_to_user(url: str, n: int) -> int:
+    return cli('nexus', 'grant-role-to-user', *login(url), '-r', 'nx-admin',
+               '-u', names('user', n)[-1] if n else 'admin')
+
+
+@scenario('cli nexus grant-roles', 'nexus')
+def cli_nexus_grant_roles(url: str, n: int) -> int:
+    return cli('nexus', 'grant-roles', *login(url), '-r', 'nx-admin',
+               '-u', ','.join(names('user', n)))
+
+
+@scenario('cli nexus grant-roles --parallel 8', 'nexus')
+def cli_nexus_grant_roles_parallel(url: str, n: int) -> int:
+    return cli('nexus', 'grant-roles', *login(url), '-r', 'nx-admin',
+               '-u', ','.join(names('user', n)), '--parallel', 8)
+
+
+@scenario('cli nexus search-roles', 'nexus')
+def cli_nexus_search_roles(url: str, n: int) -> int:
+    return cli('nexus', 'search-roles', *login(url), '-r', 'nx-admin')
+
+
+@scenario('cli nexus list-roles', 'nexus')
+def cli_nexus_list_roles(url: str, n: int) -> int:
+    return cli('nexus', 'list-roles', *login(url))
+
+
+@scenario('cli nexus list-users', 'nexus')
+def cli_nexus_list_users(url: str, n: int) -> int:
+    return cli('nexus', 'list-users', *login(url))
+
+
+@scenario('cli nexus search-user', 'nexus')
+def cli_nexus_search_user(url: str, n: int) -> int:
+    return cli('nexus', 'search-user', *login(url), '-u', 'user0')
+
+
+@scenario('cli nexus search-components', 'nexus')
+def cli_nexus_search_components(url: str, n: int) -> int:
+    return cli('nexus', 'search-components', *login(url), '-r',
+               'maven-releases', '--assets')
+
+
+@scenario('cli nexus search-repository', 'nexus')
+def cli_nexus_search_repo(url: str, n: int) -> int:
+    return cli('nexus', 'search-repository', *login(url), '-r', 'releases',
+               '--match-mode', 'substring')
+
+
+@scenario('cli nexus list-repositories', 'nexus')
+def cli_nexus_list_repos(url: str, n: int) -> int:
+    return cli('nexus', 'list-repositories', *login(url))
+
+
+@scenario('cli nexus add-repository', 'nexus')
+def cli_nexus_add_repo(url: str, n: int) -> int:
+    return cli('nexus', 'add-repository', *login(url),
+               '-r', ','.join(names('cli-maven', n)))
+
+
+@scenario('cli nexus add-repository --parallel 8', 'nexus')
+def cli_nexus_add_repo_parallel(url: str, n: int) -> int:
+    return cli('nexus', 'add-repository', *login(url),
+               '-r', ','.join(names('cli-maven', n)),
+               '--parallel', 8)
+
+
+@scenario('cli nexus add-proxy-repository', 'nexus')
+def cli_nexus_add_proxy_repo(url: str, n: int) -> int:
+    return cli('nexus', 'add-proxy-repository', *login(url),
+               '--repository-name', 'cli-proxy',
+               '--remote-repo-url', 'https://repo1.maven.org/maven2/')
+
+
+@scenario('cli nexus add-raw-repository', 'nexus')
+def cli_nexus_add_raw_repo(url: str, n: int) -> int:
+    return cli('nexus', 'add-raw-repository', *login(url),
+               '-r', ','.join(names('cli-raw', n)))
+
+
+@scenario('cli nexus add-raw-repository --parallel 8', 'nexus')
+def cli_nexus_add_raw_repo_parallel(url: str, n: int) -> int:
+    return cli('nexus', 'add-raw-repository', *login(url),
+               '-r', ','.join(names('cli-raw', n)),
+               '--parallel', 8)
+
+
+@scenario('cli nexus add-raw-repository --batch', 'nexus')
+def cli_nexus_add_raw_repo_batch(url: str, n: int) -> int:
+    return cli('nexus', 'add-raw-repository', *login(url),
+               '-r', ','.join(names('cli-raw', n)), '--batch')
+
+
+@scenario('cli nexus add-docker-repository', 'nexus')
+def cli_nexus_add_docker_repo(url: str, n: int) -> int:
+    return cli('nexus', 'add-docker-repository', *login(url),
+               '-r', ','.join(names('cli-docker', n)))
+
+
+@scenario('cli nexus add-docker-repository --parallel 8', 'nexus')
+def cli_nexus_add_docker_repo_parallel(url: str, n: int) -> int:
+    return cli('nexus', 'add-docker-repository', *login(url),
+               '-r', ','.join(names('cli-docker', n)),
+               '--parallel', 8)
+
+
+@scenario('cli nexus add-npm-repository', 'nexus')
+def cli_nexus_add_npm_repo(url: str, n: int) -> int:
+    return cli('nexus', 'add-npm-repository', *login(url),
+               '-r', ','.join(names('cli-npm', n)))
+
+
+@scenario('cli nexus add-npm-repository --parallel 8', 'nexus')
+def cli_nexus_add_npm_repo_parallel(url: str, n: int) -> int:
+    return cli('nexus', 'add-npm-repository', *login(url),
+               '-r', ','.join(names('cli-npm', n)),
+               '--parallel', 8)
+
+
+@scenario('cli nexus update-repository', 'nexus')
+def cli_nexus_update_repo(url: str, n: int) -> int:
+    return cli('nexus', 'update-repository', *login(url),
+               '-r', ','.join(f'{repo}-releases' for repo in names('repo', n)),
+               '--write-policy', 'ALLOW_ONCE')
+
+
+@scenario('cli nexus update-group-repo', 'nexus')
+def cli_nexus_update_group_repo(url: str, n: int) -> int:
+    return cli('nexus', 'update-group-repo', *login(url),
+               '--group-repository-name', 'maven-public',
+               '--member-repository-names',
+               ','.join(f'{repo}-releases' for repo in names('repo', n)))
+
+
+@scenario('cli nexus add-script', 'nexus')
+def cli_nexus_add_script(url: str, n: int) -> int:
+    return cli('nexus', 'add-script', *login(url), '-n', 'cli-script',
+               '-c', 'return true', '-t', 'groovy')
+
+
+@scenario('cli nexus run-script', 'nexus')
+def cli_nexus_run_script(url: str, n: int) -> int:
+    return cli('nexus', 'run-script', *login(url), '-n', 'seeded', '-b', '{}')
+
+
+def nexus_manifest(n: int) -> str:
+    """
+    Write a manifest for nexus apply declaring n repositories, half of which
+    the fake already has, a group of them, n // 10 roles and n users, and
+    return its path
+    """
+    existing = [f'{repo}-releases' for repo in names('repo', n // 2)]
+    repos = existing + names('apply-repo', n - len(existing))
+    roles = names('apply-role', max(n // 10, 1))
+    manifest = {
+        'repositories': [{'name': repo} for repo in repos],
+        'groups': [{'name': 'maven-public', 'members': repos}],
+        'roles': [{'id': role, 'privileges': ['nx-all']} for role in roles],
+        'users': [{'name': user, 'password': PASSWORD,
+                   'roles': [roles[i % len(roles)]]}
+                  for i, user in enumerate(names('user', n))]
+    }
+    path = os.path.join(tempfile.gettempdir(), f'nexus-state-{n}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return path
+
+
+def quay_manifest(n: int) -> str:
+    """
+    Write a manifest for quay apply declaring n organizations, half of which
+    the fake already has, each with a robot and a repository the robot can
+    push to, the fake's own for existing organizations, and return its path
+    """
+    existing = names('org', n // 2)
+    orgs = existing + names('apply-org', n - len(existing))
+    manifest = {'organizations': [
+        {'name': org,
+         'robots': [{'name': 'deployer'}],
+         'repositories': [{'name': (f'repo{org[3:]}' if org in existing
+                                    else 'app'),
+                           'permissions': {'deployer': 'write'}}]}
+        for org in orgs
+    ]}
+    path = os.path.join(tempfile.gettempdir(), f'quay-state-{n}.json')
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return path
+
+
+def upload_tree(n: int) -> str:
+    """
+    Writes n small files to a temporary directory for upload scenarios,
+    returning the directory
+    """
+    path = os.path.join(tempfile.gettempdir(), f'nexus-upload-{n}')
+    os.makedirs(path, exist_ok=True)
+    for name in names('file', n):
+        with open(os.path.join(path, f'{name}.bin'), 'wb') as f:
+            f.write(name.encode('utf-8') * 512)
+    return path
+
+
+@scenario('cli nexus upload', 'nexus')
+def cli_nexus_upload(url: str, n: int) -> int:
+    return cli('nexus', 'upload', *login(url), '-r', 'raw-hosted',
+               upload_tree(n))
+
+
+@scenario('cli nexus upload --parallel 8', 'nexus')
+def cli_nexus_upload_parallel(url: str, n: int) -> int:
+    return cli('nexus', 'upload', *login(url), '-r', 'raw-hosted',
+               upload_tree(n), '--parallel', 8)
+
+
+@scenario('cli nexus mirror', 'nexus')
+def cli_nexus_mirror(url: str, n: int) -> int:
+    with tempfile.TemporaryDirectory() as destination:
+        return cli('nexus', 'mirror', *login(url), '-r', 'maven-releases',
+                   '-o', destination)
+
+
+@scenario('cli nexus mirror --parallel 8', 'nexus')
+def cli_nexus_mirror_parallel(url: str, n: int) -> int:
+    with tempfile.TemporaryDirectory() as destination:
+        return cli('nexus', 'mirror', *login(url), '-r', 'maven-releases',
+                   '-o', destination, '--parallel', 8)
+
+
+@scenario('cli nexus apply', 'nexus')
+def cli_nexus_apply(url: str, n: int) -> int:
+    return cli('nexus', 'apply', *login(url), '-f', nexus_manifest(n))
+
+
+@scenario('cli nexus apply --parallel 8', 'nexus')
+def cli_nexus_apply_parallel(url: str, n: int) -> int:
+    return cli('nexus', 'apply', *login(url), '-f', nexus_manifest(n),
+               '--parallel', 8)
+
+
+@scenario('cli nexus apply --batch', 'nexus')
+def cli_nexus_apply_batch(url: str, n: int) -> int:
+    return cli('nexus', 'apply', *login(url), '-f', nexus_manifest(n),
+               '--batch')
+
+
+@scenario('cli quay add-user', 'quay')
+def cli_quay_add_user(url: str, n: int) -> int:
+    return cli('quay', 'add-user', *login(url),
+               *new_users(n))
+
+
+@scenario('cli quay add-org', 'quay')
+def cli_quay_add_org(url: str, n: int) -> int:
+    return cli('quay', 'add-org', *login(url),
+               '-o', ','.join(names('cli-org', n)))
+
+
+@scenario('cli quay add-app', 'quay')
+def cli_quay_add_app(url: str, n: int) -> int:
+    return cli('quay', 'add-app', *login(url),
+               '-o', 'org00000', '-a', 'cli-app')
+
+
+@scenario('cli quay add-repo', 'quay')
+def cli_quay_add_repo(url: str, n: int) -> int:
+    return cli('quay', 'add-repo', *login(url),
+               '-o', 'org00000', '-n', ','.join(names('cli-repo', n)))
+
+
+@scenario('cli quay add-repo --parallel 8', 'quay')
+def cli_quay_add_repo_parallel(url: str, n: int) -> int:
+    return cli('quay', 'add-repo', *login(url),
+               '-o', 'org00000', '-n', ','.join(names('cli-repo', n)),
+               '--parallel', 8)
+
+
+@scenario('cli quay add-robot', 'quay')
+def cli_quay_add_robot(url: str, n: int) -> int:
+    return cli('quay', 'add-robot', *login(url),
+               '-o', 'org00000', '-r', ','.join(names('cli-robot', n)))
+
+
+@scenario('cli quay add-robot --parallel 8', 'quay')
+def cli_quay_add_robot_parallel(url: str, n: int) -> int:
+    return cli('quay', 'add-robot', *login(url),
+               '-o', 'org00000', '-r', ','.join(names('cli-robot', n)),
+               '--parallel', 8)
+
+
+@scenario('cli quay robot-tokens', 'quay')
+def cli_quay_robot_tokens(url: str, n: int) -> int:
+    return cli('quay', 'robot-tokens', *login(url),
+               '-o', 'org00000', '-r', ','.join(names('cli-robot', n)))
+
+
+@scenario('cli quay robot-tokens --parallel 8', 'quay')
+def cli_quay_robot_tokens_parallel(url: str, n: int) -> int:
+    return cli('quay', 'robot-tokens', *login(url),
+               '-o', 'org00000', '-r', ','.join(names('cli-robot', n)),
+               '-O', 'secret', '--parallel', 8)
+
+
+@scenario('cli quay apply', 'quay')
+def cli_quay_apply(url: str, n: int) -> int:
+    return cli('quay', 'apply', *login(url), '-f', quay_manifest(n))
+
+
+@scenario('cli quay apply --parallel 8', 'quay')
+def cli_quay_apply_parallel(url: str, n: int) -> int:
+    return cli('quay', 'apply', *login(url), '-f', quay_manifest(n),
+               '--parallel', 8)
+
+
+@scenario('cli sonarqube add-user', 'sonarqube')
+def cli_sonarqube_add_user(url: str, n: int) -> int:
+    return cli('sonarqube', 'add-user', *login(url),
+               *new_users(n))
+
+
+@scenario('cli sonarqube search-user', 'sonarqube')
+def cli_sonarqube_search_user(url: str, n: int) -> int:
+    return cli('sonarqube', 'search-user', *login(url), '-u', 'user0')
+
+
+@scenario('cli sonarqube update-setting', 'sonarqube')
+def cli_sonarqube_update_setting(url: str, n: int) -> int:
+    return cli('sonarqube', 'update-setting', *login(url),
+               '-n', 'sonar.forceAuthentication', '-u', 'true')
+
+
+class Fakes(object):
+    """
+    The fake servers, running in a child process so that their work does not
+    count towards the measurements
+    """
+
+    def __init__(self, **options) -> None:
+        parent, child = Pipe()
+        self.process = Process(target=fakes.serve_all, args=(child,),
+                               kwargs=options, daemon=True)
+        self.process.start()
+        self.urls = parent.recv()
+
+    def reset(self, **options) -> None:
+        for url in self.urls.values():
+            requests.post(f'{url}/__fake__/reset', json=options).close()
+
+    def requests(self) -> int:
+        return sum(requests.get(f'{url}/__fake__/stats').json()['requests']
+                   for url in self.urls.values())
+
+    def stop(self) -> None:
+        self.process.terminate()
+        self.process.join()
+
+
+def fresh_process() -> None:
+    """
+    Forget the process-wide state a real CLI invocation would start without
+    """
+    from devsecops.base.metrics import collector
+    from devsecops.base.pool import pools
+    from devsecops.base.probe import probes
+
+    probes.forget()
+    pools.clear()
+    collector.reset()
+
+
+def run_once(func: Callable, target, n: int) -> str:
+    """
+    Run a scenario, returning a description of how it failed if it did
+    """
+    fresh_process()
+    try:
+        exit_code = func(target, n)
+    except Exception as e:
+        return f'{type(e).__name__}: {e}'
+    if exit_code:
+        return f'exit code {exit_code}'
+    return None
+
+
+def measure(servers: Fakes, func: Callable, target, n: int,
+            memory: bool = True, **options) -> dict:
+    """
+    Time a scenario against freshly seeded fakes, then run it again from the
+    same state under tracemalloc for its peak memory, which would otherwise
+    slow down the timed run
+    """
+    servers.reset(size=n, **options)
+    start = perf_counter()
+    error = run_once(func, target, n)
+    wall = perf_counter() - start
+    result = {'requests': servers.requests(), 'wall': wall, 'peak_kib': 0.0,
+              'error': error}
+    if memory:
+        servers.reset(size=n, **options)
+        tracemalloc.start()
+        run_once(func, target, n)
+        result['peak_kib'] = tracemalloc.get_traced_memory()[1] / 1024
+        tracemalloc.stop()
+    return result
+
+
+def compare(results: list, baseline: list, tolerance: float) -> List[str]:
+    """
+    Returns a description of every result that issued more requests, or was
+    slower or used more memory by more than tolerance, than its baseline
+    """
+    previous = {(item['scenario'], item['scale']): item for item in baseline}
+    regressions = []
+    for item in results:
+        base = previous.get((item['scenario'], item['scale']))
+        if base is None:
+            continue
+        label = f'{item["scenario"]} @ {item["scale"]}'
+        if item['requests'] > base['requests']:
+            regressions.append(f'{label}: requests {base["requests"]} -> '
+                               f'{item["requests"]}')
+        for key in ['wall', 'peak_kib']:
+            if item[key] > base[key] * (1 + tolerance) and \
+                    item[key] - base[key] > 0.01:
+                regressions.append(f'{label}: {key} {base[key]:.3f} -> '
+                                   f'{item[key]:.3f}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__.strip().split('\n')[0]
+    )
+    parser.add_argument('--scale', type=int, action='append',
+                        help='dataset and batch size to run at, repeatable '
+                             '(default: 10, 100, 1000)')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='seconds the fakes wait before each response')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of API requests answered with 503')
+    parser.add_argument('--filter', '-k', default='*',
+                        help='only run scenarios matching this glob')
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help='skip the second, traced run of each scenario '
+                             'that measures peak memory')
+    parser.add_argument('--json', dest='json_out',
+                        help='write the results to this file as JSON')
+    parser.add_argument('--baseline',
+                        help='compare against results from an earlier --json '
+                             'and exit non-zero on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed relative slowdown or memory growth '
+                             'against the baseline (default: 0.25)')
+    args = parser.parse_args()
+
+    servers = Fakes()
+    results = []
+    print(f'{"scenario":<44} {"scale":>6} {"requests":>9} {"wall s":>9} '
+          f'{"peak KiB":>10}')
+    try:
+        for scale in args.scale or [10, 100, 1000]:
+            for name, service, func in SCENARIOS:
+                if not fnmatch.fnmatch(name, args.filter):
+                    continue
+                target = servers.urls if service == 'all' \
+                    else servers.urls[service]
+                result = dict(scenario=name, scale=scale, **measure(
+                    servers, func, target, scale, memory=args.memory,
+                    latency=args.latency,
+                    error_rate=args.error_rate
+                ))
+                results.append(result)
+                print(f'{name:<44} {scale:>6} {result["requests"]:>9} '
+                      f'{result["wall"]:>9.3f} {result["peak_kib"]:>10.1f}'
+                      + (f'  {result["error"]}' if result['error'] else ''),
+                      flush=True)
+    finally:
+        servers.stop()
+
+    if args.json_out:
+        with open(args.json_out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}', file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -28,5 +28,6 @@ __copyright__   = "2020 %s" % __author__  # noqa: E221
 
 __requires__ = [
     'click',
+    'PyYAML>=5.1',
     'requests'
 ]
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.base_handler import BaseApiHandler
+from concurrent.futures import ThreadPoolExecutor
+from typing import TypeVar, List, Callable
+from urllib.parse import urlsplit
+import asyncio
+import functools
+import requests
+import threading
+import weakref
+
+T = TypeVar("T", bound="AsyncBaseApiHandler")
+
+DEFAULT_HOST_CONCURRENCY = 8
+
+# Semaphores are bound to the event loop that created them, so they are
+# tracked per loop and then per host
+_semaphores = weakref.WeakKeyDictionary()
+_semaphores_lock = threading.Lock()
+
+
+def host_semaphore(host: str,
+                   limit: int = DEFAULT_HOST_CONCURRENCY) -> asyncio.Semaphore:
+    """
+    Return the semaphore bounding concurrent requests to host on the running
+    event loop. Every caller on the loop shares one semaphore per host, so
+    the bound holds across handlers, and the limit of the first caller for a
+    host is the one that applies.
+    """
+    loop = asyncio.get_running_loop()
+    with _semaphores_lock:
+        per_loop = _semaphores.setdefault(loop, {})
+        if host not in per_loop:
+            per_loop[host] = asyncio.Semaphore(limit)
+        return per_loop[host]
+
+
+def async_method(func: Callable) -> Callable:
+    """
+    Build a coroutine twin of a synchronous handler method, running the method
+    of the same name on the wrapped handler through AsyncBaseApiHandler._call
+    """
+    @functools.wraps(func)
+    async def method(self, *args, **kwargs):
+        return await self._call(func.__name__, *args, **kwargs)
+    return method
+
+
+class AsyncBaseApiHandler(object):
+    """
+    Base class for asyncio twins of the API handlers. Each twin wraps an
+    instance of the synchronous handler_class and runs its blocking calls,
+    building it included, on a thread pool, with requests in flight to any
+    one host bounded by a semaphore shared by every twin on the event loop.
+    The max_concurrency of the first twin to reach a host sets that bound.
+    """
+    handler_class = BaseApiHandler
+
+    def __init__(self, *args,
+                 max_concurrency: int = DEFAULT_HOST_CONCURRENCY,
+                 **kwargs) -> None:
+        """
+        Keep the arguments for the wrapped synchronous handler, which is
+        built on the thread pool, sized to max_concurrency, when the twin is
+        entered or first used, since building it probes the service
+        """
+        self._args = args
+        self._kwargs = kwargs
+        self.handler = None
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        self._building = None
+
+    @classmethod
+    async def create(cls, *args, **kwargs) -> T:
+        """
+        Returns a twin with its wrapped handler already built
+        """
+        twin = cls(*args, **kwargs)
+        await twin._build()
+        return twin
+
+    @property
+    def logger(self):
+        return self.handler.logger if self.handler is not None else None
+
+    @property
+    def host(self) -> str:
+        return urlsplit(getattr(self.handler, 'url', '')).netloc
+
+    async def _build(self) -> None:
+        """
+        Build the wrapped handler on the thread pool, once
+        """
+        if self.handler is not None:
+            return
+        if self._building is None:
+            loop = asyncio.get_running_loop()
+            self._building = loop.run_in_executor(
+                self._executor, functools.partial(
+                    self.handler_class, *self._args, **self._kwargs
+                )
+            )
+        try:
+            handler = await self._building
+        except BaseException:
+            self._building = None
+            raise
+        if self.handler is None:
+            self.handler = handler
+
+    async def _run(self, func: Callable, *args, **kwargs):
+        """
+        Run a blocking callable on the thread pool once the host semaphore
+        allows another request in flight
+        """
+        await self._build()
+        async with host_semaphore(self.host, self.max_concurrency):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, functools.partial(func, *args, **kwargs)
+            )
+
+    async def _call(self, name: str, *args, **kwargs):
+        """
+        Run the wrapped handler's method of the given name through _run
+        """
+        await self._build()
+        return await self._run(getattr(self.handler, name), *args, **kwargs)
+
+    async def __aenter__(self) -> T:
+        """
+        Async context manager enter, signing in or resuming a cached session
+        as the wrapped handler's context manager would
+        """
+        await self._call('__enter__')
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, exc_traceback) -> None:
+        """
+        Async context manager exit
+        """
+        try:
+            if self.handler is not None:
+                await self._run(self.handler.__exit__, exc_type, exc_value,
+                                exc_traceback)
+        finally:
+            self._executor.shutdown(wait=False)
+
+    async def sign_in(self):
+        """
+        Sign in using the wrapped handler's sign_in
+        """
+        return await self._call('sign_in')
+
+    async def sign_out(self):
+        """
+        Sign out using the wrapped handler's sign_out
+        """
+        return await self._call('sign_out')
+
+    async def api_req(self, method_name: str = 'get', endpoint: str = '',
+                      data: dict = None, ok: List[int] = [200],
+                      safe: bool = False, deadline: float = None,
+                      cache: bool = False, template: str = None,
+                      stream: bool = False, params: dict = None,
+                      body=None, headers: dict = None) -> requests.Response:
+        """
+        Generic API request functionality, run through the wrapped handler's
+        api_req
+        """
+        return await self._call('api_req', method_name, endpoint, data, ok,
+                                safe, deadline, cache, template, stream,
+                                params, body, headers)
@@ -1,19 +1,31 @@
 #!/usr/bin/env python3
 # SPDX-License-Identifier: BSD-2-Clause
 
+from devsecops.base.cache import ResponseCache
+from devsecops.base.log import get_logger
+from devsecops.base.metrics import collector
+from devsecops.base.pool import pools
+from devsecops.base.probe import probes
+from devsecops.base.retry import RetryPolicy, get_policy
+from devsecops.base.session_cache import SessionCache, get_cache
+from devsecops.base.tracing import TraceEvent, logging_sink, tracer
 from typing import TypeVar, List
+from time import monotonic, perf_counter, sleep, time
+from urllib.parse import urlsplit
 import requests
 import json
 import logging
-import logging.handlers
 import sys
 import urllib3
-import os.path
+import weakref
 urllib3.disable_warnings()
 
 
 T = TypeVar("T", bound="BaseApiHandler")
 
+# Handlers whose verbosity is DEBUG, which keep the logging sink on the tracer
+_debugging = weakref.WeakSet()
+
 
 class UnexpectedApiResponse(Exception):
     pass
@@ -24,13 +36,23 @@ class BaseApiHandler(object):
     Base class for API handlers for the various services with common
     methodologies for them.
     """
+    # Cheap endpoint, relative to the base URL, answering 200 when the service
+    # is up. Without one, a HEAD of the base URL is used.
+    health_endpoint = None
+    # Session headers carrying sign-in state that is kept in the session cache
+    session_headers = []
 
     def __init__(self, service_name: str = None, base_endpoint: str = 'api/v1',
                  base_url: str = None, username: str = None,
                  password: str = None, verbosity: int = 0, auth: bool = False,
-                 kwarg_type: str = 'data') -> None:
+                 kwarg_type: str = 'data',
+                 retry_policy: RetryPolicy = None,
+                 response_cache: ResponseCache = None,
+                 session_cache: SessionCache = None) -> None:
         """
-        Initialize the base class
+        Initialize the base class. Without a retry_policy or session_cache,
+        the ones configured for service_name are used. Without a
+        response_cache, the handler gets its own with default TTL and size.
         """
         self._set_logger(service_name, verbosity)
         if not self.check_online(base_url):
@@ -49,68 +71,82 @@ class BaseApiHandler(object):
             self.password: str = password
         self.auth = auth
         self.kwarg_type = kwarg_type
+        self.retry_policy = retry_policy or get_policy(service_name)
+        self.response_cache = response_cache or ResponseCache()
+        self.session_cache = session_cache or get_cache(service_name)
+        self._resumed = False
+        self.service_name = service_name
+        self.tracer = tracer
         self.session = None
 
     def _set_logger(self, service_name: str = None,
                     verbosity: int = 0) -> None:
         """
-        Start a logger unique to each API handler
+        Start a logger view unique to each API handler on the shared,
+        process-wide logging pipeline
         """
-        self.logger = logging.getLogger(service_name)
-        self.logger.setLevel(logging.DEBUG)
-        _format = '{asctime} [{levelname:^9s}] {name}: {message}'
-        formatter = logging.Formatter(_format, style='{')
-
-        stderr = logging.StreamHandler()
-        stderr.setFormatter(formatter)
-
-        # When verbose, output lots of log information to stderr
-        verbosity = min(50, max(10, 40 - verbosity * 10))
-        stderr.setLevel(verbosity)
-
-        self.logger.addHandler(stderr)
-
-        if os.path.exists('/dev/log'):
-            syslog = logging.handlers.SysLogHandler(address='/dev/log')
-            syslog.setFormatter(formatter)
-
-            # Always be pretty verbose to syslog
-            syslog.setLevel(logging.INFO)
+        self.logger = get_logger(service_name, verbosity)
+        self.set_verbosity(verbosity)
+        level = self.logger.extra['stderr_level']
+        self.logger.info(f'Logging initialized, verbosity: {level}')
 
-            self.logger.addHandler(syslog)
-
-        self.logger.info(f'Logging initialized, verbosity: {verbosity}')
+    def set_verbosity(self, verbosity: int = 0) -> None:
+        """
+        Change how much this handler logs to stderr, tracing requests to the
+        log only while some handler is at DEBUG
+        """
+        self.logger.set_verbosity(verbosity)
+        if self.logger.isEnabledFor(logging.DEBUG):
+            _debugging.add(self)
+        else:
+            _debugging.discard(self)
+        if _debugging:
+            tracer.add_sink(logging_sink)
+        else:
+            tracer.remove_sink(logging_sink)
 
     def __enter__(self) -> T:
         """
-        Context manager enter
+        Context manager enter, resuming a cached session when possible
         """
-        self.sign_in()
+        if not self.resume_session():
+            self.sign_in()
+            self.save_session()
         self.logger.debug(
             f'Context manager sign-in complete for {self.__class__}'
         )
-        self.logger.debug(f'Vars dump for {self.__class__}')
-        self.logger.debug(vars(self))
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug(f'Vars dump for {self.__class__}')
+            self.logger.debug(vars(self))
         return self
 
     def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
         """
         Context manager exit
         """
-        self.sign_out()
+        if exc_type is not None and self.tracer.recent(self.service_name) \
+                and self.logger.isEnabledFor(logging.INFO):
+            self.logger.info(
+                'Recent requests before %s:\n%s', exc_type.__name__,
+                self.tracer.dump(self.service_name)
+            )
+        if self.session_cache is not None:
+            # Leave the server-side session alive for the next process
+            self.save_session()
+            if self.session is not None:
+                self.session.close()
+        else:
+            self.sign_out()
         self.logger.debug(
             f'Context manager sign-out complete for {self.__class__}'
         )
 
-    @staticmethod
-    def check_online(url):
-        try:
-            if requests.get(url, verify=False).status_code != 200:
-                sys.stderr.write(f'{url} appears to be offline and is not '
-                                 'responding to requests.\n')
-                sys.stderr.flush()
-                return False
-        except requests.exceptions.SSLError:
+    @classmethod
+    def check_online(cls, url):
+        """
+        Probe the service's health endpoint, reusing a recent success
+        """
+        if not probes.check(url, cls.health_endpoint):
             sys.stderr.write(f'{url} appears to be offline and is not '
                              'responding to requests.\n')
             sys.stderr.flush()
@@ -123,7 +159,7 @@ class BaseApiHandler(object):
         """
         if self.session is None:
             self.logger.debug('Creating new session')
-            self.session = requests.session()
+            self.session = pools.session(self.url)
             self.session.verify = False
         self.session.headers.update(
             {
@@ -134,6 +170,76 @@ class BaseApiHandler(object):
         for key, val in extra_headers.items():
             self.session.headers.update({key: val})
 
+    def metrics(self) -> list:
+        """
+        Returns the request metrics gathered so far for this handler's
+        service, once gathering them has been turned on with metrics.enable
+        """
+        return collector.snapshot(self.service_name)
+
+    def _session_state(self) -> dict:
+        """
+        Returns the sign-in state of the session to keep in the session cache
+        """
+        return {
+            'headers': {key: self.session.headers[key]
+                        for key in self.session_headers
+                        if key in self.session.headers},
+            'cookies': [{'name': cookie.name, 'value': cookie.value,
+                         'domain': cookie.domain, 'path': cookie.path,
+                         'secure': cookie.secure, 'expires': cookie.expires}
+                        for cookie in self.session.cookies]
+        }
+
+    def _restore_state(self, state: dict) -> bool:
+        """
+        Apply cached sign-in state to a new session, returning whether it is
+        usable by this handler
+        """
+        self._get_session(extra_headers=state.get('headers', {}))
+        for cookie in state.get('cookies', []):
+            self.session.cookies.set(**cookie)
+        return True
+
+    def _session_valid(self) -> bool:
+        """
+        Intended to be overloaded by subclasses with a cheap check that a
+        restored session is still signed in. By default restored sessions are
+        trusted, and a 401 from the server later makes api_req sign in again.
+        """
+        return True
+
+    def resume_session(self) -> bool:
+        """
+        Restore a signed-in session from the session cache, returning whether
+        one was found and is still valid
+        """
+        if self.session_cache is None:
+            return False
+        username = getattr(self, 'username', None)
+        state = self.session_cache.load(self.url, username)
+        if state is None:
+            return False
+        if self._restore_state(state) and self._session_valid():
+            self._resumed = True
+            self.logger.info('Resumed cached session')
+            return True
+        self.logger.info('Cached session is no longer valid')
+        self.session_cache.delete(self.url, username)
+        if self.session is not None:
+            self.session.cookies.clear()
+            for key in self.session_headers:
+                self.session.headers.pop(key, None)
+        return False
+
+    def save_session(self) -> None:
+        """
+        Store the signed-in session in the session cache, if there is one
+        """
+        if self.session_cache is not None and self.session is not None:
+            self.session_cache.save(self.url, getattr(self, 'username', None),
+                                    self._session_state())
+
     def sign_in(self) -> requests.Response:
         """
         Intended to be overloaded by subclasses to hit appropriate endpoints,
@@ -158,17 +264,60 @@ class BaseApiHandler(object):
         return self._sign_out()
 
     def api_req(self, method_name: str = 'get', endpoint: str = '',
-                data: dict = None, ok: List[int] = [200]) -> requests.Response:
+                data: dict = None, ok: List[int] = [200], safe: bool = False,
+                deadline: float = None, cache: bool = False,
+                template: str = None, stream: bool = False,
+                params: dict = None, body=None,
+                headers: dict = None) -> requests.Response:
         """
         Generic API request functionality for all other calls.
 
         If return is expected to be anything other than `200` for success,
         provide the HTTP response code as `ok`.
+
+        Failed attempts are retried according to the handler's retry policy,
+        which only retries idempotent methods unless the call is marked
+        `safe`. `deadline` bounds the whole call, retries included, in
+        seconds.
+
+        Reads marked `cache` are served from the handler's response cache
+        while fresh and revalidated with the server once stale. Successful
+        writes, meaning any other call that isn't `safe`, invalidate the
+        cached collection they touch.
+
+        `template` names the endpoint with its parameters left out, such as
+        `v1/security/users/{userId}`, for tracing and metrics. It defaults to
+        the endpoint without its query string.
+
+        `stream` returns a successful response without reading its body, for
+        the caller to consume with iter_content or iter_lines and then close.
+        It can't be combined with `cache`. `params` are sent as the query
+        string, whatever the handler's kwarg_type.
+
+        `endpoint` may also be an absolute URL, such as a download link the
+        API returned, which is requested as it is.
+
+        `body` is sent as the request body as it is, instead of `data`, and
+        may be bytes or a re-iterable with a length, such as a
+        MultipartBody, to stream it. `headers` are added to the session's
+        for this call only.
         """
-        self.logger.debug('Making API request:')
-        self.logger.debug(locals())
         method = getattr(self.session, method_name)
+        if urlsplit(endpoint).scheme:
+            url = endpoint
+        else:
+            url = f'{self.url}/{endpoint}'
         kwargs = {}
+        cache_key = entry = None
+        if cache:
+            cache_key = self.response_cache.key(method_name, endpoint, data)
+            entry = self.response_cache.get(cache_key)
+            if entry is not None:
+                if self.response_cache.fresh(entry):
+                    self.logger.debug('%s at %s served from cache',
+                                      method_name, url)
+                    return entry.response
+                kwargs['headers'] = self.response_cache.validators(entry)
         if self.auth:
             kwargs['auth'] = (self.username, self.password)
         if data is not None:
@@ -176,14 +325,103 @@ class BaseApiHandler(object):
                 kwargs[self.kwarg_type] = json.dumps(data)
             elif self.kwarg_type == 'params':
                 kwargs[self.kwarg_type] = data
-        ret_val = method(f'{self.url}/{endpoint}', **kwargs)
+        if body is not None:
+            kwargs['data'] = body
+        if headers is not None:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **headers)
+        if params is not None:
+            kwargs['params'] = dict(kwargs.get('params') or {}, **params)
+        if stream:
+            kwargs['stream'] = True
+        policy = self.retry_policy
+        if deadline is None:
+            deadline = policy.deadline
+        started = monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            remaining = None
+            if deadline is not None:
+                remaining = deadline - (monotonic() - started)
+                kwargs['timeout'] = max(remaining, 0.001)
+            error = ret_val = None
+            sent = perf_counter()
+            try:
+                ret_val = method(url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                error = e
+            if self.tracer.enabled:
+                self._trace(method_name, endpoint, template, attempt,
+                            perf_counter() - sent, ret_val, error, stream)
+            delay = None
+            if policy.retryable(method_name, safe, ret_val, error, ok):
+                if deadline is not None:
+                    remaining = deadline - (monotonic() - started)
+                delay = policy.next_delay(attempt, remaining, ret_val)
+            if delay is None:
+                break
+            self.logger.warning(
+                f'{method_name} at {url} failed with '
+                f'{error or ret_val.status_code}, retrying in {delay:.2f}s '
+                f'(attempt {attempt + 1} of {policy.max_attempts})'
+            )
+            if ret_val is not None:
+                ret_val.close()
+            sleep(delay)
+        if error is not None:
+            raise error
+
+        self.logger.info('%s at %s returned %s', method_name, url,
+                         ret_val.status_code)
 
-        self.logger.info((f'{method_name} at {self.url}/{endpoint} '
-                          f'returned {ret_val.status_code}'))
-        self.logger.debug(f'text: {ret_val.text}')
-        self.logger.debug(f'headers: {ret_val.headers}')
-        self.logger.debug(f'data: {data}')
+        if ret_val.status_code == 401 and self._resumed:
+            self.logger.info('Cached session was rejected, signing in again')
+            ret_val.close()
+            self._resumed = False
+            self.session_cache.delete(self.url,
+                                      getattr(self, 'username', None))
+            self.sign_in()
+            return self.api_req(method_name, endpoint, data, ok, safe,
+                                deadline, cache, template, stream, params,
+                                body, headers)
 
+        if entry is not None and ret_val.status_code == 304:
+            return self.response_cache.refresh(cache_key)
         if ret_val.status_code not in ok:
             raise UnexpectedApiResponse(ret_val.text)
+        if cache:
+            self.response_cache.put(cache_key, ret_val)
+        elif not safe and method_name.lower() not in ('get', 'head'):
+            self.response_cache.invalidate(endpoint)
         return ret_val
+
+    def _trace(self, method_name: str, endpoint: str, template: str,
+               attempt: int, latency: float,
+               response: requests.Response = None,
+               error: Exception = None, stream: bool = False) -> None:
+        """
+        Record one request attempt with the tracer. Streamed response bodies
+        are left unread, so their size is taken from Content-Length, and the
+        size of streamed request bodies is recorded as None.
+        """
+        status = bytes_in = bytes_out = body = None
+        if response is not None:
+            status = response.status_code
+            sent = response.request.body
+            # Streamed bodies, such as generators, have no length to take
+            if sent is None:
+                bytes_out = 0
+            elif isinstance(sent, (bytes, str)):
+                bytes_out = len(sent)
+            if stream:
+                bytes_in = int(response.headers.get('Content-Length') or 0)
+            else:
+                bytes_in = len(response.content or b'')
+                if self.tracer.capture_bodies:
+                    body = response.text[:self.tracer.capture_bodies]
+        self.tracer.record(TraceEvent(
+            time(), self.service_name, method_name, endpoint,
+            template or endpoint.split('?')[0], status,
+            latency, bytes_out, bytes_in, attempt,
+            None if error is None else error.__class__.__name__, body
+        ))
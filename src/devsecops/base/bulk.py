@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from collections import namedtuple
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List
+
+BulkResult = namedtuple('BulkResult', ['item', 'value', 'error'])
+BulkResult.__doc__ = """
+Outcome of one call in a bulk operation: the item it was made for, what the
+call returned, and the exception it raised, if any, in which case value is
+None.
+"""
+
+
+def _call(func: Callable, item) -> BulkResult:
+    try:
+        if isinstance(item, tuple):
+            return BulkResult(item, func(*item), None)
+        return BulkResult(item, func(item), None)
+    except Exception as e:
+        return BulkResult(item, None, e)
+
+
+def run_bulk(func: Callable, items: Iterable,
+             parallel: int = 1) -> List[BulkResult]:
+    """
+    Call func once per item, unpacking tuples into positional arguments, on
+    at most parallel worker threads. Returns a BulkResult per item in the
+    order of items, whatever order the calls completed in, and never raises
+    on behalf of func.
+    """
+    items = list(items)
+    if parallel <= 1 or len(items) <= 1:
+        return [_call(func, item) for item in items]
+    with ThreadPoolExecutor(max_workers=min(parallel, len(items))) as pool:
+        return list(pool.map(lambda item: _call(func, item), items))
+
+
+def iter_bulk(func: Callable, items: Iterable, parallel: int = 1,
+              window: int = None) -> Iterator[BulkResult]:
+    """
+    Like run_bulk, but yield the BulkResults in the order of items as they
+    are ready, drawing items lazily so that no more than window of them, by
+    default four per worker, are ever in flight or waiting to be yielded
+    """
+    items = iter(items)
+    if parallel <= 1:
+        for item in items:
+            yield _call(func, item)
+        return
+    window = window or parallel * 4
+    with ThreadPoolExecutor(max_workers=parallel) as pool:
+        pending = deque(pool.submit(_call, func, item)
+                        for item in islice(items, window))
+        while pending:
+            result = pending.popleft().result()
+            for item in islice(items, 1):
+                pending.append(pool.submit(_call, func, item))
+            yield result
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from collections import OrderedDict, namedtuple
+from time import monotonic
+from typing import Tuple
+import json
+import re
+import requests
+import threading
+
+VERSION_SEGMENT = re.compile(r'^(v\d+|beta)$')
+
+CacheEntry = namedtuple('CacheEntry', ['response', 'expires', 'collection'])
+
+
+class ResponseCache(object):
+    """
+    Read-through cache of successful API responses for one handler. Entries
+    are fresh for ttl seconds, after which they are revalidated with
+    If-None-Match or If-Modified-Since if the server gave us an ETag or
+    Last-Modified header. At most max_entries are kept, least recently used
+    first out. Writes through the handler invalidate their whole collection.
+    """
+
+    def __init__(self, ttl: float = 30, max_entries: int = 64) -> None:
+        """
+        Initialize an empty cache
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(method_name: str, endpoint: str, data: dict = None) -> Tuple:
+        """
+        Returns the cache key for a request
+        """
+        body = '' if data is None else json.dumps(data, sort_keys=True)
+        return (method_name.lower(), endpoint, body)
+
+    @staticmethod
+    def collection(endpoint: str) -> str:
+        """
+        Returns the collection an endpoint belongs to: its first path segment
+        after any API version, so that beta/repositories and
+        v1/repositories/npm/hosted are both 'repositories'
+        """
+        for segment in endpoint.split('?')[0].split('/'):
+            if segment and not VERSION_SEGMENT.match(segment):
+                return segment
+        return ''
+
+    def get(self, key: Tuple) -> CacheEntry:
+        """
+        Returns the entry for key, fresh or not, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    @staticmethod
+    def fresh(entry: CacheEntry) -> bool:
+        return entry.expires > monotonic()
+
+    @staticmethod
+    def validators(entry: CacheEntry) -> dict:
+        """
+        Returns the conditional request headers to revalidate an entry with
+        """
+        headers = {}
+        etag = entry.response.headers.get('ETag')
+        if etag is not None:
+            headers['If-None-Match'] = etag
+        last_modified = entry.response.headers.get('Last-Modified')
+        if last_modified is not None:
+            headers['If-Modified-Since'] = last_modified
+        return headers
+
+    def put(self, key: Tuple, response: requests.Response) -> None:
+        """
+        Store a response, evicting the least recently used entries over size
+        """
+        if self.max_entries <= 0:
+            return
+        entry = CacheEntry(response, monotonic() + self.ttl,
+                           self.collection(key[1]))
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def refresh(self, key: Tuple) -> requests.Response:
+        """
+        Mark an entry fresh again after the server said it hasn't changed,
+        returning its response
+        """
+        with self._lock:
+            entry = self._entries[key]
+            self._entries[key] = entry._replace(
+                expires=monotonic() + self.ttl
+            )
+            return entry.response
+
+    def invalidate(self, endpoint: str = None) -> None:
+        """
+        Drop every entry in the collection endpoint belongs to, or everything
+        """
+        with self._lock:
+            if endpoint is None:
+                self._entries.clear()
+                return
+            collection = self.collection(endpoint)
+            for key in [key for key, entry in self._entries.items()
+                        if entry.collection == collection]:
+                del self._entries[key]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from typing import Iterable, Iterator
+import codecs
+import json
+
+WHITESPACE = ' \t\n\r'
+DELIMITERS = (',', ']', ' ', '\t', '\n', '\r')
+
+_decoder = json.JSONDecoder()
+
+
+class _Buffer(object):
+    """
+    Text decoded from a stream of byte chunks and not yet consumed
+    """
+
+    def __init__(self, chunks: Iterable[bytes], encoding: str) -> None:
+        self.chunks = iter(chunks)
+        self.decode = codecs.getincrementaldecoder(encoding)().decode
+        self.text = ''
+        self.pos = 0
+        self.exhausted = False
+
+    def fill(self) -> bool:
+        """
+        Drop the consumed text and read at least as much again as is left,
+        so that an element spanning many chunks is retried a logarithmic
+        number of times. Returns False once the stream has run out.
+        """
+        if self.exhausted:
+            return False
+        parts = [self.text[self.pos:]]
+        wanted = max(len(parts[0]), 1)
+        read = 0
+        while read < wanted:
+            chunk = next(self.chunks, None)
+            if chunk is None:
+                parts.append(self.decode(b'', final=True))
+                self.exhausted = True
+                break
+            text = self.decode(chunk)
+            parts.append(text)
+            read += len(text)
+        self.text = ''.join(parts)
+        self.pos = 0
+        return read > 0 or not self.exhausted
+
+    def peek(self) -> str:
+        """
+        Skip whitespace, returning the next character or '' at the end
+        """
+        while True:
+            while (self.pos < len(self.text) and
+                   self.text[self.pos] in WHITESPACE):
+                self.pos += 1
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self.fill():
+                return ''
+
+
+def iter_json_array(chunks: Iterable[bytes],
+                    encoding: str = 'utf-8') -> Iterator:
+    """
+    Decode a JSON array from an iterable of byte chunks, such as a streamed
+    response's iter_content, yielding each element as soon as it is complete.
+    Only the undecoded remainder of the input is held at any time, never the
+    whole document. Raises ValueError if the input is not a JSON array.
+    """
+    buffer = _Buffer(chunks, encoding)
+    if buffer.peek() != '[':
+        raise ValueError('Expected a JSON array')
+    buffer.pos += 1
+    if buffer.peek() == ']':
+        return
+    while True:
+        if buffer.peek() == '':
+            raise ValueError('Unexpected end of JSON array')
+        try:
+            value, end = _decoder.raw_decode(buffer.text, buffer.pos)
+        except json.JSONDecodeError:
+            # Most likely an element cut off at the end of the buffer
+            if buffer.fill():
+                continue
+            raise
+        if not isinstance(value, (dict, list, str)) and \
+                buffer.text[end:end + 1] not in DELIMITERS and \
+                not buffer.exhausted:
+            # A number cut off at the end of the buffer, or even before a
+            # decimal point or exponent, may carry on in the next chunk.
+            # Filling moves the text, so decode it again either way.
+            buffer.fill()
+            continue
+        buffer.pos = end
+        yield value
+        separator = buffer.peek()
+        if separator == ']':
+            return
+        if separator != ',':
+            raise ValueError(f'Expected , or ] in JSON array, found '
+                             f'{separator or "the end"}')
+        buffer.pos += 1
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from queue import Queue
+import atexit
+import logging
+import logging.handlers
+import os.path
+import sys
+import threading
+
+LOG_FORMAT = '{asctime} [{levelname:^9s}] {name}: {message}'
+SYSLOG_ADDRESS = '/dev/log'
+# Always be pretty verbose to syslog
+SYSLOG_LEVEL = logging.INFO
+
+_lock = threading.Lock()
+_queue_handler = None
+_listener = None
+_syslog = False
+# The most verbose stderr level asked for by any handler of each service
+_stderr_levels = {}
+
+
+def verbosity_level(verbosity: int = 0) -> int:
+    """
+    Map a count of -v flags to the stderr logging level
+    """
+    return min(50, max(10, 40 - verbosity * 10))
+
+
+class StderrHandler(logging.StreamHandler):
+    """
+    StreamHandler that always writes to whatever sys.stderr currently is
+    """
+
+    @property
+    def stream(self):
+        return sys.stderr
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+
+class StderrLevelFilter(logging.Filter):
+    """
+    Drop records below the stderr level of the handler that logged them, or
+    of the most verbose handler for the service if they carry none
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        level = getattr(record, 'stderr_level', None)
+        if level is None:
+            level = _stderr_levels.get(record.name, logging.WARNING)
+        return record.levelno >= level
+
+
+class HandlerLogger(logging.LoggerAdapter):
+    """
+    Per-handler view of a service logger carrying the handler's own stderr
+    verbosity, so handlers sharing a logger can be as chatty as they each
+    like without attaching handlers of their own
+    """
+
+    def __init__(self, logger: logging.Logger, verbosity: int = 0) -> None:
+        super().__init__(logger, {})
+        self.set_verbosity(verbosity)
+
+    def set_verbosity(self, verbosity: int = 0) -> None:
+        """
+        Change the stderr verbosity for this handler only
+        """
+        level = verbosity_level(verbosity)
+        self.extra = {'stderr_level': level}
+        self.threshold = min(level, SYSLOG_LEVEL) if _syslog else level
+        with _lock:
+            name = self.logger.name
+            _stderr_levels[name] = min(level, _stderr_levels.get(name, level))
+            if self.threshold < self.logger.level:
+                self.logger.setLevel(self.threshold)
+
+    def isEnabledFor(self, level: int) -> bool:
+        return level >= self.threshold and self.logger.isEnabledFor(level)
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = dict(self.extra, **kwargs.get('extra', {}))
+        return msg, kwargs
+
+
+def _start() -> None:
+    """
+    Build the process-wide queue and the listener thread that does the actual
+    stderr and syslog I/O
+    """
+    global _queue_handler, _listener, _syslog
+    formatter = logging.Formatter(LOG_FORMAT, style='{')
+
+    stderr = StderrHandler()
+    stderr.setFormatter(formatter)
+    stderr.addFilter(StderrLevelFilter())
+    handlers = [stderr]
+
+    if os.path.exists(SYSLOG_ADDRESS):
+        syslog = logging.handlers.SysLogHandler(address=SYSLOG_ADDRESS)
+        syslog.setFormatter(formatter)
+        syslog.setLevel(SYSLOG_LEVEL)
+        handlers.append(syslog)
+        _syslog = True
+
+    queue = Queue(-1)
+    _queue_handler = logging.handlers.QueueHandler(queue)
+    _listener = logging.handlers.QueueListener(
+        queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+def get_logger(service_name: str = None,
+               verbosity: int = 0) -> HandlerLogger:
+    """
+    Returns a handler's view of the logger for service_name, setting up the
+    logging pipeline and attaching it to the service logger the first time
+    either is seen
+    """
+    with _lock:
+        if _listener is None:
+            _start()
+        logger = logging.getLogger(service_name)
+        if _queue_handler not in logger.handlers:
+            logger.setLevel(logging.CRITICAL)
+            logger.addHandler(_queue_handler)
+    return HandlerLogger(logger, verbosity)
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.tracing import TraceEvent, tracer
+from typing import List, Tuple
+import json
+import threading
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0,
+                   10.0)
+PREFIX = 'devsecops_api'
+
+
+def status_class(event: TraceEvent) -> str:
+    """
+    Returns '2xx', '4xx' and so on for an event, or 'error' if no response
+    was received
+    """
+    if event.status is None:
+        return 'error'
+    return f'{event.status // 100}xx'
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+                     .replace('\n', '\\n')
+
+
+class Series(object):
+    """
+    Aggregated measurements for one service, method and endpoint template
+    """
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.requests = {}
+        self.retries = 0
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.latency_buckets = [0] * len(buckets)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+
+    def as_dict(self, buckets: Tuple[float, ...]) -> dict:
+        return {
+            'requests': dict(self.requests),
+            'retries': self.retries,
+            'bytes_out': self.bytes_out,
+            'bytes_in': self.bytes_in,
+            'latency': {
+                'buckets': dict(zip([str(b) for b in buckets],
+                                    self.latency_buckets)),
+                'sum': self.latency_sum,
+                'count': self.latency_count
+            }
+        }
+
+
+class Metrics(object):
+    """
+    Trace sink keeping per service, per endpoint template request counters by
+    status class, retry counts, bytes in and out, and a latency histogram,
+    exportable as Prometheus text exposition or JSON
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        """
+        Initialize empty metrics with cumulative latency buckets in seconds
+        """
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, event: TraceEvent) -> None:
+        """
+        Account for one request attempt
+        """
+        key = (event.service, event.method.upper(), event.template)
+        cls = status_class(event)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = Series(self.buckets)
+            series.requests[cls] = series.requests.get(cls, 0) + 1
+            if event.attempt > 1:
+                series.retries += 1
+            series.bytes_out += event.bytes_out or 0
+            series.bytes_in += event.bytes_in or 0
+            series.latency_sum += event.latency
+            series.latency_count += 1
+            for i, bound in enumerate(self.buckets):
+                if event.latency <= bound:
+                    series.latency_buckets[i] += 1
+
+    def reset(self) -> None:
+        """
+        Forget everything measured so far
+        """
+        with self._lock:
+            self._series.clear()
+
+    def snapshot(self, service: str = None) -> List[dict]:
+        """
+        Returns the current measurements, optionally for one service only,
+        as a list of plain dicts
+        """
+        with self._lock:
+            return [
+                dict(service=key[0], method=key[1], endpoint=key[2],
+                     **series.as_dict(self.buckets))
+                for key, series in sorted(self._series.items(),
+                                          key=lambda item: str(item[0]))
+                if service is None or key[0] == service
+            ]
+
+    def to_json(self, service: str = None) -> str:
+        """
+        Render the measurements as JSON
+        """
+        return json.dumps(self.snapshot(service), indent=2)
+
+    def to_prometheus(self, service: str = None) -> str:
+        """
+        Render the measurements in the Prometheus text exposition format
+        """
+        requests, retries, sent, received, latency = [], [], [], [], []
+        for item in self.snapshot(service):
+            labels = (f'service="{_label(item["service"])}",'
+                      f'method="{_label(item["method"])}",'
+                      f'endpoint="{_label(item["endpoint"])}"')
+            for cls, count in sorted(item['requests'].items()):
+                requests.append(f'{PREFIX}_requests_total'
+                                f'{{{labels},status_class="{cls}"}} {count}')
+            retries.append(f'{PREFIX}_retries_total{{{labels}}} '
+                           f'{item["retries"]}')
+            sent.append(f'{PREFIX}_request_bytes_total{{{labels}}} '
+                        f'{item["bytes_out"]}')
+            received.append(f'{PREFIX}_response_bytes_total{{{labels}}} '
+                            f'{item["bytes_in"]}')
+            histogram = item['latency']
+            for bound, count in histogram['buckets'].items():
+                latency.append(f'{PREFIX}_request_duration_seconds_bucket'
+                               f'{{{labels},le="{bound}"}} {count}')
+            latency.append(f'{PREFIX}_request_duration_seconds_bucket'
+                           f'{{{labels},le="+Inf"}} {histogram["count"]}')
+            latency.append(f'{PREFIX}_request_duration_seconds_sum'
+                           f'{{{labels}}} {histogram["sum"]}')
+            latency.append(f'{PREFIX}_request_duration_seconds_count'
+                           f'{{{labels}}} {histogram["count"]}')
+        lines = []
+        for name, kind, help_text, samples in [
+            ('requests_total', 'counter',
+             'API request attempts by status class', requests),
+            ('retries_total', 'counter',
+             'API request attempts that were retries', retries),
+            ('request_bytes_total', 'counter',
+             'Bytes sent in API request bodies', sent),
+            ('response_bytes_total', 'counter',
+             'Bytes received in API response bodies', received),
+            ('request_duration_seconds', 'histogram',
+             'API request attempt latency', latency),
+        ]:
+            lines.append(f'# HELP {PREFIX}_{name} {help_text}')
+            lines.append(f'# TYPE {PREFIX}_{name} {kind}')
+            lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str, output_format: str = None) -> None:
+        """
+        Write the measurements to path, as JSON if output_format is 'json' or
+        path ends in .json, and as Prometheus text otherwise
+        """
+        if output_format is None:
+            output_format = 'json' if path.endswith('.json') else 'prometheus'
+        with open(path, 'w', encoding='utf-8') as f:
+            if output_format == 'json':
+                f.write(self.to_json() + '\n')
+            else:
+                f.write(self.to_prometheus())
+
+
+collector = Metrics()
+
+
+def enable() -> Metrics:
+    """
+    Start gathering measurements in the collector, which like tracing costs
+    nothing until asked for, and return it
+    """
+    tracer.add_sink(collector)
+    return collector
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from typing import Dict, Iterator, List, Tuple
+import hashlib
+import os
+import uuid
+
+CHUNK_SIZE = 1024 * 1024
+DIGESTS = ('md5', 'sha1', 'sha256')
+
+
+def _quote(value: str) -> str:
+    return value.replace('"', '%22').replace('\r', '%0D').replace('\n',
+                                                                  '%0A')
+
+
+def read_chunks(path: str, checksums: dict = None) -> Iterator[bytes]:
+    """
+    Read a file in chunks, storing its hex digests in checksums, if given,
+    once the last chunk has been read
+    """
+    hashes = [hashlib.new(name) for name in DIGESTS]
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            for digest in hashes:
+                digest.update(chunk)
+            yield chunk
+    if checksums is not None:
+        checksums.update((digest.name, digest.hexdigest())
+                         for digest in hashes)
+
+
+def file_checksums(path: str) -> Dict[str, str]:
+    """
+    Returns the md5, sha1 and sha256 hex digests of a file, read in chunks
+    """
+    checksums = {}
+    for _ in read_chunks(path, checksums):
+        pass
+    return checksums
+
+
+class MultipartBody(object):
+    """
+    A multipart/form-data request body that reads its files from disk in
+    chunks as it is sent, never holding more than one chunk of any file.
+    Its length is known up front, so it goes out with a Content-Length
+    rather than chunked. The checksums of each file are taken in the same
+    pass and are in checksums, by path, once the body has been sent.
+    Iterating again reads the files again, so a retried request can resend
+    it.
+    """
+
+    def __init__(self, fields: List[Tuple[str, str]] = [],
+                 files: List[Tuple[str, str, str]] = [],
+                 boundary: str = None) -> None:
+        """
+        Initialize a body from (name, value) form fields and (name,
+        filename, path) files
+        """
+        self.boundary = boundary or uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.fields = list(fields)
+        self.files = list(files)
+        self.checksums = {}
+        self._length = (
+            sum(len(self._field(name, value)) for name, value in self.fields)
+            + sum(len(self._file_head(name, filename)) +
+                  os.path.getsize(path) + 2
+                  for name, filename, path in self.files)
+            + len(self._trailer())
+        )
+
+    def _field(self, name: str, value: str) -> bytes:
+        return (f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{_quote(name)}"\r\n'
+                f'\r\n{value}\r\n').encode('utf-8')
+
+    def _file_head(self, name: str, filename: str) -> bytes:
+        return (f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{_quote(name)}"; '
+                f'filename="{_quote(filename)}"\r\n'
+                'Content-Type: application/octet-stream\r\n'
+                '\r\n').encode('utf-8')
+
+    def _trailer(self) -> bytes:
+        return f'--{self.boundary}--\r\n'.encode('utf-8')
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __iter__(self) -> Iterator[bytes]:
+        for name, value in self.fields:
+            yield self._field(name, value)
+        for name, filename, path in self.files:
+            yield self._file_head(name, filename)
+            checksums = {}
+            yield from read_chunks(path, checksums)
+            self.checksums[path] = checksums
+            yield b'\r\n'
+        yield self._trailer()
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+
+Page = Tuple[List, Optional[str]]
+
+
+def iter_pages(fetch: Callable[[Optional[str]], Page],
+               prefetch: bool = True) -> Iterator:
+    """
+    Iterate over the items of a paged listing. fetch is called with None for
+    the first page and then with each page's continuation token, returning
+    the page's items and the token for the next page, or None after the last.
+
+    With prefetch, the next page is requested on a background thread as soon
+    as a page arrives, so its round trip overlaps with the caller's work on
+    the current one. At most two pages are held at any time.
+    """
+    pool = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    try:
+        items, token = fetch(None)
+        while True:
+            pending = None
+            if pool is not None and token is not None:
+                pending = pool.submit(fetch, token)
+            yield from items
+            if token is None:
+                return
+            items, token = (pending.result() if pending is not None
+                            else fetch(token))
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False)
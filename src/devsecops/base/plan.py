@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.bulk import BulkResult, run_bulk
+from collections import namedtuple
+from typing import Callable, List
+
+Step = namedtuple('Step', ['stage', 'action', 'kind', 'name', 'detail',
+                           'call', 'args', 'depends'])
+Step.__doc__ = """
+One request in a plan. Steps of a stage only run once every earlier stage
+has finished, and a step is skipped if any of the (kind, name) pairs it
+depends on failed.
+"""
+
+
+class ManifestError(ValueError):
+    pass
+
+
+class Plan(object):
+    """
+    The requests needed to bring a server to a desired state, and the number
+    of requests it took to find out
+    """
+
+    def __init__(self, api=None) -> None:
+        self.api = api
+        self.steps = []
+        self.unchanged = []
+        self.reads = 0
+
+    def add(self, *args) -> None:
+        self.steps.append(Step(*args))
+
+    def summary(self) -> str:
+        """
+        Describe the plan, a line per step
+        """
+        creates = sum(step.action == 'create' for step in self.steps)
+        updates = len(self.steps) - creates
+        lines = [f'Plan: {creates} to create, {updates} to update, '
+                 f'{len(self.unchanged)} unchanged '
+                 f'({self.reads} requests to read state, '
+                 f'{len(self.steps)} to apply)']
+        for step in sorted(self.steps, key=lambda step: step.stage):
+            sign = '+' if step.action == 'create' else '~'
+            detail = f' ({step.detail})' if step.detail else ''
+            lines.append(f'  {sign} {step.kind} {step.name}{detail}')
+        return '\n'.join(lines)
+
+
+def run_steps(steps: List[Step], parallel: int = 1) -> List[BulkResult]:
+    """
+    Make the calls of steps concurrently on up to parallel threads
+    """
+    # Steps are namedtuples, so wrap them to stop run_bulk unpacking them
+    return run_bulk(lambda step: step.call(*step.args),
+                    [(step,) for step in steps], parallel)
+
+
+def apply_plan(plan: Plan, parallel: int = 1,
+               run: Callable[[List[Step], int], List[BulkResult]] = run_steps
+               ) -> List[BulkResult]:
+    """
+    Run a plan's steps stage by stage, each stage's steps through run, by
+    default concurrently on up to parallel threads, returning a BulkResult
+    per step. A step fails if its call raises or returns None. Steps
+    depending on something that failed are not run, and get a ManifestError
+    as their error.
+    """
+    results = []
+    failed = set()
+    for stage in sorted({step.stage for step in plan.steps}):
+        steps = [step for step in plan.steps if step.stage == stage]
+        blocked = [failed.intersection(step.depends) for step in steps]
+        runnable = [step for step, blockers in zip(steps, blocked)
+                    if not blockers]
+        outcomes = iter(run(runnable, parallel) if runnable else [])
+        for step, blockers in zip(steps, blocked):
+            if blockers:
+                result = BulkResult(step, None, ManifestError(
+                    'skipped, depends on failed ' + ', '.join(
+                        f'{kind} {name}' for kind, name in sorted(blockers)
+                    )
+                ))
+            else:
+                result = next(outcomes)._replace(item=step)
+            if result.error is not None or result.value is None:
+                failed.add((step.kind, step.name))
+            results.append(result)
+    return results
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection
+from urllib.parse import urlsplit
+from typing import Tuple
+import requests
+import socket
+import threading
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+# Keep idle pooled connections alive through firewalls and load balancers
+KEEPALIVE_SOCKET_OPTIONS = HTTPConnection.default_socket_options + [
+    (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+]
+
+
+class SharedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connection pool outlives the sessions that mount it
+    """
+
+    def init_poolmanager(self, *args, **kwargs) -> None:
+        kwargs.setdefault('socket_options', KEEPALIVE_SOCKET_OPTIONS)
+        super().init_poolmanager(*args, **kwargs)
+
+    def close(self) -> None:
+        """
+        Sessions close their adapters on sign out, which must not drop
+        connections that other handlers are still using
+        """
+        pass
+
+    def _close(self) -> None:
+        """
+        Really close the pooled connections
+        """
+        super().close()
+
+
+class PoolRegistry(object):
+    """
+    Process-wide registry of HTTP connection pools keyed by scheme, host and
+    port, so that every handler talking to the same service reuses the same
+    keep-alive connections instead of paying for new TCP and TLS handshakes.
+    """
+
+    def __init__(self, pool_connections: int = 4, pool_maxsize: int = 16,
+                 pool_block: bool = False) -> None:
+        """
+        Initialize an empty registry with the default sizing for new pools
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self._adapters = {}
+        self._lock = threading.Lock()
+
+    def configure(self, pool_connections: int = None,
+                  pool_maxsize: int = None, pool_block: bool = None) -> None:
+        """
+        Change the sizing used for pools created from now on. pool_maxsize is
+        the number of connections kept per host, and with pool_block set it is
+        also the most connections that will ever be open to a host at once.
+        """
+        if pool_connections is not None:
+            self.pool_connections = pool_connections
+        if pool_maxsize is not None:
+            self.pool_maxsize = pool_maxsize
+        if pool_block is not None:
+            self.pool_block = pool_block
+
+    @staticmethod
+    def key(url: str) -> Tuple[str, str, int]:
+        """
+        Returns the (scheme, host, port) a URL's connections are pooled by
+        """
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        return (scheme, (parts.hostname or '').lower(),
+                parts.port or DEFAULT_PORTS.get(scheme))
+
+    def adapter(self, url: str) -> SharedHTTPAdapter:
+        """
+        Returns the shared adapter for the origin of url, creating it on first
+        use
+        """
+        key = self.key(url)
+        with self._lock:
+            if key not in self._adapters:
+                self._adapters[key] = SharedHTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    pool_block=self.pool_block
+                )
+            return self._adapters[key]
+
+    def session(self, url: str) -> requests.Session:
+        """
+        Returns a new session, with its own headers and cookies, that sends
+        requests for the origin of url through the shared pool
+        """
+        parts = urlsplit(url)
+        session = requests.session()
+        session.mount(f'{parts.scheme}://{parts.netloc}/', self.adapter(url))
+        return session
+
+    def clear(self) -> None:
+        """
+        Close every pooled connection and forget the pools
+        """
+        with self._lock:
+            adapters, self._adapters = self._adapters, {}
+        for adapter in adapters.values():
+            adapter._close()
+
+
+pools = PoolRegistry()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.pool import pools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+from time import time
+import json
+import os
+import os.path
+import requests
+import tempfile
+import threading
+
+DEFAULT_TIMEOUT = (3.05, 10)
+DEFAULT_TTL = 60
+CACHE_FILE = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'devsecops-api', 'probes.json'
+)
+
+
+class Probe(object):
+    """
+    Liveness checks for services, remembering successful checks for ttl
+    seconds so that handlers created in quick succession, or in successive
+    CLI runs when persisted, don't each hit the service before doing any
+    real work.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_TTL,
+                 timeout: Tuple[float, float] = DEFAULT_TIMEOUT) -> None:
+        """
+        Initialize a probe with an empty in-memory cache
+        """
+        self.ttl = ttl
+        self.timeout = timeout
+        self.cache_file = None
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def target(url: str, health_endpoint: str = None) -> str:
+        """
+        Returns the URL that is probed for a service
+        """
+        if health_endpoint is None:
+            return url
+        return f'{url.rstrip("/")}/{health_endpoint}'
+
+    def persist(self, cache_file: str = CACHE_FILE) -> None:
+        """
+        Keep successful checks in cache_file between processes, loading any
+        that are still fresh
+        """
+        self.cache_file = cache_file
+        try:
+            with open(cache_file, encoding='utf-8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time()
+        with self._lock:
+            for target, expires in stored.items():
+                if expires > now:
+                    self._cache[target] = expires
+
+    def _save(self) -> None:
+        """
+        Write the fresh cache entries to the persisted cache file
+        """
+        now = time()
+        with self._lock:
+            fresh = {target: expires for target, expires
+                     in self._cache.items() if expires > now}
+        directory = os.path.dirname(self.cache_file)
+        try:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+            fd, path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(fresh, f)
+            os.replace(path, self.cache_file)
+        except OSError:
+            pass
+
+    def _request(self, target: str, method: str,
+                 stream: bool = False) -> requests.Response:
+        """
+        Make a probe request over the shared pool. Streamed responses are
+        closed without reading their body.
+        """
+        with pools.session(target) as session:
+            response = session.request(method, target, verify=False,
+                                       timeout=self.timeout, stream=stream,
+                                       allow_redirects=True)
+            if stream:
+                response.close()
+            return response
+
+    def check(self, url: str, health_endpoint: str = None) -> bool:
+        """
+        Returns whether the service at url answers its health endpoint, or a
+        HEAD of url itself if it has none, with a 200. Successes are cached.
+        """
+        target = self.target(url, health_endpoint)
+        with self._lock:
+            if self._cache.get(target, 0) > time():
+                return True
+        method = 'get' if health_endpoint is not None else 'head'
+        try:
+            response = self._request(target, method)
+            if response.status_code == 405 and method == 'head':
+                response = self._request(target, 'get', stream=True)
+        except requests.exceptions.RequestException:
+            return False
+        if response.status_code != 200:
+            return False
+        with self._lock:
+            self._cache[target] = time() + self.ttl
+        if self.cache_file is not None:
+            self._save()
+        return True
+
+    def check_many(self, services: List[Tuple[str, str]]) -> List[bool]:
+        """
+        Probe several (url, health_endpoint) pairs at once, returning whether
+        each is online in the same order
+        """
+        if not services:
+            return []
+        with ThreadPoolExecutor(max_workers=len(services)) as executor:
+            return list(executor.map(lambda service: self.check(*service),
+                                     services))
+
+    def forget(self, url: str = None, health_endpoint: str = None) -> None:
+        """
+        Drop the cached result for one service, or for all of them
+        """
+        with self._lock:
+            if url is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(self.target(url, health_endpoint), None)
+
+
+probes = Probe()
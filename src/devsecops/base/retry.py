@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import List
+import random
+import requests
+
+IDEMPOTENT_METHODS = frozenset(['get', 'head', 'options', 'put', 'delete'])
+RETRY_STATUSES = frozenset([429, 502, 503, 504])
+
+
+def retry_after(response: requests.Response) -> float:
+    """
+    Returns the number of seconds a response's Retry-After header asks us to
+    wait, or None if it doesn't have a usable one
+    """
+    value = response.headers.get('Retry-After')
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+class RetryPolicy(object):
+    """
+    Decides whether and when a failed API request is retried. Delays grow
+    exponentially with full jitter, a Retry-After header from the server takes
+    precedence, and no retry is scheduled past the request's deadline.
+    """
+
+    def __init__(self, max_attempts: int = 3, backoff_factor: float = 0.5,
+                 max_backoff: float = 30.0, jitter: bool = True,
+                 deadline: float = None,
+                 retry_statuses: List[int] = RETRY_STATUSES) -> None:
+        """
+        Initialize a retry policy. max_attempts counts the first try, and
+        deadline is the default number of seconds a whole call, retries
+        included, may take.
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.deadline = deadline
+        self.retry_statuses = frozenset(retry_statuses)
+
+    def retryable(self, method_name: str, safe: bool = False,
+                  response: requests.Response = None,
+                  error: Exception = None, ok: List[int] = [200]) -> bool:
+        """
+        Returns whether the outcome of one attempt is worth retrying
+        """
+        if isinstance(error, requests.exceptions.ConnectTimeout):
+            # The request never reached the server, so any verb is safe
+            return True
+        if not (safe or method_name.lower() in IDEMPOTENT_METHODS):
+            return False
+        if error is not None:
+            return isinstance(error, (requests.exceptions.ConnectionError,
+                                      requests.exceptions.Timeout))
+        return (response.status_code not in ok and
+                response.status_code in self.retry_statuses)
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Returns the delay before retrying after the given attempt number
+        """
+        delay = min(self.max_backoff,
+                    self.backoff_factor * (2 ** (attempt - 1)))
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def next_delay(self, attempt: int, remaining: float = None,
+                   response: requests.Response = None) -> float:
+        """
+        Returns how long to wait before the next attempt, or None if another
+        attempt is not allowed. remaining is the time left before the call's
+        deadline, if it has one.
+        """
+        if attempt >= self.max_attempts:
+            return None
+        delay = None
+        if response is not None:
+            delay = retry_after(response)
+        if delay is None:
+            delay = self.backoff(attempt)
+        if remaining is not None and delay >= remaining:
+            return None
+        return delay
+
+
+class NoRetry(RetryPolicy):
+    """
+    Policy that never retries
+    """
+
+    def __init__(self) -> None:
+        super().__init__(max_attempts=1)
+
+
+_policies = {None: RetryPolicy()}
+
+
+def set_policy(policy: RetryPolicy, service_name: str = None) -> None:
+    """
+    Set the retry policy used by handlers for service_name, or the default
+    for all services if no service_name is given
+    """
+    _policies[service_name] = policy
+
+
+def get_policy(service_name: str = None) -> RetryPolicy:
+    """
+    Returns the retry policy configured for service_name, falling back to the
+    default policy
+    """
+    return _policies.get(service_name, _policies[None])
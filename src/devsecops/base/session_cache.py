@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from time import time
+import hashlib
+import json
+import os
+import os.path
+import stat
+
+CACHE_DIR = os.path.join(
+    os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')),
+    'devsecops-api', 'sessions'
+)
+DEFAULT_TTL = 12 * 60 * 60
+
+
+class SessionCache(object):
+    """
+    On-disk store of signed-in session state (auth tickets, cookies, CSRF
+    tokens) keyed by API URL and username, so that later processes can skip
+    the sign-in handshake. Entries live in a directory only the current user
+    can read, one file per session readable only by its owner, and are
+    ignored once older than ttl seconds.
+    """
+
+    def __init__(self, directory: str = CACHE_DIR,
+                 ttl: float = DEFAULT_TTL) -> None:
+        """
+        Initialize a session cache in directory
+        """
+        self.directory = directory
+        self.ttl = ttl
+
+    def _path(self, url: str, username: str) -> str:
+        """
+        Returns the file holding the session for url and username
+        """
+        key = hashlib.sha256(f'{url}\0{username}'.encode('utf-8'))
+        return os.path.join(self.directory, f'{key.hexdigest()}.json')
+
+    def load(self, url: str, username: str) -> dict:
+        """
+        Returns the stored state for url and username, or None if there is
+        none, it has expired, or its file is not private to this user
+        """
+        path = self._path(url, username)
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            return None
+        with os.fdopen(fd, encoding='utf-8') as f:
+            info = os.fstat(f.fileno())
+            if (info.st_uid != os.getuid() or
+                    stat.S_IMODE(info.st_mode) & 0o077):
+                self.delete(url, username)
+                return None
+            try:
+                state = json.load(f)
+            except ValueError:
+                state = None
+        if state is None or state.get('expires', 0) <= time():
+            self.delete(url, username)
+            return None
+        return state
+
+    def save(self, url: str, username: str, state: dict) -> None:
+        """
+        Store state for url and username, replacing any earlier state
+        """
+        os.makedirs(self.directory, mode=0o700, exist_ok=True)
+        os.chmod(self.directory, 0o700)
+        path = self._path(url, username)
+        state = dict(state, expires=time() + self.ttl)
+        partial = f'{path}.{os.getpid()}'
+        fd = os.open(partial, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            os.fchmod(f.fileno(), 0o600)
+            json.dump(state, f)
+        os.replace(partial, path)
+
+    def delete(self, url: str, username: str) -> None:
+        """
+        Forget the stored state for url and username
+        """
+        try:
+            os.remove(self._path(url, username))
+        except OSError:
+            pass
+
+
+_caches = {None: None}
+
+
+def set_cache(cache: SessionCache, service_name: str = None) -> None:
+    """
+    Set the session cache used by handlers for service_name, or the default
+    for all services if no service_name is given. None disables caching.
+    """
+    _caches[service_name] = cache
+
+
+def get_cache(service_name: str = None) -> SessionCache:
+    """
+    Returns the session cache configured for service_name, falling back to
+    the default, which is no cache at all
+    """
+    return _caches.get(service_name, _caches[None])
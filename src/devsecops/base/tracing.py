@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from collections import deque, namedtuple
+from typing import Callable, List, TextIO
+import json
+import logging
+import threading
+
+TraceEvent = namedtuple('TraceEvent', [
+    'time', 'service', 'method', 'endpoint', 'template', 'status', 'latency',
+    'bytes_out', 'bytes_in', 'attempt', 'error', 'body'
+])
+TraceEvent.__doc__ = """
+Compact record of one attempt at an API request. template is the endpoint
+with its parameters left out. status is None and error holds the exception
+class name when no response was received. body is only set when body capture
+has been opted into.
+"""
+
+
+def format_event(event: TraceEvent) -> str:
+    """
+    Render an event as a single human readable line
+    """
+    line = (f'{event.method.upper()} {event.endpoint} -> '
+            f'{event.status or event.error} in {event.latency * 1000:.1f}ms '
+            f'({event.bytes_out}B out, {event.bytes_in}B in, '
+            f'attempt {event.attempt})')
+    if event.body is not None:
+        line += f' body: {event.body}'
+    return line
+
+
+class LoggingSink(object):
+    """
+    Trace sink that writes each event at DEBUG to the logger of the service
+    that made the request
+    """
+
+    def __call__(self, event: TraceEvent) -> None:
+        logger = logging.getLogger(event.service)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(format_event(event))
+
+
+class JsonLinesSink(object):
+    """
+    Trace sink that writes each event as a JSON object per line to a stream
+    """
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def __call__(self, event: TraceEvent) -> None:
+        line = json.dumps(event._asdict())
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+class Tracer(object):
+    """
+    Collects TraceEvents from api_req. Events are kept as tuples in a ring
+    buffer of the most recent requests and passed to any registered sinks;
+    nothing is rendered to text unless a sink or a dump asks for it. With no
+    sinks and a zero sized buffer, the tracer is disabled and api_req skips
+    building events entirely, which is how it starts until a sink is added
+    or a capacity set.
+    """
+
+    def __init__(self, capacity: int = 0) -> None:
+        """
+        Initialize a tracer keeping the last capacity events, none by default
+        """
+        self.sinks = []
+        self.capture_bodies = 0
+        self.set_capacity(capacity)
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks) or self.buffer is not None
+
+    def set_capacity(self, capacity: int) -> None:
+        """
+        Resize the ring buffer, disabling it when capacity is 0
+        """
+        self.buffer = deque(maxlen=capacity) if capacity > 0 else None
+
+    def add_sink(self, sink: Callable[[TraceEvent], None]) -> None:
+        """
+        Register a callable to receive every event, once
+        """
+        if sink not in self.sinks:
+            self.sinks.append(sink)
+
+    def remove_sink(self, sink: Callable[[TraceEvent], None]) -> None:
+        """
+        Stop sending events to a sink
+        """
+        if sink in self.sinks:
+            self.sinks.remove(sink)
+
+    def record(self, event: TraceEvent) -> None:
+        """
+        Store an event and hand it to the sinks
+        """
+        if self.buffer is not None:
+            self.buffer.append(event)
+        for sink in self.sinks:
+            sink(event)
+
+    def recent(self, service: str = None) -> List[TraceEvent]:
+        """
+        Returns the buffered events, oldest first, optionally only those for
+        one service
+        """
+        if self.buffer is None:
+            return []
+        return [event for event in list(self.buffer)
+                if service is None or event.service == service]
+
+    def dump(self, service: str = None) -> str:
+        """
+        Returns the buffered events rendered one per line
+        """
+        return '\n'.join(format_event(event)
+                         for event in self.recent(service))
+
+
+tracer = Tracer()
+# The one LoggingSink, on the tracer while any handler logs at DEBUG
+logging_sink = LoggingSink()
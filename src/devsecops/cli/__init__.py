@@ -1,4 +1,7 @@
 # SPDX-License-Identifier: BSD-2-Clause
+from devsecops.base import metrics, probe, retry, tracing
+from devsecops.base import session_cache as sessions
+from devsecops.cli import opts
 import click
 
 
@@ -17,33 +20,71 @@ class AliasedGroup(click.Group):
         ctx.fail('Too many matches: %s' % ', '.join(sorted(matches)))
 
 
+def configure_service(service_name, retries=None, retry_backoff=None,
+                      retry_deadline=None, session_cache=False):
+    """Apply service group options to the handlers for service_name"""
+    if session_cache:
+        sessions.set_cache(sessions.SessionCache(), service_name=service_name)
+    if (retries, retry_backoff, retry_deadline) != (None, None, None):
+        default = retry.get_policy(service_name)
+        retry.set_policy(retry.RetryPolicy(
+            max_attempts=(default.max_attempts if retries is None
+                          else retries + 1),
+            backoff_factor=(default.backoff_factor if retry_backoff is None
+                            else retry_backoff),
+            max_backoff=default.max_backoff,
+            jitter=default.jitter,
+            deadline=retry_deadline,
+            retry_statuses=default.retry_statuses
+        ), service_name=service_name)
+
+
 @click.group(cls=AliasedGroup, name='main')
 @click.version_option()
-def main():
+@opts.trace_opts
+@opts.probe_opts
+@opts.metrics_opts
+def main(trace_file, trace_bodies, trace_history, probe_ttl, probe_cache,
+         metrics_out, metrics_format):
     """
     CLI to manipulate the APIs of services supported for the DevSecOps workshop
     in order to facilitate manipulating the APIs of instantiated services
     directly from the command line.
     """
-    pass
+    if trace_file is not None:
+        tracing.tracer.add_sink(tracing.JsonLinesSink(trace_file))
+    tracing.tracer.capture_bodies = trace_bodies
+    tracing.tracer.set_capacity(trace_history)
+    if probe_ttl is not None:
+        probe.probes.ttl = probe_ttl
+    if probe_cache:
+        probe.probes.persist()
+    if metrics_out is not None:
+        metrics.enable()
+        click.get_current_context().call_on_close(
+            lambda: metrics.collector.write(metrics_out, metrics_format)
+        )
 
 
 @main.group(cls=AliasedGroup, name='quay')
-def dso_quay():
+@opts.service_opts
+def dso_quay(**kwargs):
     """Manage a Quay API instance"""
-    pass
+    configure_service('Quay', **kwargs)
 
 
 @main.group(cls=AliasedGroup, name='nexus')
-def dso_nexus():
+@opts.service_opts
+def dso_nexus(**kwargs):
     """Manage a Nexus API instance"""
-    pass
+    configure_service('Nexus', **kwargs)
 
 
 @main.group(cls=AliasedGroup, name='sonarqube')
-def dso_sonarqube():
+@opts.service_opts
+def dso_sonarqube(**kwargs):
     """Manage a SonarQube API instance"""
-    pass
+    configure_service('SonarQube', **kwargs)
 
 
-from devsecops.cli.services import quay, nexus, sonarqube  # noqa E402,F401
+from devsecops.cli.services import quay, nexus, sonarqube, status  # noqa E402,F401
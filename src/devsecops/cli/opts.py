@@ -1,4 +1,5 @@
 # SPDX-License-Identifier: BSD-2-Clause
+from devsecops.nexus.inventory import MATCH_MODES
 import click
 
 add_users_epilog = """
@@ -7,6 +8,42 @@ specify them in any order you wish, but they will be paired up in the order
 in which they were received for creation.
 """
 
+apply_epilog = """
+\b
+The manifest looks like this, with every section optional:
+  repositories:
+    - name: libs              # kind is maven unless given
+    - name: central
+      kind: proxy             # maven, proxy, raw, docker or npm
+      remote_url: https://repo1.maven.org/maven2/
+  groups:
+    - name: maven-public
+      members: [libs, central]
+  roles:
+    - id: developers
+      privileges: [nx-repository-view-*-*-*]
+  users:
+    - name: alice
+      password: secret
+      roles: [developers]
+"""
+
+quay_apply_epilog = """
+\b
+The manifest looks like this, with every section optional:
+  organizations:
+    - name: devsecops
+      robots:
+        - name: deployer
+          description: Pushes release images
+      repositories:
+        - name: app
+          description: The application image
+          permissions:        # read, write or admin
+            deployer: write   # a robot of the organization
+            alice: read       # a user
+"""
+
 
 def url_arg(f):
     return click.argument('url', metavar='URL')(f)
@@ -67,7 +104,8 @@ def add_repo_opt(f):
     for option in reversed([
         add_org_opt,
         click.option('--repo-name', '-n', required=True,
-                     help='the repository to add to the org'),
+                     help=('the repository to add to the org (separate '
+                           'multiples with commas)')),
         click.option('--repo-description', '-d', required=False,
                      help='the description of the repository'),
     ]):
@@ -79,7 +117,8 @@ def add_robot_opt(f):
     for option in reversed([
         add_org_opt,
         click.option('--robot-name', '-r', required=True,
-                     help='the robot name to add to the org'),
+                     help=('the robot name to add to the org (separate '
+                           'multiples with commas)')),
         click.option('--robot-description', '-d', required=False,
                      help='the description of the robot account'),
     ]):
@@ -103,6 +142,141 @@ def search_user_opt(f):
                         help='the username to search for')(f)
 
 
+def parallel_opt(f):
+    return click.option('--parallel', type=click.IntRange(min=1), default=1,
+                        show_default=True,
+                        help='the number of requests to run at once')(f)
+
+
+def batch_opt(f):
+    return click.option('--batch', is_flag=True, default=False,
+                        help=('send the changes to the server in as few '
+                              'script runs as possible, falling back to '
+                              'one request each if scripting is disabled'))(f)
+
+
+def match_mode_opt(f):
+    return click.option('--match-mode', '-m', default='exact',
+                        show_default=True,
+                        type=click.Choice(MATCH_MODES),
+                        help='how names are matched against the query')(f)
+
+
+def trace_opts(f):
+    for option in reversed([
+        click.option('--trace-file', type=click.File('w'), default=None,
+                     help=('write a JSON line describing every API request '
+                           'to this file')),
+        click.option('--trace-bodies', type=click.IntRange(min=0),
+                     default=0,
+                     help=('capture up to this many characters of each '
+                           'response body in traces')),
+        click.option('--trace-history', type=click.IntRange(min=0),
+                     default=0,
+                     help=('keep this many recent requests to log, at -v, '
+                           'when a command fails'))
+    ]):
+        f = option(f)
+    return f
+
+
+def metrics_opts(f):
+    for option in reversed([
+        click.option('--metrics-out', type=click.Path(dir_okay=False),
+                     default=None,
+                     help=('write per-endpoint request metrics to this file '
+                           'when the run ends')),
+        click.option('--metrics-format', type=click.Choice(['prometheus',
+                                                            'json']),
+                     default=None,
+                     help=('the format of --metrics-out, by default JSON for '
+                           '.json files and Prometheus text otherwise'))
+    ]):
+        f = option(f)
+    return f
+
+
+def probe_opts(f):
+    for option in reversed([
+        click.option('--probe-ttl', type=float, default=None,
+                     help=('how many seconds a successful service liveness '
+                           'check is trusted for')),
+        click.option('--probe-cache/--no-probe-cache', default=False,
+                     help=('remember successful liveness checks between '
+                           'runs'))
+    ]):
+        f = option(f)
+    return f
+
+
+def retry_opts(f):
+    for option in reversed([
+        click.option('--retries', type=click.IntRange(min=0), default=None,
+                     help=('how many times to retry failed idempotent '
+                           'requests')),
+        click.option('--retry-backoff', type=float, default=None,
+                     help=('the base delay in seconds for exponential '
+                           'backoff between retries')),
+        click.option('--retry-deadline', type=float, default=None,
+                     help=('the most seconds any one API call may take, '
+                           'retries included'))
+    ]):
+        f = option(f)
+    return f
+
+
+def session_cache_opt(f):
+    return click.option('--session-cache/--no-session-cache', default=False,
+                        envvar='DEVSECOPS_SESSION_CACHE',
+                        help=('reuse signed-in sessions between runs instead '
+                              'of signing in every time'))(f)
+
+
+def service_opts(f):
+    for option in reversed([
+        retry_opts,
+        session_cache_opt
+    ]):
+        f = option(f)
+    return f
+
+
+def token_opt(f):
+    return click.option('--token', '-t', envvar='QUAY_TOKEN', default=None,
+                        help=('an OAuth token to authorize requests with, '
+                              'instead of the login username and '
+                              'password'))(f)
+
+
+def quay_opts(f):
+    for option in reversed([
+        url_arg,
+        click.option('--login-username', '-U', default=None,
+                     help='the username with which to log in'),
+        click.option('--login-password', '-P', default=None,
+                     help='the password for the login user'),
+        token_opt,
+        verbose_opt
+    ]):
+        f = option(f)
+    return f
+
+
+def mint_token_opt(f):
+    for option in reversed([
+        click.option('--client-id', '-c', required=True,
+                     help='the client ID of the OAuth application'),
+        click.option('--scopes', '-s', default=None,
+                     help=('the scopes to grant the token (separate '
+                           'multiples with commas)')),
+        click.option('--redirect-uri', default=None,
+                     help=("the application's redirect URI, if not the "
+                           "instance's own oauth/localapp"))
+    ]):
+        f = option(f)
+    return f
+
+
 def default_opts(f):
     for option in reversed([
         url_arg,
@@ -1,11 +1,65 @@
 # SPDX-License-Identifier: BSD-2-Clause
 from devsecops.cli import opts
 from devsecops.cli import dso_nexus
+from devsecops.nexus import mirror
 from devsecops.nexus import nexus
+from devsecops.nexus import state
+from devsecops.nexus import upload
+from devsecops.nexus.batch import run_batch
 
 from pprint import pprint
 import click
+import json
+import os
 import sys
+import yaml
+
+
+def create_repos(api, names, kind, parallel, batch):
+    """Add repositories by name through api.add_repos, or as a batch"""
+    if not batch:
+        return api.add_repos(names, kind, parallel)
+    method = {'maven': 'add_repo', 'raw': 'add_raw_repo',
+              'docker': 'add_docker_repo', 'npm': 'add_npm_repo'}[kind]
+    return [result._replace(item=result.item[1][0])
+            for result in run_batch(api, [(method, (name,))
+                                          for name in names], parallel)]
+
+
+def add_repos(url, login_username, login_password, verbose,
+              repository_names, kind, parallel, batch=False):
+    """Add the comma separated repositories of one kind that don't exist yet,
+    printing a line for each in the order given, and return the exit code"""
+    exit_code = 0
+    errors = {}
+    names = repository_names.split(',')
+    with nexus.Nexus(
+        url, login_username, login_password, verbosity=verbose
+    ) as api:
+        inventory = api.inventory()
+        missing = [name for name in dict.fromkeys(names)
+                   if name not in inventory]
+        results = {result.item: result
+                   for result in create_repos(api, missing, kind, parallel,
+                                              batch)}
+    for name in names:
+        result = results.pop(name, None)
+        if result is None and name in errors:
+            exit_code += 1
+            print(f'{name} failed')
+        elif result is None:
+            print(f'{name} ok')
+        elif result.error is not None or result.value is None:
+            exit_code += 1
+            errors[name] = result.error
+            print(f'{name} failed')
+        else:
+            print(f'{name} added')
+    for repo, error in errors.items():
+        if error is not None:
+            sys.stderr.write(f'Error adding {repo}:\n{error}\n')
+    sys.stderr.flush()
+    return exit_code
 
 
 @dso_nexus.command(name='add-user', epilog=opts.add_users_epilog)
@@ -86,6 +140,39 @@ def dso_nexus_grant_role_to_user(url, login_username, login_password, verbose, r
     exit(exit_code)
 
 
+@dso_nexus.command(name='grant-roles')
+@opts.default_opts
+@click.option('--role-ids', '-r', required=True,
+              help=('the roles to grant '
+                    '(separate multiples with commas)'))
+@click.option('--user-names', '-u', required=True,
+              help=('the users to grant every one of the roles to '
+                    '(separate multiples with commas)'))
+@opts.parallel_opt
+def dso_nexus_grant_roles(url, login_username, login_password, verbose,
+                          role_ids, user_names, parallel):
+    """Grant each of a list of roles to each of a list of users on the Nexus
+    instance specified by URL, leaving alone users who already have them"""
+    exit_code = 0
+    grants = [(user_name, role_id) for user_name in user_names.split(',')
+              for role_id in role_ids.split(',')]
+    with nexus.Nexus(
+        url, login_username, login_password, verbosity=verbose
+    ) as api:
+        results = api.grant_roles(grants, parallel)
+    for result in results:
+        user_name, role_id = result.item
+        if result.error is None:
+            print(f'grant {role_id} to {user_name} '
+                  f'{"ok" if result.value == "unchanged" else "changed"}')
+        else:
+            exit_code += 1
+            print(f'grant {role_id} to {user_name} failed')
+            sys.stderr.write(f'Error granting {role_id} to {user_name}:\n'
+                             f'{result.error}\n')
+    exit(exit_code)
+
+
 @dso_nexus.command(name='search-roles')
 @opts.default_opts
 @opts.add_role_opt
@@ -135,14 +222,15 @@ def dso_nexus_search_user(url, login_username, login_password, verbose,
 @opts.default_opts
 @click.option('--repository-name', '-r', required=True,
               help='the name of the repository to search for')
+@opts.match_mode_opt
 def dso_nexus_search_repo(url, login_username, login_password, verbose,
-                          repository_name):
+                          repository_name, match_mode):
     """Search for and display information about a repository in the Nexus
     instance specified by URL"""
     with nexus.Nexus(
         url, login_username, login_password, verbosity=verbose
     ) as api:
-        pprint(api.search_repos(repository_name))
+        pprint(api.search_repos(repository_name, mode=match_mode))
 
 
 @dso_nexus.command(name='list-repositories')
@@ -155,39 +243,170 @@ def dso_nexus_list_repos(url, login_username, login_password, verbose):
         pprint(api.list_repos())
 
 
-@dso_nexus.command(name='add-repository')
+@dso_nexus.command(name='search-components')
 @opts.default_opts
-@click.option('--repository-names', '-r', required=True,
-              help=('the name of the repositories to add '
-                    '(separate multiples with commas)'))
-def dso_nexus_add_repo(url, login_username, login_password, verbose,
-                       repository_names):
-    """Add new Maven repositories to the Nexus instance specified by URL"""
+@click.option('--repository', '-r', default=None,
+              help='the repository to list or search in')
+@click.option('--format', '-f', 'repo_format', default=None,
+              help='only components of this format, such as maven2 or npm')
+@click.option('--group', '-g', default=None,
+              help='only components in this group, * matches anything')
+@click.option('--name', '-n', default=None,
+              help='only components with this name, * matches anything')
+@click.option('--component-version', default=None,
+              help='only components of this version, * matches anything')
+@click.option('--keyword', '-q', default=None,
+              help='a keyword to search for')
+@click.option('--assets', is_flag=True, default=False,
+              help='output the matching assets rather than components')
+@click.option('--full', is_flag=True, default=False,
+              help='output the records as the server sent them')
+def dso_nexus_search_components(url, login_username, login_password, verbose,
+                                repository, repo_format, group, name,
+                                component_version, keyword, assets, full):
+    """Stream the components or assets in a repository, or those matching a
+    search, from the Nexus instance specified by URL as one JSON object per
+    line"""
+    query = {'format': repo_format, 'group': group, 'name': name,
+             'version': component_version, 'q': keyword}
+    if repository is None and not any(query.values()):
+        raise click.UsageError('Give a repository or something to search '
+                               'for')
     exit_code = 0
-    errors = {}
     with nexus.Nexus(
         url, login_username, login_password, verbosity=verbose
     ) as api:
-        for repository_name in repository_names.split(','):
-            if not api.search_repos(repository_name):
-                try:
-                    if api.add_repo(repository_name) is not None:
-                        print(f'{repository_name} added')
-                    else:
-                        exit_code += 1
-                        print(f'{repository_name} failed')
-                except Exception as e:
+        if any(query.values()):
+            records = api.iter_search(assets, not full,
+                                      repository=repository, **query)
+        elif assets:
+            records = api.iter_assets(repository, not full)
+        else:
+            records = api.iter_components(repository, not full)
+        try:
+            for record in records:
+                sys.stdout.write(json.dumps(record, separators=(',', ':')))
+                sys.stdout.write('\n')
+        except nexus.UnexpectedApiResponse as e:
+            sys.stdout.flush()
+            sys.stderr.write(f'Listing stopped by an unexpected response:\n'
+                             f'{e}\n')
+            exit_code = 1
+    sys.stdout.flush()
+    exit(exit_code)
+
+
+@dso_nexus.command(name='upload')
+@opts.default_opts
+@click.option('--repository', '-r', required=True,
+              help='the hosted raw or maven2 repository to upload to')
+@click.option('--directory', '-d', default='/', show_default=True,
+              help='for raw repositories, the directory to upload into')
+@click.option('--group-id', '-g', default=None,
+              help='for maven2 repositories, the groupId of the component')
+@click.option('--artifact-id', '-a', default=None,
+              help='for maven2 repositories, the artifactId of the component')
+@click.option('--component-version', default=None,
+              help='for maven2 repositories, the version of the component')
+@click.option('--force', is_flag=True, default=False,
+              help=('upload files even if the server already has them with '
+                    'the same checksum'))
+@opts.parallel_opt
+@click.argument('files', nargs=-1, required=True,
+                type=click.Path(exists=True))
+def dso_nexus_upload(url, login_username, login_password, verbose,
+                     repository, directory, group_id, artifact_id,
+                     component_version, force, parallel, files):
+    """Upload FILES to a hosted repository on the Nexus instance specified by
+    URL, skipping those it already has. Directories given for a raw
+    repository are uploaded with their contents' relative paths."""
+    exit_code = 0
+    with nexus.Nexus(
+        url, login_username, login_password, verbosity=verbose
+    ) as api:
+        repo = api.inventory().get(repository)
+        if repo is None:
+            sys.stderr.write(f'Repository {repository} does not exist\n')
+            exit(1)
+        if repo.get('format') == 'raw':
+            uploads = upload.raw_uploads(files, directory)
+        elif repo.get('format') == 'maven2':
+            if not (group_id and artifact_id and component_version):
+                raise click.UsageError('Uploading to a maven2 repository '
+                                       'needs --group-id, --artifact-id '
+                                       'and --component-version')
+            if any(os.path.isdir(file) for file in files):
+                raise click.UsageError('Only files can be uploaded to a '
+                                       'maven2 repository')
+            uploads = [upload.maven_upload(file, group_id, artifact_id,
+                                           component_version)
+                       for file in files]
+        else:
+            sys.stderr.write(f'Uploading to {repo.get("format")} '
+                             'repositories is not supported\n')
+            exit(1)
+        results = api.upload(repository, uploads, parallel,
+                             skip_unchanged=not force)
+    for result in results:
+        if result.error is None:
+            print(f'{result.value["path"]} {result.value["action"]}')
+        else:
+            exit_code += 1
+            print(f'{result.item.path} failed')
+            sys.stderr.write(f'Error uploading {result.item.file}:\n'
+                             f'{result.error}\n')
+    exit(exit_code)
+
+
+@dso_nexus.command(name='mirror')
+@opts.default_opts
+@click.option('--repository', '-r', required=True,
+              help='the repository to mirror')
+@click.option('--output', '-o', 'destination', required=True,
+              type=click.Path(file_okay=False),
+              help='the directory to mirror the repository into')
+@opts.parallel_opt
+def dso_nexus_mirror(url, login_username, login_password, verbose,
+                     repository, destination, parallel):
+    """Download every asset of a repository on the Nexus instance specified
+    by URL into a local directory, verifying their checksums. Interrupted
+    downloads are resumed and assets unchanged since the last run are
+    skipped."""
+    exit_code = 0
+    with nexus.Nexus(
+        url, login_username, login_password, verbosity=verbose
+    ) as api:
+        try:
+            for result in mirror.mirror(api, repository, destination,
+                                        parallel):
+                if result.error is None:
+                    print(f'{result.item["path"]} {result.value}')
+                else:
                     exit_code += 1
-                    errors[repository_name] = e.msg
-                    print(f'{repository_name} failed')
-            else:
-                print(f'{repository_name} ok')
-    for repo, error in errors.items():
-        sys.stderr.write(f'Error adding {repo}:\n{error}\n')
-    sys.stderr.flush
+                    print(f'{result.item["path"]} failed')
+                    sys.stderr.write(f'Error downloading '
+                                     f'{result.item["path"]}:\n'
+                                     f'{result.error}\n')
+        except nexus.UnexpectedApiResponse as e:
+            sys.stderr.write(f'Unable to list {repository}:\n{e}\n')
+            exit_code += 1
     exit(exit_code)
 
 
+@dso_nexus.command(name='add-repository')
+@opts.default_opts
+@click.option('--repository-names', '-r', required=True,
+              help=('the name of the repositories to add '
+                    '(separate multiples with commas)'))
+@opts.parallel_opt
+@opts.batch_opt
+def dso_nexus_add_repo(url, login_username, login_password, verbose,
+                       repository_names, parallel, batch):
+    """Add new Maven repositories to the Nexus instance specified by URL"""
+    exit(add_repos(url, login_username, login_password, verbose,
+                   repository_names, 'maven', parallel, batch))
+
+
 @dso_nexus.command(name='add-proxy-repository')
 @opts.default_opts
 @click.option('--repository-name', '-r', required=True,
@@ -202,7 +421,7 @@ def dso_nexus_add_proxy_repo(url, login_username, login_password, verbose,
     with nexus.Nexus(
         url, login_username, login_password, verbosity=verbose
     ) as api:
-        if not api.search_repos(repository_name):
+        if not api.search_repos(repository_name, mode='exact'):
             try:
                 if api.add_proxy_repo(repository_name,
                                       remote_repo_url) is not None:
@@ -212,13 +431,13 @@ def dso_nexus_add_proxy_repo(url, login_username, login_password, verbose,
                     print(f'proxy {repository_name} failed')
             except Exception as e:
                 exit_code += 1
-                errors[repository_name] = e.msg
+                errors[repository_name] = str(e)
                 print(f'proxy {repository_name} failed')
         else:
             print(f'proxy {repository_name} ok')
     for repo, error in errors.items():
         sys.stderr.write(f'Error adding {repo}:\n{error}\n')
-    sys.stderr.flush
+    sys.stderr.flush()
     exit(exit_code)
 
 
@@ -227,32 +446,13 @@ def dso_nexus_add_proxy_repo(url, login_username, login_password, verbose,
 @click.option('--repository-names', '-r', required=True,
               help=('the name of the repositories to add '
                     '(separate multiples with commas)'))
+@opts.parallel_opt
+@opts.batch_opt
 def dso_nexus_add_raw_repo(url, login_username, login_password, verbose,
-                       repository_names):
+                           repository_names, parallel, batch):
     """Add new raw repositories to the Nexus instance specified by URL"""
-    exit_code = 0
-    errors = {}
-    with nexus.Nexus(
-        url, login_username, login_password, verbosity=verbose
-    ) as api:
-        for repository_name in repository_names.split(','):
-            if not api.search_repos(repository_name):
-                try:
-                    if api.add_raw_repo(repository_name) is not None:
-                        print(f'{repository_name} added')
-                    else:
-                        exit_code += 1
-                        print(f'{repository_name} failed')
-                except Exception as e:
-                    exit_code += 1
-                    errors[repository_name] = e.msg
-                    print(f'{repository_name} failed')
-            else:
-                print(f'{repository_name} ok')
-    for repo, error in errors.items():
-        sys.stderr.write(f'Error adding {repo}:\n{error}\n')
-    sys.stderr.flush
-    exit(exit_code)
+    exit(add_repos(url, login_username, login_password, verbose,
+                   repository_names, 'raw', parallel, batch))
 
 
 @dso_nexus.command(name='add-docker-repository')
@@ -260,64 +460,28 @@ def dso_nexus_add_raw_repo(url, login_username, login_password, verbose,
 @click.option('--repository-names', '-r', required=True,
               help=('the name of the repositories to add '
                     '(separate multiples with commas)'))
+@opts.parallel_opt
+@opts.batch_opt
 def dso_nexus_add_docker_repo(url, login_username, login_password, verbose,
-                       repository_names):
+                              repository_names, parallel, batch):
     """Add new docker repositories to the Nexus instance specified by URL"""
-    exit_code = 0
-    errors = {}
-    with nexus.Nexus(
-        url, login_username, login_password, verbosity=verbose
-    ) as api:
-        for repository_name in repository_names.split(','):
-            if not api.search_repos(repository_name):
-                try:
-                    if api.add_docker_repo(repository_name) is not None:
-                        print(f'{repository_name} added')
-                    else:
-                        exit_code += 1
-                        print(f'{repository_name} failed')
-                except Exception as e:
-                    exit_code += 1
-                    errors[repository_name] = e.msg
-                    print(f'{repository_name} failed')
-            else:
-                print(f'{repository_name} ok')
-    for repo, error in errors.items():
-        sys.stderr.write(f'Error adding {repo}:\n{error}\n')
-    sys.stderr.flush
-    exit(exit_code)
+    exit(add_repos(url, login_username, login_password, verbose,
+                   repository_names, 'docker', parallel, batch))
+
 
 @dso_nexus.command(name='add-npm-repository')
 @opts.default_opts
 @click.option('--repository-names', '-r', required=True,
               help=('the name of the repositories to add '
                     '(separate multiples with commas)'))
+@opts.parallel_opt
+@opts.batch_opt
 def dso_nexus_add_npm_repo(url, login_username, login_password, verbose,
-                              repository_names):
+                           repository_names, parallel, batch):
     """Add new npm repositories to the Nexus instance specified by URL"""
-    exit_code = 0
-    errors = {}
-    with nexus.Nexus(
-            url, login_username, login_password, verbosity=verbose
-    ) as api:
-        for repository_name in repository_names.split(','):
-            if not api.search_repos(repository_name):
-                try:
-                    if api.add_npm_repo(repository_name) is not None:
-                        print(f'{repository_name} added')
-                    else:
-                        exit_code += 1
-                        print(f'{repository_name} failed')
-                except Exception as e:
-                    exit_code += 1
-                    errors[repository_name] = e.msg
-                    print(f'{repository_name} failed')
-            else:
-                print(f'{repository_name} ok')
-    for repo, error in errors.items():
-        sys.stderr.write(f'Error adding {repo}:\n{error}\n')
-    sys.stderr.flush
-    exit(exit_code)
+    exit(add_repos(url, login_username, login_password, verbose,
+                   repository_names, 'npm', parallel, batch))
+
 
 @dso_nexus.command(name='update-repository')
 @opts.default_opts
@@ -335,8 +499,9 @@ def dso_nexus_update_repo(url, login_username, login_password, verbose,
     with nexus.Nexus(
         url, login_username, login_password, verbosity=verbose
     ) as api:
+        inventory = api.inventory()
         for repository_name in repository_names.split(','):
-            if not api.search_repos(repository_name):
+            if repository_name not in inventory:
                 exit_code += 1
                 print(f'{repository_name} does not exist')
             else:
@@ -348,11 +513,11 @@ def dso_nexus_update_repo(url, login_username, login_password, verbose,
                         print(f'{repository_name} update failed')
                 except Exception as e:
                     exit_code += 1
-                    errors[repository_name] = e.msg
+                    errors[repository_name] = str(e)
                     print(f'{repository_name} update failed')
     for repo, error in errors.items():
         sys.stderr.write(f'Error updating {repo}:\n{error}\n')
-    sys.stderr.flush
+    sys.stderr.flush()
     exit(exit_code)
 
 
@@ -372,7 +537,7 @@ def dso_nexus_update_group_repo(url, login_username, login_password, verbose,
     with nexus.Nexus(
         url, login_username, login_password, verbosity=verbose
     ) as api:
-        if api.search_repos(group_repository_name):
+        if api.search_repos(group_repository_name, mode='exact'):
             try:
                 if api.update_group_repo(
                     group_repository_name, member_repository_names.split(',')
@@ -383,13 +548,13 @@ def dso_nexus_update_group_repo(url, login_username, login_password, verbose,
                     print(f'group repo {group_repository_name} failed')
             except Exception as e:
                 exit_code += 1
-                errors[group_repository_name] = e.msg
+                errors[group_repository_name] = str(e)
                 print(f'group repo {group_repository_name} failed')
         else:
             print(f'group repo {group_repository_name} doesn\'t exist')
     for repo, error in errors.items():
         sys.stderr.write(f'Error updating group repo {repo}:\n{error}\n')
-    sys.stderr.flush
+    sys.stderr.flush()
     exit(exit_code)
 
 
@@ -431,3 +596,46 @@ def dso_nexus_run_script(url, login_username, login_password, verbose,
         except Exception:
             print(f'{script_name} failed')
             exit(1)
+
+
+@dso_nexus.command(name='apply', epilog=opts.apply_epilog)
+@opts.default_opts
+@click.option('--file', '-f', 'manifest', type=click.File('r'), required=True,
+              help=('a YAML manifest of the repositories, groups, roles and '
+                    'users that should exist'))
+@click.option('--dry-run', is_flag=True, default=False,
+              help='only print the plan, without changing anything')
+@opts.parallel_opt
+@opts.batch_opt
+def dso_nexus_apply(url, login_username, login_password, verbose, manifest,
+                    dry_run, parallel, batch):
+    """Bring the Nexus instance specified by URL to the state in a manifest,
+    making only the changes needed. Roles and users are only ever added to,
+    never removed."""
+    try:
+        desired = state.load_manifest(manifest)
+    except (state.ManifestError, yaml.YAMLError) as e:
+        sys.stderr.write(f'Invalid manifest {manifest.name}:\n{e}\n')
+        exit(1)
+    exit_code = 0
+    with nexus.Nexus(
+        url, login_username, login_password, verbosity=verbose
+    ) as api:
+        try:
+            plan = state.make_plan(api, desired)
+        except nexus.UnexpectedApiResponse as e:
+            sys.stderr.write(f'Unable to read the current state:\n{e}\n')
+            exit(1)
+        print(plan.summary())
+        results = [] if dry_run else state.apply_plan(plan, parallel, batch)
+    for result in results:
+        step = result.item
+        if result.error is None and result.value is not None:
+            print(f'{step.kind} {step.name} {step.action}d')
+        else:
+            exit_code += 1
+            print(f'{step.kind} {step.name} failed')
+            if result.error is not None:
+                sys.stderr.write(f'Error applying {step.kind} {step.name}:\n'
+                                 f'{result.error}\n')
+    exit(exit_code)
@@ -2,90 +2,292 @@
 from devsecops.cli import opts
 from devsecops.cli import dso_quay
 from devsecops.quay import quay
+from devsecops.quay import robots
+from devsecops.quay import state
+from urllib.parse import urlsplit
+import click
+import json
+import sys
+import yaml
+
+
+def connect(url, login_username, login_password, token, verbose):
+    """
+    Returns a Quay handler authorized with token, or failing that with the
+    login username and password
+    """
+    if token is None and None in (login_username, login_password):
+        raise click.UsageError('Either --token or both --login-username and '
+                               '--login-password are required')
+    if token is not None:
+        return quay.Quay(url, verbosity=verbose, token=token)
+    return quay.Quay(url, login_username, login_password, verbosity=verbose)
 
 
 @dso_quay.command(name='add-user', epilog=opts.add_users_epilog)
-@opts.default_opts
+@opts.quay_opts
 @opts.add_users_opt
-def dso_quay_add_user(url, login_username, login_password, verbose, usernames,
-                      passwords):
+def dso_quay_add_user(url, login_username, login_password, token, verbose,
+                      usernames, passwords):
     """Add users to the Quay instance specified by URL"""
-    with quay.Quay(
-        url, login_username, login_password, verbosity=verbose
-    ) as api:
+    exit_code = 0
+    with connect(url, login_username, login_password, token,
+                 verbose) as api:
         for username, password in zip(usernames.split(','),
                                       passwords.split(',')):
-            new_user = api.add_user(username, password)
-            if new_user is not None:
+            try:
+                api.add_user(username, password)
                 print(f'{username} added')
-            else:
-                print(f'{username} ok')
+            except quay.UnexpectedApiResponse as e:
+                if api.get_user(username) is not None:
+                    print(f'{username} ok')
+                else:
+                    exit_code += 1
+                    print(f'{username} failed')
+                    sys.stderr.write(f'Error adding {username}:\n{e}\n')
+    sys.stderr.flush()
+    exit(exit_code)
 
 
 @dso_quay.command(name='add-org')
-@opts.default_opts
+@opts.quay_opts
 @opts.add_orgs_opt
-def dso_quay_add_org(url, login_username, login_password, verbose,
+def dso_quay_add_org(url, login_username, login_password, token, verbose,
                      organizations):
     """Add Organizations to the Quay instance specified by URL"""
-    with quay.Quay(
-        url, login_username, login_password, verbosity=verbose
-    ) as api:
+    exit_code = 0
+    with connect(url, login_username, login_password, token,
+                 verbose) as api:
         for organization in organizations.split(','):
-            new_org = api.add_org(organization)
-            if new_org is not None:
+            try:
+                api.add_org(organization)
                 print(f'{organization} added')
-            else:
-                print(f'{organization} ok')
+            except quay.UnexpectedApiResponse as e:
+                if api.get_org(organization) is not None:
+                    print(f'{organization} ok')
+                else:
+                    exit_code += 1
+                    print(f'{organization} failed')
+                    sys.stderr.write(f'Error adding {organization}:\n{e}\n')
+    sys.stderr.flush()
+    exit(exit_code)
 
 
 @dso_quay.command(name='add-app')
-@opts.default_opts
+@opts.quay_opts
 @opts.add_app_opt
-def dso_quay_add_app(url, login_username, login_password, verbose,
+def dso_quay_add_app(url, login_username, login_password, token, verbose,
                      organization, app_name, app_description):
     """
     Add an Application to an Organization on the Quay instance specified by URL
     """
-    with quay.Quay(
-        url, login_username, login_password, verbosity=verbose
-    ) as api:
-        new_app = api.add_app(organization, app_name, app_description)
+    with connect(url, login_username, login_password, token,
+                 verbose) as api:
+        try:
+            new_app = api.add_app(organization, app_name, app_description)
+        except quay.UnexpectedApiResponse as e:
+            sys.stderr.write(f'Error adding {app_name}:\n{e}\n')
+            exit(1)
         print((f'{app_name} added (client_id: {new_app.json()["client_id"]}, '
                f'client_secret: {new_app.json()["client_secret"]})'))
 
 
+def report(names, existing, results, describe=lambda value: ''):
+    """Print a line for each name in the order given, ok if it was in
+    existing and otherwise as its result went, and return the exit code"""
+    exit_code = 0
+    results = {result.item: result for result in results}
+    errors = {}
+    for name in names:
+        result = results.pop(name, None)
+        if result is None and name in errors:
+            exit_code += 1
+            print(f'{name} failed')
+        elif result is None:
+            print(f'{name} ok{describe(existing.get(name))}')
+        elif result.error is not None or result.value is None:
+            exit_code += 1
+            errors[name] = result.error
+            print(f'{name} failed')
+        else:
+            existing[name] = result.value.json()
+            print(f'{name} added{describe(existing[name])}')
+    for name, error in errors.items():
+        if error is not None:
+            sys.stderr.write(f'Error adding {name}:\n{error}\n')
+    sys.stderr.flush()
+    return exit_code
+
+
 @dso_quay.command(name='add-repo')
-@opts.default_opts
+@opts.quay_opts
 @opts.add_repo_opt
-def dso_quay_add_repo(url, login_username, login_password, verbose,
-                     organization, repo_name, repo_description):
+@opts.parallel_opt
+def dso_quay_add_repo(url, login_username, login_password, token, verbose,
+                      organization, repo_name, repo_description, parallel):
     """
-    Add a Repository to an Organization on the Quay instance specified by URL
+    Add Repositories to an Organization on the Quay instance specified by URL
     """
-    with quay.Quay(
-        url, login_username, login_password, verbosity=verbose
-    ) as api:
-        new_repo = api.add_repo(organization, repo_name, repo_description)
-        print(f'{repo_name} ok')
+    names = repo_name.split(',')
+    with connect(url, login_username, login_password, token,
+                 verbose) as api:
+        try:
+            existing = {repo['name']: repo
+                        for repo in api.list_repos(organization)}
+        except quay.UnexpectedApiResponse as e:
+            sys.stderr.write(f'Unable to list the repositories of '
+                             f'{organization}:\n{e}\n')
+            exit(1)
+        missing = [name for name in dict.fromkeys(names)
+                   if name not in existing]
+        results = api.add_repos(organization, missing, repo_description,
+                                parallel)
+    exit(report(names, existing, results))
 
 
 @dso_quay.command(name='add-robot')
-@opts.default_opts
+@opts.quay_opts
 @opts.add_robot_opt
-def dso_quay_add_robot(url, login_username, login_password, verbose,
-                       organization, robot_name, robot_description):
+@opts.parallel_opt
+def dso_quay_add_robot(url, login_username, login_password, token, verbose,
+                       organization, robot_name, robot_description,
+                       parallel):
     """
-    Add a Robot Account to an Organization on the Quay instance specified by
+    Add Robot Accounts to an Organization on the Quay instance specified by
     URL
     """
+    names = robot_name.split(',')
+    with connect(url, login_username, login_password, token,
+                 verbose) as api:
+        try:
+            existing = {robot['name'].partition('+')[2]: robot
+                        for robot in api.list_robots(organization,
+                                                     token=True)}
+        except quay.UnexpectedApiResponse as e:
+            sys.stderr.write(f'Unable to list the robots of '
+                             f'{organization}:\n{e}\n')
+            exit(1)
+        missing = [name for name in dict.fromkeys(names)
+                   if name not in existing]
+        results = api.add_robots(organization, missing, robot_description,
+                                 parallel)
+    exit(report(names, existing, results,
+                lambda robot: f' (token: {robot["token"]})'))
+
+
+@dso_quay.command(name='robot-tokens')
+@opts.quay_opts
+@opts.add_org_opt
+@click.option('--robot-names', '-r', default=None,
+              help=('the robots to get tokens for, adding those that are '
+                    'missing, instead of every robot of the org (separate '
+                    'multiples with commas)'))
+@click.option('--robot-description', '-d', required=False,
+              help='the description of any robot accounts added')
+@click.option('--output', '-O', 'output_format', default='ndjson',
+              show_default=True, type=click.Choice(['ndjson', 'secret']),
+              help=('print a JSON line per robot, or a Kubernetes image pull '
+                    'secret manifest per robot'))
+@click.option('--namespace', default=None,
+              help='the Kubernetes namespace to give the secrets')
+@click.option('--registry', default=None,
+              help='the registry host for the secrets, by default the one '
+                   'in URL')
+@opts.parallel_opt
+def dso_quay_robot_tokens(url, login_username, login_password, token, verbose,
+                          organization, robot_names, robot_description,
+                          output_format, namespace, registry, parallel):
+    """
+    Print the Robot Accounts of an Organization on the Quay instance
+    specified by URL with their tokens, as NDJSON or Kubernetes secrets
+    """
+    registry = registry or urlsplit(url).netloc
+    exit_code = 0
+    with connect(url, login_username, login_password, token,
+                 verbose) as api:
+        try:
+            results = robots.robot_tokens(
+                api, organization,
+                robot_names.split(',') if robot_names else None,
+                robot_description, parallel
+            )
+            for result in results:
+                if result.error is not None:
+                    exit_code += 1
+                    sys.stderr.write(f'Error getting a token for '
+                                     f'{result.item}:\n{result.error}\n')
+                elif output_format == 'secret':
+                    sys.stdout.write('---\n')
+                    sys.stdout.write(yaml.safe_dump(
+                        robots.pull_secret(result.value, registry, namespace),
+                        sort_keys=False
+                    ))
+                else:
+                    sys.stdout.write(json.dumps(result.value,
+                                                separators=(',', ':')))
+                    sys.stdout.write('\n')
+        except quay.UnexpectedApiResponse as e:
+            sys.stdout.flush()
+            sys.stderr.write(f'Unable to list the robots of {organization}:'
+                             f'\n{e}\n')
+            exit_code = 1
+    sys.stdout.flush()
+    exit(exit_code)
+
+
+@dso_quay.command(name='apply', epilog=opts.quay_apply_epilog)
+@opts.quay_opts
+@click.option('--file', '-f', 'manifest', type=click.File('r'), required=True,
+              help=('a YAML manifest of the organizations, robots, '
+                    'repositories and permissions that should exist'))
+@click.option('--dry-run', is_flag=True, default=False,
+              help='only print the plan, without changing anything')
+@opts.parallel_opt
+def dso_quay_apply(url, login_username, login_password, token, verbose,
+                   manifest, dry_run, parallel):
+    """Bring the Quay instance specified by URL to the state in a manifest,
+    making only the changes needed. Nothing is ever removed."""
+    try:
+        desired = state.load_manifest(manifest)
+    except (state.ManifestError, yaml.YAMLError) as e:
+        sys.stderr.write(f'Invalid manifest {manifest.name}:\n{e}\n')
+        exit(1)
+    exit_code = 0
+    with connect(url, login_username, login_password, token,
+                 verbose) as api:
+        try:
+            plan = state.make_plan(api, desired, parallel)
+        except quay.UnexpectedApiResponse as e:
+            sys.stderr.write(f'Unable to read the current state:\n{e}\n')
+            exit(1)
+        print(plan.summary())
+        results = [] if dry_run else state.apply_plan(plan, parallel)
+    for result in results:
+        step = result.item
+        if result.error is None and result.value is not None:
+            print(f'{step.kind} {step.name} {step.action}d')
+        else:
+            exit_code += 1
+            print(f'{step.kind} {step.name} failed')
+            if result.error is not None:
+                sys.stderr.write(f'Error applying {step.kind} {step.name}:\n'
+                                 f'{result.error}\n')
+    exit(exit_code)
+
+
+@dso_quay.command(name='mint-token')
+@opts.default_opts
+@opts.mint_token_opt
+def dso_quay_mint_token(url, login_username, login_password, verbose,
+                        client_id, scopes, redirect_uri):
+    """
+    Mint an OAuth token for an Application on the Quay instance specified by
+    URL, for use with --token
+    """
     with quay.Quay(
         url, login_username, login_password, verbosity=verbose
     ) as api:
-        existing_robot = api.get_robot(organization, robot_name)
-        if existing_robot:
-            print(f'{robot_name} ok (token: {existing_robot.json()["token"]})')
-        else:
-            new_robot = api.add_robot(organization, robot_name,
-                                      robot_description)
-            print(f'{robot_name} added (token: {new_robot.json()["token"]})')
+        print(api.mint_token(client_id,
+                             scopes.split(',') if scopes
+                             else quay.DEFAULT_SCOPES,
+                             redirect_uri))
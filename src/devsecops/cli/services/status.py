@@ -0,0 +1,30 @@
+# SPDX-License-Identifier: BSD-2-Clause
+from devsecops.cli import main
+from devsecops.base.probe import probes
+from devsecops.nexus.nexus import Nexus
+from devsecops.quay.quay import Quay
+from devsecops.sonarqube.sonarqube import SonarQube
+
+import click
+
+
+@main.command(name='status')
+@click.option('--nexus', 'nexus_url', metavar='URL',
+              help='the URL of a Nexus instance to check')
+@click.option('--quay', 'quay_url', metavar='URL',
+              help='the URL of a Quay instance to check')
+@click.option('--sonarqube', 'sonarqube_url', metavar='URL',
+              help='the URL of a SonarQube instance to check')
+def dso_status(nexus_url, quay_url, sonarqube_url):
+    """Check whether the given service instances are online, all at once"""
+    services = [(url, handler.health_endpoint) for url, handler in [
+        (nexus_url, Nexus), (quay_url, Quay), (sonarqube_url, SonarQube)
+    ] if url is not None]
+    exit_code = 0
+    for (url, _), online in zip(services, probes.check_many(services)):
+        if online:
+            print(f'{url} online')
+        else:
+            exit_code += 1
+            print(f'{url} offline')
+    exit(exit_code)
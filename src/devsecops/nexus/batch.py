@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.base_handler import UnexpectedApiResponse
+from devsecops.base.bulk import BulkResult, run_bulk
+from devsecops.nexus.nexus import DEFAULT_USER_ROLES, Nexus
+from inspect import signature
+from typing import Iterable, List, Tuple
+import json
+import requests
+
+BATCH_SIZE = 500
+
+REPO_KINDS = {
+    'add_repo': ('maven2', 'hosted'),
+    'add_proxy_repo': ('maven2', 'proxy'),
+    'add_raw_repo': ('raw', 'hosted'),
+    'add_docker_repo': ('docker', 'hosted'),
+    'add_npm_repo': ('npm', 'hosted')
+}
+
+# Does what the Nexus methods of the same names do through the REST API, for
+# a JSON list of {"method": ..., "args": {...}} given as the script's
+# arguments, returning a JSON list with a result for each
+SCRIPT = """
+import groovy.json.JsonOutput
+import groovy.json.JsonSlurper
+import org.sonatype.nexus.repository.maven.LayoutPolicy
+import org.sonatype.nexus.repository.maven.VersionPolicy
+import org.sonatype.nexus.repository.storage.WritePolicy
+
+def results = []
+new JsonSlurper().parseText(args).each { operation ->
+    def a = operation.args
+    try {
+        switch (operation.method) {
+            case 'add_user':
+                security.addUser(a.username, a.username, a.username,
+                                 "${a.username}@example.com".toString(),
+                                 true, a.password, a.roles)
+                break
+            case 'add_role':
+                security.addRole(a.roleid, a.roleid, a.roleid,
+                                 a.privileges ?: [], [])
+                break
+            case 'add_repo':
+                repository.createMavenHosted(a.reponame, 'default', true,
+                                             VersionPolicy.RELEASE,
+                                             WritePolicy.ALLOW_ONCE,
+                                             LayoutPolicy.STRICT)
+                break
+            case 'add_proxy_repo':
+                repository.createMavenProxy(a.reponame, a.remoterepourl,
+                                            'default', true,
+                                            VersionPolicy.RELEASE,
+                                            LayoutPolicy.STRICT)
+                break
+            case 'add_raw_repo':
+                repository.createRawHosted(a.reponame, 'default', false,
+                                           WritePolicy.ALLOW)
+                break
+            case 'add_docker_repo':
+                repository.createDockerHosted(a.reponame, 8082, 8083,
+                                              'default', false, false,
+                                              WritePolicy.ALLOW, true)
+                break
+            case 'add_npm_repo':
+                repository.createNpmHosted(a.reponame, 'default', true,
+                                           WritePolicy.ALLOW)
+                break
+            default:
+                throw new IllegalArgumentException(
+                    "Unsupported operation ${operation.method}".toString())
+        }
+        results << [ok: true]
+    } catch (Exception e) {
+        results << [ok: false, error: e.message ?: e.class.name]
+    }
+}
+return JsonOutput.toJson(results)
+"""
+
+SCRIPTED = ('add_user', 'add_role') + tuple(REPO_KINDS)
+
+
+def _rest_response(api: Nexus, method: str,
+                   arguments: dict) -> requests.Response:
+    """
+    Returns a response like the one the REST endpoint behind method answers
+    a successful call with, for an operation the script carried out
+    """
+    response = requests.Response()
+    response.encoding = 'utf-8'
+    response.headers['Content-Type'] = 'application/json'
+    if method == 'add_user':
+        response.status_code = 200
+        response.url = f'{api.url}/beta/security/users'
+        body = {'userId': arguments['username'],
+                'firstName': arguments['username'],
+                'lastName': arguments['username'],
+                'emailAddress': f'{arguments["username"]}@example.com',
+                'source': 'default', 'status': 'active', 'readOnly': False,
+                'roles': arguments['roles'], 'externalRoles': []}
+    elif method == 'add_role':
+        response.status_code = 200
+        response.url = f'{api.url}/v1/security/roles'
+        body = {'id': arguments['roleid'], 'name': arguments['roleid'],
+                'description': arguments['roleid'],
+                'privileges': arguments['privileges'], 'roles': [],
+                'source': 'default'}
+    else:
+        # Repositories are created with an empty 201
+        response.status_code = 201
+        response.url = f'{api.url}/beta/repositories'
+        response._content = b''
+        return response
+    response._content = json.dumps(body).encode('utf-8')
+    return response
+
+
+def _run_script(api: Nexus, name: str,
+                operations: List[Tuple[str, tuple]]) -> List[BulkResult]:
+    """
+    Run one chunk of operations through the batch script, returning a
+    BulkResult per operation
+    """
+    body = []
+    for method, args in operations:
+        bound = signature(getattr(api, method)).bind(*args)
+        bound.apply_defaults()
+        if method == 'add_user' and bound.arguments['roles'] is None:
+            # As add_user does, so both paths give users the same roles
+            bound.arguments['roles'] = list(DEFAULT_USER_ROLES)
+        body.append({'method': method, 'args': dict(bound.arguments)})
+    try:
+        response = api.api_req('post', f'v1/script/{name}/run',
+                               body=json.dumps(body).encode('utf-8'),
+                               headers={'Content-Type': 'text/plain'},
+                               template='v1/script/{name}/run')
+        results = json.loads(json.loads(response.text)['result'])
+    except (UnexpectedApiResponse, ValueError, KeyError, TypeError) as e:
+        return [BulkResult(operation, None, e) for operation in operations]
+    if len(results) != len(operations):
+        error = UnexpectedApiResponse(f'Expected {len(operations)} results '
+                                      f'from script {name}, got '
+                                      f'{len(results)}')
+        return [BulkResult(operation, None, error)
+                for operation in operations]
+    outcomes = []
+    for (method, args), operation, result in zip(operations, body, results):
+        if result.get('ok'):
+            if method in REPO_KINDS:
+                api.track_repo(args[0], *REPO_KINDS[method])
+            outcomes.append(BulkResult(
+                (method, args),
+                _rest_response(api, method, operation['args']), None
+            ))
+        else:
+            outcomes.append(BulkResult((method, args), None,
+                                       UnexpectedApiResponse(
+                                           result.get('error') or
+                                           f'{method} failed')))
+    return outcomes
+
+
+def run_batch(api: Nexus, operations: Iterable[Tuple[str, tuple]],
+              parallel: int = 1,
+              batch_size: int = BATCH_SIZE) -> List[BulkResult]:
+    """
+    Carry out (method, args) operations, each naming the Nexus method that
+    would do it through the REST API, in as few requests as possible. Those
+    the batch script supports go to the server batch_size at a time in one
+    script run each, with up to parallel runs at once. The rest, and all of
+    them if scripts can't be added to the server, are made through the
+    named methods with run_bulk.
+
+    Returns a BulkResult per operation in the order given, with the
+    operation as its item, like run_bulk. The value of a scripted operation
+    is a response like the one its REST endpoint would have given.
+    """
+    operations = [(method, tuple(args)) for method, args in operations]
+    scripted = [i for i, (method, _) in enumerate(operations)
+                if method in SCRIPTED]
+    name = api.install_script(SCRIPT, 'devsecops-batch') if scripted \
+        else None
+    if name is None:
+        scripted = []
+    results = [None] * len(operations)
+    chunks = [scripted[i:i + batch_size]
+              for i in range(0, len(scripted), batch_size)]
+    for chunk, outcomes in zip(chunks, run_bulk(
+        lambda chunk: _run_script(api, name,
+                                  [operations[i] for i in chunk]),
+        [(chunk,) for chunk in chunks], parallel
+    )):
+        if outcomes.error is not None:
+            outcomes = outcomes._replace(value=[
+                BulkResult(operations[i], None, outcomes.error)
+                for i in chunk
+            ])
+        for i, result in zip(chunk, outcomes.value):
+            results[i] = result
+    rest = [i for i, result in enumerate(results) if result is None]
+    for i, result in zip(rest, run_bulk(
+        lambda method, args: getattr(api, method)(*args),
+        [operations[i] for i in rest], parallel
+    )):
+        results[i] = result
+    return results
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from bisect import bisect_left, insort
+from fnmatch import translate
+from typing import Iterable, Iterator, List, Set
+import re
+import sys
+import threading
+
+MATCH_MODES = ('exact', 'prefix', 'glob', 'substring')
+GRAM = 3
+GLOB_SPECIAL = re.compile(r'\*|\?|\[!?\]?[^\]]*\]')
+
+
+def grams(text: str, n: int = GRAM) -> Set[str]:
+    """
+    Returns the set of n character substrings of text
+    """
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+class RepositoryInventory(object):
+    """
+    Catalog of the repositories on a Nexus server, taken from one listing
+    and indexed by exact name, by sorted name for prefix and glob queries, and
+    by trigram for substring queries. Repositories created through the same
+    handler are added as they are created, so bulk operations can check
+    existence without listing the server again.
+    """
+
+    def __init__(self, repos: List[dict] = []) -> None:
+        """
+        Initialize an inventory from a beta/repositories listing
+        """
+        self._lock = threading.Lock()
+        self._repos = {}
+        self._names = []
+        self._grams = {}
+        for repo in repos:
+            self._index(repo)
+        self._names.sort()
+
+    def _index(self, repo: dict) -> None:
+        name = repo.get('name', '')
+        if name in self._repos:
+            self._repos[name] = repo
+            return
+        self._repos[name] = repo
+        self._names.append(name)
+        for gram in grams(name):
+            self._grams.setdefault(gram, set()).add(name)
+
+    def __contains__(self, reponame: str) -> bool:
+        return reponame in self._repos
+
+    def __len__(self) -> int:
+        return len(self._repos)
+
+    def __iter__(self) -> Iterator[dict]:
+        with self._lock:
+            return iter([self._repos[name] for name in self._names])
+
+    def get(self, reponame: str) -> dict:
+        """
+        Returns the repository named exactly reponame, or None
+        """
+        return self._repos.get(reponame)
+
+    def add(self, repo: dict) -> None:
+        """
+        Record a repository that has been created since the listing
+        """
+        with self._lock:
+            new = repo['name'] not in self._repos
+            self._index(repo)
+            if new:
+                # _index appended it, move it to its sorted position
+                self._names.pop()
+                insort(self._names, repo['name'])
+
+    def _with_prefix(self, prefix: str) -> List[str]:
+        if not prefix:
+            return list(self._names)
+        if prefix[-1] == chr(sys.maxunicode):
+            return [name for name in self._with_prefix(prefix[:-1])
+                    if name.startswith(prefix)]
+        # Every name starting with prefix sorts between it and the same
+        # prefix with its last character bumped up by one
+        end = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return self._names[bisect_left(self._names, prefix):
+                           bisect_left(self._names, end)]
+
+    def _containing(self, text: str) -> Iterable[str]:
+        if len(text) < GRAM:
+            # Too short to look up by trigram, and likely to match a large
+            # share of names anyway
+            return [name for name in self._names if text in name]
+        postings = sorted((self._grams.get(gram, set())
+                           for gram in grams(text)), key=len)
+        return [name for name in set.intersection(*postings)
+                if text in name]
+
+    def _matching(self, pattern: str) -> Iterable[str]:
+        literals = GLOB_SPECIAL.split(pattern)
+        prefix = literals[0]
+        longest = max(literals, key=len)
+        if prefix:
+            candidates = self._with_prefix(prefix)
+        elif len(longest) >= GRAM:
+            candidates = self._containing(longest)
+        else:
+            candidates = self._names
+        match = re.compile(translate(pattern)).match
+        return [name for name in candidates if match(name)]
+
+    def search(self, pattern: str, mode: str = 'exact') -> List[dict]:
+        """
+        Returns the repositories, sorted by name, whose names match pattern:
+        exactly, by default, or starting with it, as a shell-style glob, or
+        containing it
+        """
+        with self._lock:
+            if mode == 'exact':
+                names = [pattern] if pattern in self._repos else []
+            elif mode == 'prefix':
+                names = self._with_prefix(pattern)
+            elif mode == 'glob':
+                names = self._matching(pattern)
+            elif mode == 'substring':
+                names = self._containing(pattern)
+            else:
+                raise ValueError(f'Unknown match mode {mode}, expected one '
+                                 f'of {", ".join(MATCH_MODES)}')
+            return [self._repos[name] for name in sorted(names)]
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.bulk import BulkResult, iter_bulk
+from devsecops.nexus.nexus import Nexus
+from typing import Iterator
+import json
+import os
+import threading
+
+MANIFEST = '.nexus-mirror.json'
+SAVE_EVERY = 100
+
+
+def local_path(destination: str, path: str) -> str:
+    """
+    Returns where an asset path goes under destination, refusing paths that
+    would land outside of it
+    """
+    root = os.path.abspath(destination)
+    target = os.path.abspath(os.path.join(root, *path.split('/')))
+    if os.path.commonpath([root, target]) != root or target == root:
+        raise ValueError(f'Asset path {path} is outside of {destination}')
+    return target
+
+
+class MirrorManifest(object):
+    """
+    The assets already mirrored to a directory, by path, with the checksums
+    and size they had. Kept in the directory, and saved every SAVE_EVERY
+    records so an interrupted mirror loses little.
+    """
+
+    def __init__(self, destination: str) -> None:
+        self.destination = destination
+        self.path = os.path.join(destination, MANIFEST)
+        self._lock = threading.Lock()
+        self._unsaved = 0
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def unchanged(self, asset: dict) -> bool:
+        """
+        Whether an asset is on disk as it was mirrored, with the checksums
+        the server lists for it now
+        """
+        entry = self.entries.get(asset['path'])
+        if entry is None:
+            return False
+        for algorithm in ['sha256', 'sha1']:
+            if asset.get(algorithm):
+                if entry.get(algorithm) != asset[algorithm]:
+                    return False
+                break
+        try:
+            size = os.path.getsize(local_path(self.destination,
+                                              asset['path']))
+        except OSError:
+            return False
+        return size == entry.get('size')
+
+    def record(self, asset: dict, checksums: dict, size: int) -> None:
+        with self._lock:
+            self.entries[asset['path']] = {'sha1': checksums.get('sha1'),
+                                           'sha256': checksums.get('sha256'),
+                                           'size': size}
+            self._unsaved += 1
+            if self._unsaved >= SAVE_EVERY:
+                self._save()
+
+    def save(self) -> None:
+        with self._lock:
+            self._save()
+
+    def _save(self) -> None:
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, sort_keys=True)
+        os.replace(temporary, self.path)
+        self._unsaved = 0
+
+
+def mirror(api: Nexus, repository: str, destination: str,
+           parallel: int = 1) -> Iterator[BulkResult]:
+    """
+    Mirror every asset of a repository under destination, downloading up to
+    parallel at once as the listing streams in and skipping those the
+    manifest shows are already there. Yields a BulkResult per asset in
+    listing order, whose value is 'downloaded' or 'unchanged'.
+    """
+    os.makedirs(destination, exist_ok=True)
+    manifest = MirrorManifest(destination)
+
+    def fetch(asset: dict) -> str:
+        if manifest.unchanged(asset):
+            return 'unchanged'
+        filename = local_path(destination, asset['path'])
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        checksums = api.download_asset(asset, filename)
+        manifest.record(asset, checksums, os.path.getsize(filename))
+        return 'downloaded'
+
+    try:
+        yield from iter_bulk(fetch, api.iter_assets(repository), parallel)
+    finally:
+        manifest.save()
@@ -2,21 +2,81 @@
 # SPDX-License-Identifier: BSD-2-Clause
 
 from devsecops.base.base_handler import BaseApiHandler, UnexpectedApiResponse
+from devsecops.base.async_handler import AsyncBaseApiHandler, async_method
+from devsecops.base.bulk import BulkResult, run_bulk
+from devsecops.base.jsonstream import iter_json_array
+from devsecops.base.multipart import (MultipartBody, file_checksums,
+                                      read_chunks, DIGESTS)
+from devsecops.base.paging import iter_pages
+from devsecops.nexus.inventory import RepositoryInventory
+from devsecops.nexus.upload import Upload
 from typing import TypeVar
-from typing import List
+from typing import Callable, Iterable, Iterator, List
 from base64 import b64encode
 import requests
+import hashlib
 import json
+import os
+import threading
 
 T = TypeVar("T", bound="Nexus")
 
+STREAM_CHUNK_SIZE = 64 * 1024
+USER_LOOKUP_LIMIT = 8
+# The roles add_user gives a user when it isn't told which, as the CLI's
+# add-user always has
+DEFAULT_USER_ROLES = ('nx-admin',)
+
+
+class ChecksumMismatch(ValueError):
+    pass
+
+
+def compact_component(component: dict) -> dict:
+    """
+    Reduce a component from the components or search API to its coordinates
+    and the paths of its assets
+    """
+    return {
+        'id': component.get('id'),
+        'repository': component.get('repository'),
+        'format': component.get('format'),
+        'group': component.get('group'),
+        'name': component.get('name'),
+        'version': component.get('version'),
+        'assets': [asset.get('path') for asset in component.get('assets', [])]
+    }
+
+
+def compact_asset(asset: dict) -> dict:
+    """
+    Reduce an asset from the assets or search API to what identifies and
+    verifies its content
+    """
+    checksum = asset.get('checksum') or {}
+    return {
+        'id': asset.get('id'),
+        'repository': asset.get('repository'),
+        'format': asset.get('format'),
+        'path': asset.get('path'),
+        'downloadUrl': asset.get('downloadUrl'),
+        'sha1': checksum.get('sha1'),
+        'sha256': checksum.get('sha256'),
+        'size': asset.get('fileSize'),
+        'lastModified': asset.get('lastModified')
+    }
+
 
 class Nexus(BaseApiHandler):
+    health_endpoint = 'service/rest/v1/status'
+    session_headers = ['X-NX-AuthTicket']
+
     def __init__(self, base_url: str = None, username: str = None,
-                 password: str = None, verbosity: int = 0) -> None:
+                 password: str = None, verbosity: int = 0, **kwargs) -> None:
         """
         Initialize a Nexus API wrapper with logging, url information, and other
-        necessary variables to track state.
+        necessary variables to track state. Other keyword arguments are passed
+        on to BaseApiHandler.
         """
         super().__init__(
             service_name='Nexus',
@@ -25,9 +85,14 @@ class Nexus(BaseApiHandler):
             username=username,
             password=password,
             verbosity=verbosity,
-            auth=True
+            auth=True,
+            **kwargs
         )
         self.base_url = base_url
+        self._inventory = None
+        self._inventory_lock = threading.Lock()
+        self._scripts = {}
+        self._scripts_lock = threading.Lock()
 
     def sign_in(self) -> None:
         """
@@ -42,7 +107,8 @@ class Nexus(BaseApiHandler):
             'p': b64_password.decode('ascii')
         }
         token = json.loads(self.api_req('post', 'wonderland/authenticate',
-                                        data=login_data).text).get('t')
+                                        data=login_data,
+                                        safe=True).text).get('t')
         self.session.headers.update({'X-NX-AuthTicket': token})
 
     def sign_out(self) -> None:
@@ -51,10 +117,12 @@ class Nexus(BaseApiHandler):
         """
         self.session.close()
 
-    def add_user(self, username: str = None,
-                 password: str = None) -> requests.Response:
+    def add_user(self, username: str = None, password: str = None,
+                 roles: List[str] = None) -> requests.Response:
         """
-        Add a user to the Nexus instance, returning None if no user was created
+        Add a user to the Nexus instance with the given roles, returning None
+        if no user was created. Without roles the user is given
+        DEFAULT_USER_ROLES, while an empty list gives it none.
         """
         data = {
             'userId': username,
@@ -63,7 +131,7 @@ class Nexus(BaseApiHandler):
             'password': password,
             'emailAddress': f'{username}@example.com',
             'status': 'active',
-            'roles': ['nx-admin']
+            'roles': list(DEFAULT_USER_ROLES if roles is None else roles)
         }
         try:
             return self.api_req('post', 'beta/security/users', data)
@@ -72,43 +140,283 @@ class Nexus(BaseApiHandler):
             self.logger.info(json.loads(str(e)).get('error_message'))
             pass
 
+    def _iter_json(self, endpoint: str, params: dict = None,
+                   template: str = None) -> Iterator[dict]:
+        """
+        Stream a JSON array from the server, yielding its elements as they
+        are decoded so the whole payload is never held in memory at once
+        """
+        response = self.api_req('get', endpoint, stream=True, params=params,
+                                template=template)
+        try:
+            yield from iter_json_array(
+                response.iter_content(STREAM_CHUNK_SIZE),
+                response.encoding or 'utf-8'
+            )
+        finally:
+            response.close()
+
+    def iter_users(self, source: str = None,
+                   user_id: str = None) -> Iterator[dict]:
+        """
+        Iterate over the users on the server, optionally only those from one
+        user source or whose ids start with user_id, filtered server side
+        """
+        params = {}
+        if source is not None:
+            params['source'] = source
+        if user_id is not None:
+            params['userId'] = user_id
+        return self._iter_json('beta/security/users', params)
+
     def list_users(self) -> list:
         """
         Lists all users currently on the server
         """
-        return json.loads(self.api_req(endpoint='beta/security/users').text)
+        return list(self.iter_users())
 
     def search_users(self, username: str = None) -> list:
         """
         Returns information about the queried users as a list of results
         """
-        return json.loads(
-            self.api_req('get', f'beta/security/users?userId={username}').text
-        )
+        return list(self.iter_users(user_id=username))
+
+    def iter_roles(self, source: str = None) -> Iterator[dict]:
+        """
+        Iterate over the roles on the server, optionally only those from one
+        source
+        """
+        params = None if source is None else {'source': source}
+        return self._iter_json('v1/security/roles', params)
+
+    def get_role(self, role_id: str) -> dict:
+        """
+        Returns the role with id role_id, or None if the server says there
+        isn't one. Any other unexpected response is raised, rather than taken
+        to mean the role is missing.
+        """
+        response = self.api_req('get', f'v1/security/roles/{role_id}',
+                                ok=[200, 404],
+                                template='v1/security/roles/{id}')
+        if response.status_code == 404:
+            return None
+        return json.loads(response.text)
 
     def search_roles(self, role_id: str = None) -> list:
         """
         Returns information about the queried role as a list of results
         """
-        def has_role_id(role: dict = {}, role_id: str = role_id) -> bool:
-            return role.get('id', '') == role_id
-        return list(filter(has_role_id, self.list_roles()))
+        role = self.get_role(role_id) if role_id else None
+        return [] if role is None else [role]
 
     def list_repos(self) -> list:
         """
         Returns a list of all repositories configured on the server
         """
         return json.loads(
-            self.api_req('get', 'beta/repositories').text
+            self.api_req('get', 'beta/repositories', cache=True).text
         )
 
+    def inventory(self, refresh: bool = False) -> RepositoryInventory:
+        """
+        Returns the repository inventory for this session, listing the
+        server's repositories only the first time or when refresh is set
+        """
+        with self._inventory_lock:
+            if self._inventory is None or refresh:
+                self._inventory = RepositoryInventory(self.list_repos())
+            return self._inventory
+
+    def track_repo(self, reponame: str, repo_format: str,
+                   repo_type: str) -> None:
+        """
+        Record a newly created repository, however it was created, adding it
+        to the inventory, if it was taken, and dropping any cached listing of
+        repositories
+        """
+        self.response_cache.invalidate('beta/repositories')
+        if self._inventory is not None:
+            self._inventory.add({
+                'name': reponame,
+                'format': repo_format,
+                'type': repo_type,
+                'url': f'{self.base_url.rstrip("/")}/repository/{reponame}'
+            })
+
     def list_roles(self) -> list:
         """
         Returns a list of all roles configured on the server
         """
-        return json.loads(
-            self.api_req('get', 'v1/security/roles').text
+        return list(self.iter_roles())
+
+    def _iter_continuation(self, endpoint: str, params: dict,
+                           compact: Callable = None,
+                           prefetch: bool = True) -> Iterator[dict]:
+        """
+        Iterate over the items of a listing paged by continuationToken,
+        fetching the next page in the background while the current one is
+        consumed and reducing each item with compact, if given
+        """
+        params = {key: value for key, value in params.items()
+                  if value is not None}
+
+        def fetch(token: str = None) -> tuple:
+            query = dict(params)
+            if token is not None:
+                query['continuationToken'] = token
+            page = json.loads(
+                self.api_req('get', endpoint, params=query).text
+            )
+            return page.get('items', []), page.get('continuationToken')
+
+        for item in iter_pages(fetch, prefetch):
+            yield item if compact is None else compact(item)
+
+    def iter_components(self, repository: str,
+                        compact: bool = True) -> Iterator[dict]:
+        """
+        Iterate over every component in a repository, as compact records
+        unless compact is False
+        """
+        return self._iter_continuation(
+            'v1/components', {'repository': repository},
+            compact_component if compact else None
+        )
+
+    def iter_assets(self, repository: str,
+                    compact: bool = True) -> Iterator[dict]:
+        """
+        Iterate over every asset in a repository, as compact records unless
+        compact is False
+        """
+        return self._iter_continuation(
+            'v1/assets', {'repository': repository},
+            compact_asset if compact else None
+        )
+
+    def iter_search(self, assets: bool = False, compact: bool = True,
+                    **query) -> Iterator[dict]:
+        """
+        Iterate over the components, or with assets set the assets, matching
+        a search, given as the search API's query parameters such as
+        repository, format, group, name, version or q
+        """
+        if assets:
+            return self._iter_continuation(
+                'v1/search/assets', query, compact_asset if compact else None
+            )
+        return self._iter_continuation(
+            'v1/search', query, compact_component if compact else None
+        )
+
+    def find_asset(self, repository: str, upload: Upload) -> dict:
+        """
+        Returns the asset already at an upload's path in repository, as the
+        search API has it, or None if there isn't one
+        """
+        query = dict(upload.query, repository=repository)
+        for asset in self._iter_continuation('v1/search/assets', query,
+                                             prefetch=False):
+            if asset.get('path') == upload.path:
+                return asset
+        return None
+
+    def upload_component(self, repository: str,
+                         upload: Upload) -> dict:
+        """
+        Upload a file to a hosted raw or maven2 repository, streaming it from
+        disk, and return its checksums, taken as it was sent
+        """
+        body = MultipartBody(upload.fields, [
+            (f'{upload.format}.asset1', upload.path.rpartition('/')[2],
+             upload.file)
+        ])
+        self.api_req('post', 'v1/components', ok=[204],
+                     params={'repository': repository}, body=body,
+                     headers={'Content-Type': body.content_type})
+        return body.checksums[upload.file]
+
+    def _upload(self, repository: str, upload: Upload,
+                skip_unchanged: bool = True) -> dict:
+        if skip_unchanged:
+            asset = self.find_asset(repository, upload)
+            if asset is not None:
+                remote = asset.get('checksum') or {}
+                local = file_checksums(upload.file)
+                digest = 'sha256' if remote.get('sha256') else 'sha1'
+                if remote.get(digest) == local[digest]:
+                    return dict(local, path=upload.path, action='unchanged')
+        checksums = self.upload_component(repository, upload)
+        return dict(checksums, path=upload.path, action='uploaded')
+
+    def upload(self, repository: str, uploads: Iterable[Upload],
+               parallel: int = 1,
+               skip_unchanged: bool = True) -> List[BulkResult]:
+        """
+        Upload files to a hosted raw or maven2 repository, up to parallel at
+        once over the shared session. Files the server already has with the
+        same checksum are skipped unless skip_unchanged is False, and only
+        those are read twice. Returns a BulkResult per upload, in order,
+        whose value has the asset path, its checksums and whether it was
+        uploaded or unchanged.
+        """
+        # Uploads are namedtuples, so wrap them to stop run_bulk unpacking
+        # them
+        results = run_bulk(
+            lambda upload: self._upload(repository, upload, skip_unchanged),
+            [(upload,) for upload in uploads], parallel
+        )
+        return [result._replace(item=result.item[0]) for result in results]
+
+    def download_asset(self, asset: dict, filename: str,
+                       resume: bool = True) -> dict:
+        """
+        Download an asset, as a compact record or as the API has it, to
+        filename, streaming it to disk through filename.part. A part left by
+        an interrupted download is resumed with a range request unless
+        resume is False. Once complete, the sha256 or else the sha1 is
+        checked against the asset's, raising ChecksumMismatch and dropping
+        the download if they differ, and its checksums are returned.
+        """
+        part = f'{filename}.part'
+        offset = os.path.getsize(part) if resume and \
+            os.path.exists(part) else 0
+        hashes = [hashlib.new(name) for name in DIGESTS]
+        if offset:
+            for chunk in read_chunks(part):
+                for digest in hashes:
+                    digest.update(chunk)
+        response = self.api_req(
+            'get', asset['downloadUrl'], ok=[200, 206, 416], stream=True,
+            headers={'Range': f'bytes={offset}-'} if offset else None,
+            template='repository/{repository}/{path}'
         )
+        try:
+            # 416 means the part already has everything, and 200 that this is
+            # a fresh download or that the server ignored the range
+            if response.status_code == 200:
+                hashes = [hashlib.new(name) for name in DIGESTS]
+            if response.status_code != 416:
+                mode = 'ab' if response.status_code == 206 else 'wb'
+                with open(part, mode) as f:
+                    for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                        for digest in hashes:
+                            digest.update(chunk)
+                        f.write(chunk)
+        finally:
+            response.close()
+        checksums = {digest.name: digest.hexdigest() for digest in hashes}
+        expected = asset.get('checksum') or asset
+        algorithm = 'sha256' if expected.get('sha256') else 'sha1'
+        if expected.get(algorithm) and \
+                expected[algorithm] != checksums[algorithm]:
+            os.remove(part)
+            raise ChecksumMismatch(
+                f'{asset.get("path")} has {algorithm} '
+                f'{checksums[algorithm]}, expected {expected[algorithm]}'
+            )
+        os.replace(part, filename)
+        return checksums
 
     def add_repo(self, reponame: str = None) -> requests.Response:
         """
@@ -131,8 +439,10 @@ class Nexus(BaseApiHandler):
                 'layoutPolicy': 'STRICT'
             }
         }
-        return self.api_req('post', 'beta/repositories/maven/hosted', data,
-                            ok=[201])
+        response = self.api_req('post', 'beta/repositories/maven/hosted', data,
+                                ok=[201])
+        self.track_repo(reponame, 'maven2', 'hosted')
+        return response
 
     def add_proxy_repo(self, reponame: str = None,
                        remoterepourl: str = None) -> requests.Response:
@@ -168,8 +478,10 @@ class Nexus(BaseApiHandler):
                 'layoutPolicy': 'STRICT'
             }
         }
-        return self.api_req('post', 'beta/repositories/maven/proxy', data,
-                            ok=[201])
+        response = self.api_req('post', 'beta/repositories/maven/proxy', data,
+                                ok=[201])
+        self.track_repo(reponame, 'maven2', 'proxy')
+        return response
 
     def add_raw_repo(self, reponame: str = None) -> requests.Response:
         """
@@ -191,8 +503,10 @@ class Nexus(BaseApiHandler):
             'cleanup': None,
             'type': 'hosted'
         }
-        return self.api_req('post', 'beta/repositories/raw/hosted', data,
-                            ok=[201])
+        response = self.api_req('post', 'beta/repositories/raw/hosted', data,
+                                ok=[201])
+        self.track_repo(reponame, 'raw', 'hosted')
+        return response
 
     def add_docker_repo(self, reponame: str = None) -> requests.Response:
         """
@@ -215,8 +529,10 @@ class Nexus(BaseApiHandler):
             },
             'cleanup': None
         }
-        return self.api_req('post', 'beta/repositories/docker/hosted', data,
-                            ok=[201])
+        response = self.api_req('post', 'beta/repositories/docker/hosted',
+                                data, ok=[201])
+        self.track_repo(reponame, 'docker', 'hosted')
+        return response
 
     def add_npm_repo(self, reponame: str = None) -> requests.Response:
         """
@@ -235,8 +551,27 @@ class Nexus(BaseApiHandler):
                 "proprietaryComponents": True
             }
         }
-        return self.api_req('post', 'v1/repositories/npm/hosted', data,
-                            ok=[201])
+        response = self.api_req('post', 'v1/repositories/npm/hosted', data,
+                                ok=[201])
+        self.track_repo(reponame, 'npm', 'hosted')
+        return response
+
+    def add_repos(self, repos: Iterable, kind: str = 'maven',
+                  parallel: int = 1) -> List[BulkResult]:
+        """
+        Adds many repositories of one kind ('maven', 'proxy', 'raw', 'docker'
+        or 'npm') with up to parallel requests in flight, returning a
+        BulkResult per repository in the order given. Proxy repositories are
+        given as (reponame, remoterepourl) tuples, the rest by name.
+        """
+        add = {
+            'maven': self.add_repo,
+            'proxy': self.add_proxy_repo,
+            'raw': self.add_raw_repo,
+            'docker': self.add_docker_repo,
+            'npm': self.add_npm_repo
+        }[kind]
+        return run_bulk(add, repos, parallel)
 
     def add_role(self, roleid: str = None, description: str = '', privileges = []) -> requests.Response:
         """
@@ -254,11 +589,109 @@ class Nexus(BaseApiHandler):
 
     def grant_role_to_user(self, user_name: str, user_data: dict, role_id: str) -> requests.Response:
         """
-        Grants the specified role to the user.
+        Grants the specified role to the user, leaving user_data as it was
         """
-        user_data['roles'].append(role_id) # If the role_id was already on the list, Nexus will ignore it and do nothing
+        # If the role_id was already on the list, Nexus will ignore it and do
+        # nothing
+        user_data = dict(user_data, roles=user_data['roles'] + [role_id])
         return self.api_req('put', f'v1/security/users/{user_name}', user_data,
-                        ok=[204])
+                            ok=[204], template='v1/security/users/{userId}')
+
+    def _find_users(self, user_ids: set, parallel: int = 1) -> dict:
+        """
+        Returns the users with the given ids, by id, looking a few up one by
+        one and otherwise picking them out of a single listing
+        """
+        if len(user_ids) > USER_LOOKUP_LIMIT:
+            return {user['userId']: user for user in self.iter_users()
+                    if user.get('userId') in user_ids}
+        found = {}
+        for result in run_bulk(
+            lambda user_id: self.search_users(user_id), sorted(user_ids),
+            parallel
+        ):
+            if result.error is not None:
+                raise result.error
+            for user in result.value:
+                if user.get('userId') == result.item:
+                    found[result.item] = user
+        return found
+
+    def grant_roles(self, grants: Iterable,
+                    parallel: int = 1) -> List[BulkResult]:
+        """
+        Grants roles to users, given as (user_id, role_id) pairs. The role
+        catalog and the users are read once for all of the grants, users who
+        already have their roles are left alone, and each remaining user
+        gets a single update with all of their new roles, up to parallel at
+        once. Returns a BulkResult per pair in the order given, whose value
+        is 'granted' or 'unchanged'.
+        """
+        grants = [tuple(grant) for grant in grants]
+        roles = {role.get('id') for role in self.iter_roles()}
+        users = self._find_users({user_id for user_id, _ in grants},
+                                 parallel)
+        errors = {}
+        missing = {}
+        for user_id, role_id in grants:
+            if role_id not in roles:
+                errors[(user_id, role_id)] = ValueError(
+                    f'role {role_id} does not exist')
+            elif user_id not in users:
+                errors[(user_id, role_id)] = ValueError(
+                    f'user {user_id} does not exist')
+            elif role_id not in users[user_id].get('roles', []):
+                new = missing.setdefault(user_id, [])
+                if role_id not in new:
+                    new.append(role_id)
+        updates = run_bulk(
+            lambda user_id: self.update_user(dict(
+                users[user_id],
+                roles=users[user_id].get('roles', []) + missing[user_id]
+            )),
+            list(missing), parallel
+        )
+        for result in updates:
+            if result.error is not None:
+                for role_id in missing[result.item]:
+                    errors[(result.item, role_id)] = result.error
+        results = []
+        for user_id, role_id in grants:
+            error = errors.get((user_id, role_id))
+            if error is not None:
+                results.append(BulkResult((user_id, role_id), None, error))
+            elif role_id in missing.get(user_id, []):
+                results.append(BulkResult((user_id, role_id), 'granted',
+                                          None))
+            else:
+                results.append(BulkResult((user_id, role_id), 'unchanged',
+                                          None))
+        return results
+
+    def update_user(self, user_data: dict) -> requests.Response:
+        """
+        Replaces a user's details, such as their roles, with user_data as
+        returned by list_users and search_users
+        """
+        return self.api_req('put',
+                            f'v1/security/users/{user_data["userId"]}',
+                            user_data, ok=[204],
+                            template='v1/security/users/{userId}')
+
+    def update_role(self, roleid: str, description: str = '',
+                    privileges: List[str] = []) -> requests.Response:
+        """
+        Replaces the description and privileges of an existing role
+        """
+        data = {
+            "id": roleid,
+            "name": roleid,
+            "description": description or roleid,
+            "privileges": privileges,
+            "roles": []
+        }
+        return self.api_req('put', f'v1/security/roles/{roleid}', data,
+                            ok=[204], template='v1/security/roles/{id}')
 
     def update_repo(self, reponame: str = None, writepolicy: str = None) -> requests.Response:
         """
@@ -281,7 +714,8 @@ class Nexus(BaseApiHandler):
             }
         }
         return self.api_req('put', f'beta/repositories/maven/hosted/{reponame}', data,
-                            ok=[204])
+                            ok=[204],
+                            template='beta/repositories/maven/hosted/{name}')
 
     def update_group_repo(self, reponame: str,
                           memberreponames: List[str]) -> requests.Response:
@@ -302,19 +736,52 @@ class Nexus(BaseApiHandler):
             }
         }
         return self.api_req('put', f'beta/repositories/maven/group/{reponame}',
-                            data, ok=[204])
+                            data, ok=[204],
+                            template='beta/repositories/maven/group/{name}')
 
-    def search_repos(self, reponame: str = '') -> list:
+    def add_group_repo(self, reponame: str,
+                       memberreponames: List[str]) -> requests.Response:
         """
-        Returns a list of all repositories whose name is similar to reponame
-        on the server.
+        Adds a Maven2 format group repository with the given members, in
+        order, to the server.
         """
-        def is_similar_to(repo: dict = {}, reponame: str = reponame) -> bool:
-            return repo.get('name', '').startswith(reponame) or \
-                   repo.get('name', '').endswith(reponame) or \
-                   reponame in repo.get('name', '')
+        data = {
+            'name': reponame,
+            'online': True,
+            'storage': {
+                'blobStoreName': 'default',
+                'strictContentTypeValidation': True,
+            },
+            'group': {
+                "memberNames": memberreponames
+            }
+        }
+        response = self.api_req('post', 'beta/repositories/maven/group',
+                                data, ok=[201])
+        self.track_repo(reponame, 'maven2', 'group')
+        return response
 
-        return list(filter(is_similar_to, self.list_repos()))
+    def get_group_repo(self, reponame: str) -> dict:
+        """
+        Returns the configuration of a Maven2 format group repository,
+        including its members, or None if there is no such group.
+        """
+        try:
+            return json.loads(self.api_req(
+                'get', f'v1/repositories/maven/group/{reponame}',
+                template='v1/repositories/maven/group/{name}'
+            ).text)
+        except UnexpectedApiResponse:
+            return None
+
+    def search_repos(self, reponame: str = '',
+                     mode: str = 'exact') -> list:
+        """
+        Returns a list of the repositories on the server whose names match
+        reponame, exactly unless mode asks for a prefix, glob or substring
+        match. Searches the session's repository inventory.
+        """
+        return self.inventory().search(reponame, mode)
 
     def add_script(self, scriptname: str, scriptcontent: str,
                    scripttype: str) -> requests.Response:
@@ -329,10 +796,76 @@ class Nexus(BaseApiHandler):
         }
         return self.api_req('post', 'v1/script', data, ok=[204])
 
+    def install_script(self, content: str,
+                       prefix: str = 'devsecops') -> str:
+        """
+        Make sure a groovy script is on the server under a name made from
+        prefix and a hash of its content, uploading it only if it isn't
+        there already, and return that name. Returns None if the script
+        isn't there and can't be created, as when nexus.scripts.allowCreation
+        is off. The outcome is remembered for the life of the handler.
+        """
+        digest = hashlib.sha256(content.encode('utf-8')).hexdigest()
+        name = f'{prefix}-{digest[:16]}'
+        with self._scripts_lock:
+            if name not in self._scripts:
+                try:
+                    self.api_req('get', f'v1/script/{name}',
+                                 template='v1/script/{name}')
+                    self._scripts[name] = name
+                except UnexpectedApiResponse:
+                    try:
+                        self.add_script(name, content, 'groovy')
+                        self._scripts[name] = name
+                    except UnexpectedApiResponse as e:
+                        self.logger.info(f'Unable to add script {name}, '
+                                         f'scripting may be disabled: {e}')
+                        self._scripts[name] = None
+            return self._scripts[name]
+
     def run_script(self, scriptname: str, body: str = '') -> requests.Response:
         """
         Runs a script on the server. Must have scripting enabled
         (nexus.scripts.allowCreation=true) in /nexus-data/etc/nexus.properties
         """
         return self.api_req('post', f'v1/script/{scriptname}/run', body,
-                            ok=[200])
+                            ok=[200], template='v1/script/{name}/run')
+
+
+class AsyncNexus(AsyncBaseApiHandler):
+    """
+    asyncio twin of Nexus, with the same method names and return types
+    """
+    handler_class = Nexus
+
+    add_user = async_method(Nexus.add_user)
+    list_users = async_method(Nexus.list_users)
+    search_users = async_method(Nexus.search_users)
+    search_roles = async_method(Nexus.search_roles)
+    get_role = async_method(Nexus.get_role)
+    list_repos = async_method(Nexus.list_repos)
+    list_roles = async_method(Nexus.list_roles)
+    add_repo = async_method(Nexus.add_repo)
+    add_proxy_repo = async_method(Nexus.add_proxy_repo)
+    add_raw_repo = async_method(Nexus.add_raw_repo)
+    add_docker_repo = async_method(Nexus.add_docker_repo)
+    add_npm_repo = async_method(Nexus.add_npm_repo)
+    add_repos = async_method(Nexus.add_repos)
+    find_asset = async_method(Nexus.find_asset)
+    upload_component = async_method(Nexus.upload_component)
+    upload = async_method(Nexus.upload)
+    download_asset = async_method(Nexus.download_asset)
+    add_role = async_method(Nexus.add_role)
+    grant_role_to_user = async_method(Nexus.grant_role_to_user)
+    grant_roles = async_method(Nexus.grant_roles)
+    update_repo = async_method(Nexus.update_repo)
+    update_group_repo = async_method(Nexus.update_group_repo)
+    add_group_repo = async_method(Nexus.add_group_repo)
+    get_group_repo = async_method(Nexus.get_group_repo)
+    update_user = async_method(Nexus.update_user)
+    update_role = async_method(Nexus.update_role)
+    search_repos = async_method(Nexus.search_repos)
+    inventory = async_method(Nexus.inventory)
+    add_script = async_method(Nexus.add_script)
+    install_script = async_method(Nexus.install_script)
+    run_script = async_method(Nexus.run_script)
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base import plan as base_plan
+from devsecops.base.bulk import BulkResult
+from devsecops.base.plan import ManifestError, Plan, Step  # noqa: F401
+from devsecops.nexus.batch import run_batch
+from devsecops.nexus.nexus import Nexus
+from typing import List, TextIO
+import yaml
+
+REPO_KINDS = ('maven', 'proxy', 'raw', 'docker', 'npm')
+SECTIONS = ('repositories', 'groups', 'roles', 'users')
+
+
+def load_manifest(stream: TextIO) -> dict:
+    """
+    Read and check a desired state manifest, returning it with every section
+    present and defaults filled in
+    """
+    manifest = yaml.safe_load(stream) or {}
+    if not isinstance(manifest, dict):
+        raise ManifestError('The manifest must be a mapping of sections')
+    unknown = set(manifest) - set(SECTIONS)
+    if unknown:
+        raise ManifestError(f'Unknown manifest sections: '
+                            f'{", ".join(sorted(unknown))}')
+    state = {section: list(manifest.get(section) or [])
+             for section in SECTIONS}
+    for section, key in [('repositories', 'name'), ('groups', 'name'),
+                         ('roles', 'id'), ('users', 'name')]:
+        for entry in state[section]:
+            if not isinstance(entry, dict) or not entry.get(key):
+                raise ManifestError(f'Every entry in {section} needs a '
+                                    f'{key}')
+    for repo in state['repositories']:
+        repo.setdefault('kind', 'maven')
+        if repo['kind'] not in REPO_KINDS:
+            raise ManifestError(f'Repository {repo["name"]} has unknown kind '
+                                f'{repo["kind"]}, expected one of '
+                                f'{", ".join(REPO_KINDS)}')
+        if repo['kind'] == 'proxy' and not repo.get('remote_url'):
+            raise ManifestError(f'Proxy repository {repo["name"]} needs a '
+                                'remote_url')
+    for user in state['users']:
+        if not user.get('password'):
+            raise ManifestError(f'User {user["name"]} needs a password')
+    return state
+
+
+def make_plan(api: Nexus, state: dict) -> Plan:
+    """
+    Compare a loaded manifest with the server, listing repositories, roles
+    and users once each and fetching only the groups that already exist
+    """
+    result = Plan(api)
+
+    add_repo = {
+        'maven': api.add_repo,
+        'proxy': api.add_proxy_repo,
+        'raw': api.add_raw_repo,
+        'docker': api.add_docker_repo,
+        'npm': api.add_npm_repo
+    }
+    inventory = api.inventory()
+    result.reads += 1
+    for repo in state['repositories']:
+        if repo['name'] in inventory:
+            result.unchanged.append(('repository', repo['name']))
+            continue
+        args = (repo['name'],)
+        if repo['kind'] == 'proxy':
+            args += (repo['remote_url'],)
+        result.add(0, 'create', 'repository', repo['name'], repo['kind'],
+                   add_repo[repo['kind']], args, [])
+
+    for group in state['groups']:
+        members = list(group.get('members') or [])
+        depends = [('repository', member) for member in members]
+        if group['name'] not in inventory:
+            result.add(1, 'create', 'group', group['name'],
+                       f'{len(members)} members', api.add_group_repo,
+                       (group['name'], members), depends)
+            continue
+        current = api.get_group_repo(group['name']) or {}
+        result.reads += 1
+        if current.get('group', {}).get('memberNames') == members:
+            result.unchanged.append(('group', group['name']))
+        else:
+            result.add(1, 'update', 'group', group['name'],
+                       f'{len(members)} members', api.update_group_repo,
+                       (group['name'], members), depends)
+
+    if state['roles']:
+        roles = {role['id']: role for role in api.list_roles()}
+        result.reads += 1
+        for role in state['roles']:
+            privileges = list(role.get('privileges') or [])
+            description = role.get('description', '')
+            current = roles.get(role['id'])
+            if current is None:
+                result.add(0, 'create', 'role', role['id'], None,
+                           api.add_role, (role['id'], description,
+                                          privileges), [])
+            elif sorted(current.get('privileges', [])) != sorted(privileges):
+                result.add(0, 'update', 'role', role['id'], 'privileges',
+                           api.update_role, (role['id'], description,
+                                             privileges), [])
+            else:
+                result.unchanged.append(('role', role['id']))
+
+    if state['users']:
+        users = {user['userId']: user for user in api.list_users()}
+        result.reads += 1
+        for user in state['users']:
+            roles = list(user.get('roles') or [])
+            depends = [('role', role) for role in roles]
+            current = users.get(user['name'])
+            if current is None:
+                result.add(1, 'create', 'user', user['name'], None,
+                           api.add_user, (user['name'], user['password'],
+                                          roles), depends)
+                continue
+            granted = current.get('roles', [])
+            missing = [role for role in roles if role not in granted]
+            if missing:
+                result.add(1, 'update', 'user', user['name'],
+                           f'grant {", ".join(missing)}', api.update_user,
+                           (dict(current, roles=granted + missing),),
+                           depends)
+            else:
+                result.unchanged.append(('user', user['name']))
+
+    return result
+
+
+def apply_plan(plan: Plan, parallel: int = 1,
+               batch: bool = False) -> List[BulkResult]:
+    """
+    Run a plan's steps stage by stage, each stage's steps concurrently on up
+    to parallel threads, or with batch through run_batch, returning a
+    BulkResult per step. Steps depending on something that failed are not
+    run, and get a ManifestError as their error.
+    """
+    if not batch:
+        return base_plan.apply_plan(plan, parallel)
+    return base_plan.apply_plan(plan, parallel, lambda steps, parallel: (
+        run_batch(plan.api, [(step.call.__name__, step.args)
+                             for step in steps], parallel)
+    ))
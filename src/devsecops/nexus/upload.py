@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from collections import namedtuple
+from typing import Iterable, List
+import os
+
+UPLOAD_FORMATS = ('raw', 'maven2')
+
+Upload = namedtuple('Upload', ['file', 'path', 'format', 'fields', 'query'])
+Upload.__doc__ = """
+A local file and where it goes in a hosted repository: the asset path it
+gets, the v1/components form fields that put it there, and the search query
+that finds the component it becomes.
+"""
+
+
+def raw_upload(file: str, directory: str = '/',
+               filename: str = None) -> Upload:
+    """
+    Describe uploading a file to a directory of a raw repository, under its
+    own name unless filename is given
+    """
+    filename = filename or os.path.basename(file)
+    directory = '/' + directory.strip('/')
+    path = f'{directory.strip("/")}/{filename}'.lstrip('/')
+    return Upload(file, path, 'raw',
+                  [('raw.directory', directory),
+                   ('raw.asset1.filename', filename)],
+                  {'name': path})
+
+
+def raw_uploads(paths: Iterable[str], directory: str = '/') -> List[Upload]:
+    """
+    Describe uploading files to a directory of a raw repository, with the
+    files under any directories among paths keeping their relative paths
+    """
+    uploads = []
+    for path in paths:
+        if not os.path.isdir(path):
+            uploads.append(raw_upload(path, directory))
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            relative = os.path.relpath(root, path).replace(os.sep, '/')
+            target = directory if relative == '.' else \
+                f'{directory.rstrip("/")}/{relative}'
+            for name in sorted(files):
+                uploads.append(raw_upload(os.path.join(root, name), target))
+    return uploads
+
+
+def maven_upload(file: str, group_id: str, artifact_id: str, version: str,
+                 extension: str = None, classifier: str = None) -> Upload:
+    """
+    Describe uploading a file as an asset of a maven2 component. Unless
+    given, the extension and classifier are taken from the file name, as in
+    artifact-version-classifier.extension.
+    """
+    if extension is None:
+        filename = os.path.basename(file)
+        stem = f'{artifact_id}-{version}'
+        if filename.startswith(stem + '-') and classifier is None:
+            classifier, _, extension = \
+                filename[len(stem) + 1:].partition('.')
+        elif filename.startswith(stem + '.'):
+            extension = filename[len(stem) + 1:]
+        else:
+            extension = filename.rpartition('.')[2]
+    suffix = f'-{classifier}' if classifier else ''
+    path = (f'{group_id.replace(".", "/")}/{artifact_id}/{version}/'
+            f'{artifact_id}-{version}{suffix}.{extension}')
+    fields = [('maven2.groupId', group_id),
+              ('maven2.artifactId', artifact_id),
+              ('maven2.version', version),
+              ('maven2.generate-pom', 'false'),
+              ('maven2.asset1.extension', extension)]
+    query = {'group': group_id, 'name': artifact_id, 'version': version,
+             'maven.extension': extension}
+    if classifier:
+        fields.append(('maven2.asset1.classifier', classifier))
+        query['maven.classifier'] = classifier
+    return Upload(file, path, 'maven2', fields, query)
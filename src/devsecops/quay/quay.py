@@ -1,136 +1,474 @@
 #!/usr/bin/env python3
 # SPDX-License-Identifier: BSD-2-Clause
 from devsecops.base.base_handler import BaseApiHandler, UnexpectedApiResponse
-from typing import TypeVar, List
+from devsecops.base.async_handler import AsyncBaseApiHandler, async_method
+from devsecops.base.bulk import BulkResult, run_bulk
+from devsecops.base.paging import iter_pages
+from contextlib import contextmanager
+from typing import Iterable, Iterator, List, Optional, TypeVar
+from urllib.parse import parse_qs, urlsplit
 import requests
-import json
 import random
+import re
 import string
+import threading
 
 T = TypeVar("T", bound="Quay")
 
+CSRF_HEADER = 'X-CSRF-Token'
+NEXT_CSRF_HEADER = 'X-Next-CSRF-Token'
+TOKEN_PATTERN = re.compile(r'__token\s*=\s*[\'"]([^\'"]+)[\'"]')
+SCAN_CHUNK_SIZE = 8192
+# OAuth scopes asked for when minting a token, enough for everything this
+# wrapper does short of adding users, which needs super:user
+DEFAULT_SCOPES = ('org:admin', 'repo:admin', 'repo:create', 'repo:read',
+                  'repo:write', 'user:read')
+
+
+def scan_token(chunks: Iterable[str]) -> Optional[str]:
+    """
+    Returns the CSRF token set in a Quay page read as text chunks, reading no
+    further than the chunk it ends in, or None if there isn't one
+    """
+    text = ''
+    for chunk in chunks:
+        text += chunk
+        match = TOKEN_PATTERN.search(text)
+        if match is not None and match.end() < len(text):
+            return match.group(1)
+        # Keep enough of the tail for a token split across chunks
+        text = text[-2 * SCAN_CHUNK_SIZE:]
+    match = TOKEN_PATTERN.search(text)
+    return match.group(1) if match is not None else None
+
+
+class CsrfToken(object):
+    """
+    The CSRF token for a Quay session, shared by every thread making
+    requests on it. Each request is sent with the token current when it
+    started rather than with a session-wide header, and the token moves on
+    to whatever the server hands out next.
+
+    Servers that keep a token valid for the whole session take any number
+    of requests at once. Once a token has been refused as stale, the server
+    is taken to accept only the latest token, and requests lease the token
+    one at a time from then on, starting once those already in flight are
+    done.
+    """
+
+    def __init__(self, token: str = None) -> None:
+        self._lock = threading.Lock()
+        self._lease = threading.Lock()
+        self._shared = threading.Condition()
+        self._holders = 0
+        self._held = threading.local()
+        self._token = token
+        self.exclusive = False
+
+    @contextmanager
+    def lease(self, exclusive: bool = False) -> Iterator[None]:
+        """
+        Hold the token for the length of a request if tokens have to be used
+        one at a time, which exclusive makes the case from now on. Requests a
+        thread makes while it holds a lease, such as signing in again, go
+        ahead under that lease.
+        """
+        if getattr(self._held, 'leased', False):
+            yield
+            return
+        with self._shared:
+            if exclusive:
+                self.exclusive = True
+            shared = not self.exclusive
+            if shared:
+                self._holders += 1
+        self._held.leased = True
+        try:
+            if shared:
+                yield
+            else:
+                with self._lease:
+                    with self._shared:
+                        # Requests sent with a shared token finish first, so
+                        # none of them can make the leased token stale
+                        self._shared.wait_for(lambda: not self._holders)
+                    yield
+        finally:
+            self._held.leased = False
+            if shared:
+                with self._shared:
+                    self._holders -= 1
+                    self._shared.notify_all()
+
+    def get(self) -> str:
+        with self._lock:
+            return self._token
+
+    def set(self, token: str) -> None:
+        with self._lock:
+            self._token = token
+
+    def replace(self, sent: str, token: str) -> bool:
+        """
+        Move on from the token sent with a request that was refused, unless
+        another thread has already, and return whether this call did
+        """
+        with self._lock:
+            if self._token != sent:
+                return False
+            self._token = token
+            return True
+
 
 class Quay(BaseApiHandler):
+    health_endpoint = 'health/instance'
+    session_headers = ['X-CSRF-Token']
+
     def __init__(self, base_url: str = None, username: str = None,
-                 password: str = None, verbosity: int = 0) -> None:
+                 password: str = None, verbosity: int = 0, token: str = None,
+                 client_id: str = None, **kwargs) -> None:
         """
         Initialize a Quay API wrapper with logging, url information, and other
-        necessary variables to track state.
+        necessary variables to track state. Other keyword arguments are passed
+        on to BaseApiHandler.
+
+        With an OAuth token, requests are authorized with it as a bearer
+        token instead of signing in, and need no session or CSRF token, so
+        any number of threads can make them at once. With the client_id of
+        an OAuth application instead, signing in with the username and
+        password mints such a token for the application and switches to it.
         """
         super().__init__(
             service_name='Quay',
             base_url=base_url,
             username=username,
             password=password,
-            verbosity=verbosity
+            verbosity=verbosity,
+            **kwargs
         )
         self.base_url = base_url
+        self.csrf = CsrfToken()
+        self.token = token
+        self.client_id = client_id
+        if token is not None or client_id is not None:
+            # Bearer tokens outlive any one process on their own
+            self.session_cache = None
 
     def sign_in(self) -> requests.Response:
         """
-        Sign in to a Quay API instance with CSRF token handling.
+        Sign in to a Quay API instance with CSRF token handling, or start
+        using the OAuth token in bearer token mode
         """
-        self.session = requests.session()
-        self.session.verify = False
-        load_login = self.session.get(self.base_url)
-        for line in load_login.text.split('\n'):
-            if '__token' in line:
-                token = line.split("'")[1]
-                break
-        self._get_session(extra_headers={'X-CSRF-Token': token})
+        self._get_session()
+        if self.token is None and self.client_id is not None:
+            self._sign_in()
+            self.token = self.mint_token(self.client_id)
+            # Nothing else is done with the signed-in session
+            self.session.cookies.clear()
+            self.session.headers.pop(CSRF_HEADER, None)
+            self.csrf.set(None)
+        if self.token is not None:
+            self._get_session(
+                extra_headers={'Authorization': f'Bearer {self.token}'}
+            )
+            return None
+        return self._sign_in()
+
+    def _sign_in(self) -> requests.Response:
+        """
+        Sign in with the username and password
+        """
+        token = self.csrf.get() or self.session.headers.get(CSRF_HEADER)
+        if token is None or not self.session.cookies:
+            # Start from a clean slate when there is no token to reuse
+            self.session.cookies.clear()
+            token = self._fetch_csrf()
+        else:
+            # A token that has gone stale is replaced when the sign-in is
+            # refused for it
+            self.logger.debug('Reusing the CSRF token of this session')
+        self._get_session(extra_headers={CSRF_HEADER: token})
+        self.csrf.set(token)
 
         return self.api_req('post', 'signin', data={
             'username': self.username,
             'password': self.password
-        })
+        }, safe=True)
+
+    def sign_out(self) -> requests.Response:
+        """
+        Sign out of the session, which in bearer token mode only closes it
+        """
+        if self.token is None:
+            return self._sign_out()
+        self.session.close()
+
+    def mint_token(self, client_id: str,
+                   scopes: Iterable[str] = DEFAULT_SCOPES,
+                   redirect_uri: str = None) -> str:
+        """
+        Returns a new OAuth token for the signed-in user, authorizing the
+        application with client_id for the given scopes. The redirect_uri
+        must be the application's, which by default is the Quay instance's
+        own oauth/localapp, as for tokens generated in the web UI.
+        """
+        redirect_uri = redirect_uri or f'{self.base_url}/oauth/localapp'
+        token = self.csrf.get() or self.session.headers.get(CSRF_HEADER)
+        # The token comes back in the redirect, which isn't followed
+        response = self.session.post(
+            f'{self.base_url}/oauth/authorizeapp',
+            data={'client_id': client_id, 'redirect_uri': redirect_uri,
+                  'scope': ' '.join(scopes), 'response_type': 'token',
+                  '_csrf_token': token},
+            headers={'Content-Type': 'application/x-www-form-urlencoded',
+                     CSRF_HEADER: token},
+            allow_redirects=False
+        )
+        response.close()
+        location = urlsplit(response.headers.get('Location', ''))
+        fields = parse_qs(location.fragment or location.query)
+        if 'access_token' not in fields:
+            raise UnexpectedApiResponse(
+                f'Unable to mint a token for {client_id} '
+                f'({response.status_code}): {fields.get("error") or ""}'
+            )
+        return fields['access_token'][0]
+
+    def _session_valid(self) -> bool:
+        """
+        Check that a restored session is still signed in by fetching the
+        current user
+        """
+        try:
+            self.api_req('get', 'user/')
+        except UnexpectedApiResponse:
+            return False
+        return True
 
     def api_req(self, method_name: str = None, endpoint: str = None,
-                data: dict = None, ok: List[int] = [200]) -> requests.Response:
+                data: dict = None, ok: List[int] = [200], safe: bool = False,
+                deadline: float = None, cache: bool = False,
+                template: str = None, stream: bool = False,
+                params: dict = None, body=None,
+                headers: dict = None) -> requests.Response:
         """
-        Wrap API requests with next-CSRF tokens from the last request.
+        Wrap API requests with the session's current CSRF token, taking the
+        next token from the response. A request refused for a stale token is
+        retried once with a fresh one. In bearer token mode requests are sent
+        as they are.
         """
-        ret_val = super().api_req(method_name=method_name, endpoint=endpoint,
-                                  data=data, ok=ok)
-        token = ret_val.headers.get('X-Next-CSRF-Token')
-        if token is not None:
-            self.session.headers.update({'X-CSRF-Token': token})
+        kwargs = dict(method_name=method_name, endpoint=endpoint, data=data,
+                      ok=ok, safe=safe, deadline=deadline, cache=cache,
+                      template=template, stream=stream, params=params,
+                      body=body)
+        if self.token is not None:
+            return super().api_req(headers=headers, **kwargs)
+        with self.csrf.lease():
+            token = self.csrf.get() or self.session.headers.get(CSRF_HEADER)
+            try:
+                ret_val = super().api_req(
+                    headers=self._csrf_headers(headers, token), **kwargs
+                )
+            except UnexpectedApiResponse as e:
+                if 'CSRF' not in str(e):
+                    raise
+                ret_val = None
+            if ret_val is not None:
+                self._next_csrf(ret_val)
+                return ret_val
+        if not self.csrf.exclusive:
+            self.logger.info('CSRF token was refused, sending requests one '
+                             'at a time from now on')
+        with self.csrf.lease(exclusive=True):
+            if self.csrf.replace(token, None):
+                self._refresh_csrf()
+            try:
+                ret_val = super().api_req(
+                    headers=self._csrf_headers(headers, self.csrf.get()),
+                    **kwargs
+                )
+            except UnexpectedApiResponse as e:
+                if 'CSRF' not in str(e):
+                    raise
+                # Responses to requests sent at once can come back out of
+                # order, leaving an older token than the server's latest
+                self._refresh_csrf()
+                ret_val = super().api_req(
+                    headers=self._csrf_headers(headers, self.csrf.get()),
+                    **kwargs
+                )
+            self._next_csrf(ret_val)
         return ret_val
 
+    def _csrf_headers(self, headers: dict, token: str) -> dict:
+        if token is None:
+            return headers
+        return dict(headers or {}, **{CSRF_HEADER: token})
+
+    def _next_csrf(self, response: requests.Response) -> None:
+        token = response.headers.get(NEXT_CSRF_HEADER)
+        if token is not None:
+            self.csrf.set(token)
+            # Kept on the session too, for the session cache to save
+            self.session.headers[CSRF_HEADER] = token
+
+    def _fetch_csrf(self) -> str:
+        """
+        Get a CSRF token for the session, from the header of an API request
+        that doesn't need one, signed in or not. Failing that, it is read
+        from the web UI landing page, which is streamed only as far as the
+        token.
+        """
+        response = BaseApiHandler.api_req(self, 'get', 'user/', ok=[200, 401],
+                                          safe=True, stream=True)
+        response.close()
+        token = response.headers.get(NEXT_CSRF_HEADER)
+        if token is not None:
+            return token
+        self.logger.debug('No CSRF token header, reading the landing page')
+        with self.session.get(self.base_url, stream=True) as landing:
+            landing.encoding = landing.encoding or 'utf-8'
+            token = scan_token(landing.iter_content(
+                chunk_size=SCAN_CHUNK_SIZE, decode_unicode=True
+            ))
+        if token is None:
+            raise UnexpectedApiResponse(
+                f'No CSRF token found at {self.base_url}, is this a Quay '
+                'instance?'
+            )
+        return token
+
+    def _refresh_csrf(self) -> None:
+        """
+        Replace the CSRF token with a fresh one
+        """
+        token = self._fetch_csrf()
+        self.csrf.set(token)
+        self.session.headers[CSRF_HEADER] = token
+
     def add_user(self, username: str = None,
                  password: str = None) -> requests.Response:
         """
-        Add a user to the Quay instance, returning None if no user was created.
+        Add a user to the Quay instance, raising UnexpectedApiResponse with
+        the server's reply if no user was created.
         """
-        try:
-            return self.api_req('post', 'user', data={'username': username,
-                                                      'password': password})
-        except UnexpectedApiResponse as e:
-            self.logger.warning(f'Unable to add {username}')
-            self.logger.info(json.loads(str(e)).get('error_message'))
-            pass
+        return self.api_req('post', 'user', data={'username': username,
+                                                  'password': password})
+
+    def get_user(self, username: str = None) -> requests.Response:
+        """
+        Returns the response from the API server about a given user,
+        returning None if it isn't present.
+        """
+        response = self.api_req('get', f'users/{username}', ok=[200, 404],
+                                template='users/{username}')
+        if response.status_code == 404:
+            return None
+        return response
 
     def add_org(self, org_name: str = None) -> requests.Response:
         """
-        Add an Organization to the Quay instance, returning None if no
-        organization was created.
+        Add an Organization to the Quay instance, raising
+        UnexpectedApiResponse with the server's reply if no organization was
+        created.
         """
-        try:
-            return self.api_req('post', 'organization', data={
-                'name': org_name,
-                'email': 'devsecops_{}@{}'.format(
-                    ''.join(random.choice(string.ascii_letters)
-                            for i in range(10)),
-                    '.'.join(
-                        self.base_url.strip('/').split('/')[-1].split('.')[-2:]
-                    )
+        return self.api_req('post', 'organization', data={
+            'name': org_name,
+            'email': 'devsecops_{}@{}'.format(
+                ''.join(random.choice(string.ascii_letters)
+                        for i in range(10)),
+                '.'.join(
+                    self.base_url.strip('/').split('/')[-1].split('.')[-2:]
                 )
-            }, ok=[201])
-        except UnexpectedApiResponse as e:
-            self.logger.warning(f'Unable to add {org_name}')
-            self.logger.info(json.loads(str(e)).get('error_message'))
-            pass
+            )
+        }, ok=[201])
+
+    def get_org(self, org_name: str = None) -> requests.Response:
+        """
+        Returns the response from the API server about a given Organization,
+        returning None if it isn't present.
+        """
+        response = self.api_req('get', f'organization/{org_name}',
+                                ok=[200, 404],
+                                template='organization/{orgname}')
+        if response.status_code == 404:
+            return None
+        return response
+
+    def list_repos(self, org_name: str = None) -> List[dict]:
+        """
+        Returns every repository of an Organization, following the listing
+        across pages
+        """
+        def fetch(token: str = None) -> tuple:
+            params = {'namespace': org_name}
+            if token is not None:
+                params['next_page'] = token
+            body = self.api_req('get', 'repository', params=params).json()
+            return body.get('repositories', []), body.get('next_page')
+
+        return list(iter_pages(fetch))
+
+    def list_robots(self, org_name: str = None,
+                    token: bool = False) -> List[dict]:
+        """
+        Returns every robot account of an Organization, with their tokens if
+        token is set
+        """
+        return self.api_req(
+            'get', f'organization/{org_name}/robots',
+            params={'token': 'true' if token else 'false'},
+            template='organization/{orgname}/robots'
+        ).json().get('robots', [])
 
     def add_app(self, org_name: str = None, app_name: str = None,
                 description: str = None) -> requests.Response:
         """
-        Add an Application to an Organization on the Quay instance, returning
-        None if no application was created.
+        Add an Application to an Organization on the Quay instance, raising
+        UnexpectedApiResponse with the server's reply if no application was
+        created.
         """
-        try:
-            return self.api_req(
-                'post',
-                f'organization/{org_name}/applications',
-                data={
-                    'name': app_name,
-                    'description': description or "Created with devsecops-api"
-                }
-            )
-        except UnexpectedApiResponse as e:
-            self.logger.warning(f'Unable to add {app_name}')
-            self.logger.info(json.loads(str(e)).get('error_message'))
-            pass
+        return self.api_req(
+            'post',
+            f'organization/{org_name}/applications',
+            data={
+                'name': app_name,
+                'description': description or "Created with devsecops-api"
+            },
+            template='organization/{orgname}/applications'
+        )
 
     def add_repo(self, org_name: str = None, repo_name: str = None,
                 description: str = None) -> requests.Response:
         """
-        Add a Repository to an Organization on the Quay instance.
+        Add a Repository to an Organization on the Quay instance, raising
+        UnexpectedApiResponse with the server's reply if it wasn't added.
         """
-        try:
-            return self.api_req(
-                'post',
-                'repository',
-                data={
-                    'repo_kind': 'image',
-                    'namespace': org_name,
-                    'visibility': 'public',
-                    'repository': repo_name,
-                    'description': description or "Created with devsecops-api"
-                }
-            )
-        except UnexpectedApiResponse as e:
-            self.logger.warning(f'Unable to add {repo_name}')
-            self.logger.info(json.loads(str(e)).get('error_message'))
-            pass
+        return self.api_req(
+            'post',
+            'repository',
+            data={
+                'repo_kind': 'image',
+                'namespace': org_name,
+                'visibility': 'public',
+                'repository': repo_name,
+                'description': description or "Created with devsecops-api"
+            },
+            ok=[200, 201]
+        )
+
+    def add_repos(self, org_name: str = None, repo_names: Iterable = [],
+                  description: str = None,
+                  parallel: int = 1) -> List[BulkResult]:
+        """
+        Adds many Repositories to an Organization with up to parallel
+        requests in flight, returning a BulkResult per repository in the
+        order given, whose error is what the server said if it failed.
+        """
+        return run_bulk(
+            lambda repo_name: self.add_repo(org_name, repo_name, description),
+            repo_names, parallel
+        )
 
     def get_robot(self, org_name: str = None,
                   robot_name: str = None) -> requests.Response:
@@ -138,33 +476,97 @@ class Quay(BaseApiHandler):
         Returns the response from the API server about a given robot account,
         returning None if no robot is present.
         """
-        try:
-            return self.api_req(
-                'get',
-                f'organization/{org_name}/robots/{robot_name}',
-            )
-        except UnexpectedApiResponse as e:
-            self.logger.warning(f'Unable to find {robot_name}')
-            self.logger.info(json.loads(str(e)).get('error_message'))
-            pass
+        # Quay answers 400 rather than 404 for a robot that doesn't exist
+        response = self.api_req(
+            'get',
+            f'organization/{org_name}/robots/{robot_name}',
+            ok=[200, 400, 404],
+            template='organization/{orgname}/robots/{robot_shortname}'
+        )
+        if response.status_code != 200:
+            return None
+        return response
 
     def add_robot(self, org_name: str = None, robot_name: str = None,
                   description: str = None) -> requests.Response:
         """
-        Add a robot account to an Organization on the Quay instance, returning
-        None if no robot was created.
+        Add a robot account to an Organization on the Quay instance, raising
+        UnexpectedApiResponse with the server's reply if it wasn't added.
         """
-        try:
-            return self.api_req(
-                'put',
-                f'organization/{org_name}/robots/{robot_name}',
-                data={
-                    'description': description or
-                    "Created with devsecops-api",
-                },
-                ok=[200, 201]
-            )
-        except UnexpectedApiResponse as e:
-            self.logger.warning(f'Unable to add {robot_name}')
-            self.logger.info(json.loads(str(e)).get('error_message'))
-            pass
+        return self.api_req(
+            'put',
+            f'organization/{org_name}/robots/{robot_name}',
+            data={
+                'description': description or "Created with devsecops-api",
+            },
+            ok=[200, 201],
+            template='organization/{orgname}/robots/{robot_shortname}'
+        )
+
+    def add_robots(self, org_name: str = None, robot_names: Iterable = [],
+                   description: str = None,
+                   parallel: int = 1) -> List[BulkResult]:
+        """
+        Adds many robot accounts to an Organization with up to parallel
+        requests in flight, returning a BulkResult per robot in the order
+        given, whose error is what the server said if it failed.
+        """
+        return run_bulk(
+            lambda robot_name: self.add_robot(org_name, robot_name,
+                                              description),
+            robot_names, parallel
+        )
+
+    def list_permissions(self, org_name: str = None,
+                         repo_name: str = None) -> dict:
+        """
+        Returns the roles of the users and robots with permissions on a
+        Repository of an Organization, by name
+        """
+        permissions = self.api_req(
+            'get', f'repository/{org_name}/{repo_name}/permissions/user/',
+            template='repository/{repository}/permissions/user/'
+        ).json().get('permissions', {})
+        return {name: permission.get('role')
+                for name, permission in permissions.items()}
+
+    def set_permission(self, org_name: str = None, repo_name: str = None,
+                       username: str = None,
+                       role: str = 'read') -> requests.Response:
+        """
+        Give a user or robot account, as org+robot, a role on a Repository of
+        an Organization, raising UnexpectedApiResponse with the server's
+        reply if the role wasn't set.
+        """
+        return self.api_req(
+            'put',
+            f'repository/{org_name}/{repo_name}/permissions/user/{username}',
+            data={'role': role},
+            template='repository/{repository}/permissions/user/{username}'
+        )
+
+
+class AsyncQuay(AsyncBaseApiHandler):
+    """
+    asyncio twin of Quay, with the same method names and return types.
+    Concurrent calls share the wrapped handler's session, whose CSRF token
+    is handed to each request by its CsrfToken rather than read from the
+    session headers, so that none is sent with a token another response has
+    already replaced. On servers that only accept the latest token they are
+    sent one at a time, and bearer token mode needs no CSRF token at all.
+    """
+    handler_class = Quay
+
+    add_user = async_method(Quay.add_user)
+    get_user = async_method(Quay.get_user)
+    add_org = async_method(Quay.add_org)
+    add_app = async_method(Quay.add_app)
+    add_repo = async_method(Quay.add_repo)
+    get_robot = async_method(Quay.get_robot)
+    add_robot = async_method(Quay.add_robot)
+    mint_token = async_method(Quay.mint_token)
+    get_org = async_method(Quay.get_org)
+    list_repos = async_method(Quay.list_repos)
+    list_robots = async_method(Quay.list_robots)
+    list_permissions = async_method(Quay.list_permissions)
+    set_permission = async_method(Quay.set_permission)
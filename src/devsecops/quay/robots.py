@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.bulk import BulkResult, iter_bulk
+from devsecops.quay.quay import Quay
+from typing import Iterable, Iterator
+import base64
+import json
+import re
+
+
+def robot_tokens(api: Quay, org_name: str, robot_names: Iterable = None,
+                 description: str = None,
+                 parallel: int = 1) -> Iterator[BulkResult]:
+    """
+    Yield a BulkResult per robot account of an Organization, by short name,
+    whose value is the robot with its token. The robots and their tokens are
+    listed in one request. With robot_names, only those robots are yielded,
+    in the order given, and any that don't exist yet are added with up to
+    parallel requests in flight as the results stream out.
+    """
+    existing = {robot['name'].partition('+')[2]: robot
+                for robot in api.list_robots(org_name, token=True)}
+    if robot_names is None:
+        robot_names = sorted(existing)
+
+    def fetch(robot_name: str) -> dict:
+        if robot_name in existing:
+            return existing[robot_name]
+        return api.add_robot(org_name, robot_name, description).json()
+
+    yield from iter_bulk(fetch, dict.fromkeys(robot_names), parallel)
+
+
+def pull_secret(robot: dict, registry: str, namespace: str = None) -> dict:
+    """
+    Returns a Kubernetes image pull secret for a robot with its token, named
+    as the ones Quay offers for download are, for the registry host given
+    """
+    auth = base64.b64encode(
+        f'{robot["name"]}:{robot["token"]}'.encode('utf-8')
+    ).decode('ascii')
+    config = {'auths': {registry: {'auth': auth, 'email': ''}}}
+    name = re.sub(r'[^a-z0-9-]+', '-', robot['name'].lower()).strip('-')
+    metadata = {'name': f'{name}-pull-secret'}
+    if namespace is not None:
+        metadata['namespace'] = namespace
+    return {
+        'apiVersion': 'v1',
+        'kind': 'Secret',
+        'metadata': metadata,
+        'type': 'kubernetes.io/dockerconfigjson',
+        'data': {'.dockerconfigjson': base64.b64encode(
+            json.dumps(config).encode('utf-8')
+        ).decode('ascii')}
+    }
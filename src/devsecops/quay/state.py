@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.bulk import run_bulk
+from devsecops.base.plan import ManifestError, Plan, apply_plan  # noqa
+from devsecops.quay.quay import Quay
+from typing import TextIO
+import yaml
+
+ROLES = ('read', 'write', 'admin')
+SECTIONS = ('organizations',)
+
+
+def _entries(container: dict, section: str, owner: str) -> list:
+    entries = list(container.get(section) or [])
+    for entry in entries:
+        if not isinstance(entry, dict) or not entry.get('name'):
+            raise ManifestError(f'Every entry in {section}{owner} needs a '
+                                'name')
+    return entries
+
+
+def load_manifest(stream: TextIO) -> dict:
+    """
+    Read and check a desired state manifest, returning it with every section
+    present
+    """
+    manifest = yaml.safe_load(stream) or {}
+    if not isinstance(manifest, dict):
+        raise ManifestError('The manifest must be a mapping of sections')
+    unknown = set(manifest) - set(SECTIONS)
+    if unknown:
+        raise ManifestError(f'Unknown manifest sections: '
+                            f'{", ".join(sorted(unknown))}')
+    state = {'organizations': _entries(manifest, 'organizations', '')}
+    for org in state['organizations']:
+        owner = f' of {org["name"]}'
+        org['robots'] = _entries(org, 'robots', owner)
+        org['repositories'] = _entries(org, 'repositories', owner)
+        for repo in org['repositories']:
+            permissions = repo.get('permissions') or {}
+            if not isinstance(permissions, dict):
+                raise ManifestError(f'The permissions of {org["name"]}/'
+                                    f'{repo["name"]} must map users and '
+                                    'robots to roles')
+            for member, role in permissions.items():
+                if role not in ROLES:
+                    raise ManifestError(
+                        f'{member} has unknown role {role} on '
+                        f'{org["name"]}/{repo["name"]}, expected one of '
+                        f'{", ".join(ROLES)}'
+                    )
+            repo['permissions'] = permissions
+    return state
+
+
+def _existing(api: Quay, org: dict) -> tuple:
+    """
+    Returns the repositories and robots of an organization, or None if it
+    doesn't exist, and the number of requests it took. Repositories are
+    mapped to the roles on them, which are only fetched for repositories
+    the manifest gives permissions for.
+    """
+    if api.get_org(org['name']) is None:
+        return None, 1
+    reads = 3
+    names = {repo['name'] for repo in api.list_repos(org['name'])}
+    repos = {}
+    for repo in org['repositories']:
+        if repo['name'] in names and repo['permissions']:
+            repos[repo['name']] = api.list_permissions(org['name'],
+                                                       repo['name'])
+            reads += 1
+    repos.update((name, {}) for name in names if name not in repos)
+    robots = {robot['name'].partition('+')[2]
+              for robot in api.list_robots(org['name'])}
+    return (repos, robots), reads
+
+
+def make_plan(api: Quay, state: dict, parallel: int = 1) -> Plan:
+    """
+    Compare a loaded manifest with the server, listing the repositories and
+    robots of each organization that already exists once, and the
+    permissions on each existing repository the manifest gives any for, up
+    to parallel organizations at a time.
+
+    A permission's member is a robot of the organization if the manifest
+    lists one by that name, and otherwise a user or an org+robot name.
+    """
+    result = Plan(api)
+    orgs = state['organizations']
+    existing = []
+    for outcome in run_bulk(lambda org: _existing(api, org),
+                            [(org,) for org in orgs], parallel):
+        if outcome.error is not None:
+            raise outcome.error
+        found, reads = outcome.value
+        existing.append(found)
+        result.reads += reads
+
+    for org, found in zip(orgs, existing):
+        name = org['name']
+        repos, robots = found or ({}, set())
+        if found is None:
+            result.add(0, 'create', 'organization', name, None, api.add_org,
+                       (name,), [])
+        else:
+            result.unchanged.append(('organization', name))
+        depends = [('organization', name)]
+
+        for robot in org['robots']:
+            full_name = f'{name}+{robot["name"]}'
+            if robot['name'] in robots:
+                result.unchanged.append(('robot', full_name))
+                continue
+            result.add(1, 'create', 'robot', full_name, None, api.add_robot,
+                       (name, robot['name'], robot.get('description')),
+                       depends)
+
+        org_robots = {robot['name'] for robot in org['robots']}
+        for repo in org['repositories']:
+            full_name = f'{name}/{repo["name"]}'
+            if repo['name'] in repos:
+                result.unchanged.append(('repository', full_name))
+            else:
+                result.add(1, 'create', 'repository', full_name, None,
+                           api.add_repo,
+                           (name, repo['name'], repo.get('description')),
+                           depends)
+            roles = repos.get(repo['name'], {})
+            for member, role in repo['permissions'].items():
+                member_depends = [('repository', full_name)]
+                if member in org_robots:
+                    member = f'{name}+{member}'
+                    member_depends.append(('robot', member))
+                if roles.get(member) == role:
+                    result.unchanged.append(('permission',
+                                             f'{full_name} {member}'))
+                    continue
+                result.add(2, 'update', 'permission',
+                           f'{full_name} {member}', role,
+                           api.set_permission,
+                           (name, repo['name'], member, role),
+                           member_depends)
+
+    return result
@@ -1,21 +1,34 @@
 #!/usr/bin/env python3
 # SPDX-License-Identifier: BSD-2-Clause
 from devsecops.base.base_handler import BaseApiHandler, UnexpectedApiResponse
+from devsecops.base.async_handler import AsyncBaseApiHandler, async_method
+from devsecops.base.retry import RetryPolicy
 from typing import TypeVar
-from time import sleep
+from time import monotonic, sleep
 import requests
 import json
 
 T = TypeVar("T", bound="SonarQube")
 
+# SonarQube creates its built-in admin user a while after it starts up, so
+# sign-in keeps trying every 3 seconds for 12 seconds before giving up
+SIGN_IN_POLICY = RetryPolicy(max_attempts=5, backoff_factor=3, max_backoff=3,
+                             jitter=False)
+
 
 class SonarQube(BaseApiHandler):
+    health_endpoint = 'api/system/status'
+
     def __init__(self, base_url: str = None, username: str = None,
                  password: str = None, verbosity: int = 0,
-                 new_password: str = None) -> None:
+                 new_password: str = None,
+                 sign_in_policy: RetryPolicy = None, **kwargs) -> None:
         """
         Initialize a SonarQube API wrapper with logging, URL information, and
-        other necessary variables to track state
+        other necessary variables to track state. Sign-in is retried by
+        sign_in_policy, SIGN_IN_POLICY by default, rather than the policy for
+        other requests. Other keyword arguments are passed on to
+        BaseApiHandler.
         """
         super().__init__(
             service_name='SonarQube',
@@ -25,17 +38,19 @@ class SonarQube(BaseApiHandler):
             password=password,
             verbosity=verbosity,
             auth=True,
-            kwarg_type='params'
+            kwarg_type='params',
+            **kwargs
         )
         self.new_password = new_password
         self.old_password = None
+        self.sign_in_policy = sign_in_policy or SIGN_IN_POLICY
 
     def _sign_in(self) -> bool:
         """
         Sign in to SonarQube and return whether login was valid
         """
         return json.loads(
-            self.api_req('post', 'authentication/validate').text
+            self.api_req('post', 'authentication/validate', safe=True).text
         ).get('valid')
 
     def _swap_passwords(self) -> None:
@@ -54,21 +69,53 @@ class SonarQube(BaseApiHandler):
             self.old_password = None
             self.logger.debug('Changed to old_password')
 
+    def _session_valid(self) -> bool:
+        """
+        Check which password a restored session signs in with by asking the
+        server, so that nothing derived from the passwords is kept in the
+        session cache. A cached session is not usable while a requested
+        password change is still pending.
+        """
+        if self.new_password is not None:
+            self._swap_passwords()
+            if self._sign_in():
+                # The password was already changed
+                return True
+            self._swap_passwords()
+            return False
+        return bool(self._sign_in())
+
     def sign_in(self) -> None:
         """
-        Tries to sign in to Nexus 4 times, swapping the new_password in and out
-        as necessary, in case it was changed already, with a 3-second delay
-        in between to account for SonarQube not instantiating the built-in
-        admin user right away.
+        Sign in to SonarQube, trying the new_password as well in case it was
+        changed already. Failed attempts are retried as the sign_in_policy
+        allows, to account for SonarQube not instantiating the built-in admin
+        user right away.
         """
         self._get_session()
-        tries = 4
-        while not self._sign_in():
-            self._swap_passwords()
-            if tries == 0:
+        policy = self.sign_in_policy
+        started = monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            if self._sign_in():
+                break
+            if (self.new_password is not None or
+                    self.old_password is not None):
+                self._swap_passwords()
+                if self._sign_in():
+                    break
+            remaining = None
+            if policy.deadline is not None:
+                remaining = policy.deadline - (monotonic() - started)
+            delay = policy.next_delay(attempt, remaining)
+            if delay is None:
                 raise UnexpectedApiResponse('Unable to log in to SonarQube')
-            tries -= 1
-            sleep(3)
+            self.logger.warning(
+                f'Unable to log in to SonarQube, retrying in {delay:.2f}s '
+                f'(attempt {attempt + 1} of {policy.max_attempts})'
+            )
+            sleep(delay)
         if self.new_password is not None:
             self.api_req('post', 'users/change_password',
                          data={'login': self.username,
@@ -110,7 +157,8 @@ class SonarQube(BaseApiHandler):
         """
         try:
             return json.loads(
-                self.api_req('post', 'users/search', data={'q': username}).text
+                self.api_req('post', 'users/search', data={'q': username},
+                             safe=True, cache=True).text
             ).get('users')
         except UnexpectedApiResponse as e:
             self.logger.warning(f'No response from query for  {username}')
@@ -133,3 +181,14 @@ class SonarQube(BaseApiHandler):
             )
             self.logger.exception("Update setting error", exc_info=True)
             pass
+
+
+class AsyncSonarQube(AsyncBaseApiHandler):
+    """
+    asyncio twin of SonarQube, with the same method names and return types
+    """
+    handler_class = SonarQube
+
+    add_user = async_method(SonarQube.add_user)
+    search_users = async_method(SonarQube.search_users)
+    update_setting = async_method(SonarQube.update_setting)
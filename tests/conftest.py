@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from benchmarks import fakes
+import pytest
+
+
+@pytest.fixture
+def fake_nexus():
+    """
+    A freshly seeded fake Nexus, served on a background thread
+    """
+    fake = fakes.FakeNexus()
+    fake.url = fake.start()
+    yield fake
+    fake.stop()
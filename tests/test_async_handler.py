@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from benchmarks import fakes
+from devsecops.base.async_handler import host_semaphore
+from devsecops.nexus.nexus import AsyncNexus
+import asyncio
+import threading
+import time
+
+
+class CountingNexus(fakes.FakeNexus):
+    """
+    Fake Nexus that remembers the most role lookups it had in flight at once
+    """
+
+    def seed(self) -> None:
+        super().seed()
+        self.in_flight = self.most_in_flight = 0
+        self.counting = threading.Lock()
+
+    def get_role(self, request: fakes.Request) -> tuple:
+        with self.counting:
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        time.sleep(0.02)
+        with self.counting:
+            self.in_flight -= 1
+        return super().get_role(request)
+
+
+def test_a_host_shares_one_semaphore_whatever_the_limit():
+    async def semaphores():
+        return host_semaphore('nexus:8081', 2), host_semaphore('nexus:8081', 8)
+
+    first, second = asyncio.run(semaphores())
+    assert first is second
+
+
+def test_twins_with_different_limits_share_the_host_bound():
+    fake = CountingNexus()
+    url = fake.start()
+
+    async def lookups():
+        async with AsyncNexus(url, 'admin', 'admin',
+                              max_concurrency=2) as narrow, \
+                AsyncNexus(url, 'admin', 'admin',
+                           max_concurrency=8) as wide:
+            return await asyncio.gather(*[
+                twin.get_role('nx-admin') for twin in [narrow, wide] * 8
+            ])
+
+    try:
+        roles = asyncio.run(lookups())
+    finally:
+        fake.stop()
+    assert [role['id'] for role in roles] == ['nx-admin'] * 16
+    assert fake.most_in_flight <= 2
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from benchmarks import fakes
+from devsecops.base.base_handler import UnexpectedApiResponse
+from devsecops.nexus.batch import run_batch
+from devsecops.nexus.nexus import DEFAULT_USER_ROLES, Nexus
+import pytest
+
+RUN = 'POST /service/rest/v1/script/([^/]+)/run'
+
+OPERATIONS = [
+    ('add_repo', ('batch-releases',)),
+    ('add_raw_repo', ('batch-raw',)),
+    ('add_npm_repo', ('batch-npm',)),
+    ('add_role', ('batch-role', '', ['nx-all'])),
+    ('add_user', ('batch-admin', 'secret')),
+    ('add_user', ('batch-nobody', 'secret', [])),
+    ('update_role', ('nx-anonymous', 'updated', ['nx-search-read'])),
+]
+
+
+@pytest.fixture(params=[True, False], ids=['scripted', 'rest'])
+def fake(request):
+    fake = fakes.FakeNexus(scripting=request.param)
+    fake.url = fake.start()
+    yield fake
+    fake.stop()
+
+
+def script_runs(fake) -> int:
+    return fake.stats()['by_route'].get(RUN, 0)
+
+
+def test_batches_match_the_rest_api(fake):
+    with Nexus(fake.url, 'admin', 'admin') as api:
+        before = {repo['name'] for repo in api.list_repos()}
+        results = run_batch(api, OPERATIONS, parallel=2, batch_size=2)
+        after = {repo['name'] for repo in api.list_repos()}
+        assert api.search_repos('batch-raw')
+    assert [result.item for result in results] == OPERATIONS
+    assert [result.error for result in results] == [None] * 7
+    assert [result.value.status_code for result in results] == \
+        [201, 201, 201, 200, 200, 200, 204]
+    assert results[4].value.json()['userId'] == 'batch-admin'
+    assert results[3].value.json()['id'] == 'batch-role'
+    assert after - before == {'batch-releases', 'batch-raw', 'batch-npm'}
+    assert fake.users['batch-admin']['roles'] == list(DEFAULT_USER_ROLES)
+    assert fake.users['batch-nobody']['roles'] == []
+    assert fake.roles['nx-anonymous']['description'] == 'updated'
+    # Six scripted operations two at a time, and update_role over REST
+    assert script_runs(fake) == (3 if fake.scripting else 0)
+
+
+def test_failed_operations_carry_the_server_error(fake_nexus):
+    with Nexus(fake_nexus.url, 'admin', 'admin') as api:
+        results = run_batch(api, [('add_repo', ('maven-releases',)),
+                                  ('add_repo', ('batch-releases',))])
+    assert isinstance(results[0].error, UnexpectedApiResponse)
+    assert 'already exists' in str(results[0].error)
+    assert results[1].error is None
+    assert script_runs(fake_nexus) == 1
+
+
+def test_the_script_is_installed_once(fake_nexus):
+    with Nexus(fake_nexus.url, 'admin', 'admin') as api:
+        run_batch(api, OPERATIONS[:1])
+        run_batch(api, OPERATIONS[1:2])
+    assert fake_nexus.stats()['by_route'].get(
+        'POST /service/rest/v1/script', 0
+    ) == 1
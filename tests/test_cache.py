@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from benchmarks import fakes
+from devsecops.base.cache import ResponseCache
+from devsecops.nexus.nexus import Nexus
+import json
+import pytest
+
+
+class ValidatingNexus(fakes.FakeNexus):
+    """
+    Fake Nexus that tags the repository listing with an ETag, answering 304
+    to requests that already have the current one
+    """
+
+    def seed(self) -> None:
+        super().seed()
+        self.validated = []
+
+    def list_repos(self, request: fakes.Request) -> tuple:
+        status, repos = super().list_repos(request)
+        etag = '"{}"'.format(len(json.dumps(repos)))
+        self.validated.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == etag:
+            return 304, None, {'ETag': etag}
+        return status, repos, {'ETag': etag}
+
+
+@pytest.fixture
+def fake():
+    fake = ValidatingNexus()
+    fake.url = fake.start()
+    yield fake
+    fake.stop()
+
+
+def names(repos: list) -> set:
+    return {repo['name'] for repo in repos}
+
+
+def test_fresh_entries_are_served_without_a_request(fake):
+    with Nexus(fake.url, 'admin', 'admin',
+               response_cache=ResponseCache(ttl=60)) as api:
+        assert api.list_repos() == api.list_repos()
+    assert fake.validated == [None]
+
+
+def test_stale_entries_are_revalidated(fake):
+    cache = ResponseCache(ttl=0)
+    with Nexus(fake.url, 'admin', 'admin', response_cache=cache) as api:
+        first = api.list_repos()
+        key = cache.key('get', 'beta/repositories')
+        response = cache.get(key).response
+        assert api.list_repos() == first
+        # The 304 refreshed the entry rather than replacing it
+        assert cache.get(key).response is response
+    etag = response.headers['ETag']
+    assert fake.validated == [None, etag]
+
+
+def test_writes_invalidate_their_collection(fake):
+    with Nexus(fake.url, 'admin', 'admin',
+               response_cache=ResponseCache(ttl=60)) as api:
+        before = names(api.list_repos())
+        api.add_repo('cached-releases')
+        assert names(api.list_repos()) == before | {'cached-releases'}
+    assert fake.validated == [None, None]
+
+
+def test_invalidate_drops_only_the_collection():
+    cache = ResponseCache()
+    cache.put(cache.key('get', 'beta/repositories'), None)
+    cache.put(cache.key('get', 'v1/security/roles'), None)
+    cache.invalidate('v1/repositories/maven/hosted')
+    assert cache.get(cache.key('get', 'beta/repositories')) is None
+    assert cache.get(cache.key('get', 'v1/security/roles')) is not None
+    cache.invalidate()
+    assert cache.get(cache.key('get', 'v1/security/roles')) is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_entries=2)
+    for endpoint in ['v1/a', 'v1/b']:
+        cache.put(cache.key('get', endpoint), None)
+    cache.get(cache.key('get', 'v1/a'))
+    cache.put(cache.key('get', 'v1/c'), None)
+    assert cache.get(cache.key('get', 'v1/b')) is None
+    assert cache.get(cache.key('get', 'v1/a')) is not None
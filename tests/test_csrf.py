@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from benchmarks import fakes
+from concurrent.futures import ThreadPoolExecutor
+from devsecops.quay.quay import CsrfToken, Quay
+import threading
+import time
+import pytest
+
+ROBOTS = [f'bot{i}' for i in range(24)]
+
+
+@pytest.fixture(params=[False, True], ids=['lenient', 'strict'])
+def fake(request):
+    fake = fakes.FakeQuay(strict_csrf=request.param, size=1)
+    fake.url = fake.start()
+    yield fake
+    fake.stop()
+
+
+def test_a_refused_token_is_replaced_once():
+    csrf = CsrfToken('stale')
+    assert csrf.replace('stale', None)
+    csrf.set('fresh')
+    # A second thread refused with the same stale token leaves it be
+    assert not csrf.replace('stale', None)
+    assert csrf.get() == 'fresh'
+
+
+@pytest.mark.parametrize('exclusive', [False, True])
+def test_leases_are_exclusive_only_when_asked(exclusive):
+    csrf = CsrfToken('token')
+    counting = threading.Lock()
+    held = []
+    in_flight = [0]
+
+    def request(_) -> None:
+        with csrf.lease(exclusive):
+            with counting:
+                in_flight[0] += 1
+                held.append(in_flight[0])
+            time.sleep(0.02)
+            with counting:
+                in_flight[0] -= 1
+
+    with ThreadPoolExecutor(4) as pool:
+        list(pool.map(request, range(4)))
+    assert (max(held) == 1) is exclusive
+    assert csrf.exclusive is exclusive
+
+
+def test_concurrent_requests_share_the_session(fake):
+    with Quay(fake.url, 'admin', 'admin') as api:
+        results = api.add_robots('org00000', ROBOTS, parallel=8)
+        # Only a server taking just the latest token serializes requests
+        assert api.csrf.exclusive is fake.strict_csrf
+    assert [result.error for result in results] == [None] * len(ROBOTS)
+    assert sorted(fake.orgs['org00000']['robots']) == sorted(ROBOTS)
+
+
+def test_a_stale_token_is_refreshed(fake):
+    with Quay(fake.url, 'admin', 'admin') as api:
+        api.csrf.set('stale')
+        api.session.headers['X-CSRF-Token'] = 'stale'
+        assert api.add_robot('org00000', 'late').json()['name'] == \
+            'org00000+late'
+        assert api.csrf.get() not in (None, 'stale')
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.nexus.inventory import RepositoryInventory
+from devsecops.nexus.nexus import Nexus
+import pytest
+
+NAMES = ['foo', 'foo-releases', 'foo-snapshots', 'bar-releases', 'fo',
+         'npm-proxy']
+
+
+def names(repos: list) -> list:
+    return [repo['name'] for repo in repos]
+
+
+@pytest.fixture
+def inventory():
+    return RepositoryInventory([{'name': name} for name in NAMES])
+
+
+def test_exact_is_the_default(inventory):
+    assert names(inventory.search('foo')) == ['foo']
+    assert inventory.search('releases') == []
+
+
+@pytest.mark.parametrize('mode, pattern, expected', [
+    ('exact', 'foo', ['foo']),
+    ('exact', 'fo', ['fo']),
+    ('prefix', 'foo', ['foo', 'foo-releases', 'foo-snapshots']),
+    ('prefix', '', sorted(NAMES)),
+    ('glob', '*-releases', ['bar-releases', 'foo-releases']),
+    ('glob', 'f?', ['fo']),
+    ('glob', 'foo-[rs]*', ['foo-releases', 'foo-snapshots']),
+    ('substring', 'releases', ['bar-releases', 'foo-releases']),
+    ('substring', 'o', ['fo', 'foo', 'foo-releases', 'foo-snapshots',
+                        'npm-proxy']),
+    ('substring', 'nothing', []),
+])
+def test_match_modes(inventory, mode, pattern, expected):
+    assert names(inventory.search(pattern, mode)) == expected
+
+
+def test_unknown_modes_are_refused(inventory):
+    with pytest.raises(ValueError, match='Unknown match mode'):
+        inventory.search('foo', 'fuzzy')
+
+
+def test_added_repositories_are_found(inventory):
+    inventory.add({'name': 'baz-releases'})
+    assert names(inventory.search('releases', 'substring')) == \
+        ['bar-releases', 'baz-releases', 'foo-releases']
+    assert names(inventory.search('ba', 'prefix')) == \
+        ['bar-releases', 'baz-releases']
+    assert 'baz-releases' in inventory
+
+
+def test_search_repos_matches_exactly_unless_asked(fake_nexus):
+    with Nexus(fake_nexus.url, 'admin', 'admin') as api:
+        assert api.search_repos('maven') == []
+        assert names(api.search_repos('maven-releases')) == \
+            ['maven-releases']
+        assert names(api.search_repos('maven', mode='substring')) == \
+            ['maven-public', 'maven-releases']
+        api.add_repo('maven-extra')
+        assert names(api.search_repos('maven-extra')) == ['maven-extra']
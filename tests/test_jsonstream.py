@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from benchmarks import fakes
+from devsecops.base.jsonstream import iter_json_array
+from devsecops.nexus.nexus import Nexus
+import json
+import pytest
+
+DOCUMENT = [
+    {'name': 'café', 'tags': ['☃', 'x,y]'], 'nested': {'a': [1]}},
+    12345, -1.5e10, 0.25, True, None, 'plain', [], {}, '\U0001f600'
+]
+
+
+def chunked(data: bytes, size: int) -> list:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 4096])
+def test_elements_survive_any_chunking(size):
+    data = json.dumps(DOCUMENT, ensure_ascii=False).encode('utf-8')
+    assert list(iter_json_array(chunked(data, size))) == DOCUMENT
+
+
+def test_numbers_split_before_their_fraction_are_whole():
+    chunks = [b'[1', b'2', b'.', b'5e', b'3, 4', b']']
+    assert list(iter_json_array(chunks)) == [12500.0, 4]
+
+
+def test_elements_are_yielded_before_the_rest_arrives():
+    def chunks():
+        yield b'[{"id": 1},'
+        raise AssertionError('read past the first element')
+
+    assert next(iter_json_array(chunks())) == {'id': 1}
+
+
+@pytest.mark.parametrize('data', [b'[]', b' [ ] ', b'\n[\n]\n'])
+def test_empty_arrays(data):
+    assert list(iter_json_array([data])) == []
+
+
+@pytest.mark.parametrize('data, message', [
+    (b'{"a": 1}', 'Expected a JSON array'),
+    (b'', 'Expected a JSON array'),
+    (b'[1, 2,', 'Unexpected end'),
+    (b'[1, 2', 'Expected , or ]'),
+    (b'[1 2]', 'Expected , or ]'),
+    (b'[{"a": 1}', 'Expected , or ]'),
+])
+def test_malformed_input_is_refused(data, message):
+    with pytest.raises(ValueError, match=message):
+        list(iter_json_array(chunked(data, 2)))
+
+
+def test_users_stream_from_the_server():
+    fake = fakes.FakeNexus(size=250)
+    url = fake.start()
+    try:
+        with Nexus(url, 'admin', 'admin') as api:
+            users = [user['userId'] for user in api.iter_users()]
+            found = api.search_users('user0010')
+    finally:
+        fake.stop()
+    assert users == sorted(fake.users)
+    assert [user['userId'] for user in found] == \
+        [f'user{i:05d}' for i in range(100, 110)]
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from benchmarks import fakes
+from devsecops.nexus.mirror import MANIFEST, local_path, mirror
+from devsecops.nexus.nexus import ChecksumMismatch, Nexus
+import os
+import pytest
+
+
+@pytest.fixture
+def fake():
+    fake = fakes.FakeNexus(size=5)
+    fake.url = fake.start()
+    yield fake
+    fake.stop()
+
+
+def content(path: str) -> bytes:
+    return fakes.asset_content(path)
+
+
+def downloads(fake) -> int:
+    return fake.stats()['by_route'].get('GET /repository/([^/]+)/(.+)', 0)
+
+
+def test_mirror_downloads_once_then_skips_unchanged(fake, tmp_path):
+    with Nexus(fake.url, 'admin', 'admin') as api:
+        first = list(mirror(api, 'maven-releases', str(tmp_path), 4))
+        fetched = downloads(fake)
+        again = list(mirror(api, 'maven-releases', str(tmp_path), 4))
+    assert [result.value for result in first] == ['downloaded'] * 10
+    assert [result.value for result in again] == ['unchanged'] * 10
+    assert downloads(fake) == fetched == 10
+    assert (tmp_path / MANIFEST).exists()
+    for result in first:
+        path = result.item['path']
+        with open(local_path(str(tmp_path), path), 'rb') as f:
+            assert f.read() == content(path)
+
+
+def test_files_changed_on_disk_are_downloaded_again(fake, tmp_path):
+    with Nexus(fake.url, 'admin', 'admin') as api:
+        assets = [result.item for result in
+                  mirror(api, 'maven-releases', str(tmp_path))]
+        filename = local_path(str(tmp_path), assets[0]['path'])
+        with open(filename, 'ab') as f:
+            f.write(b'extra')
+        again = [result.value for result in
+                 mirror(api, 'maven-releases', str(tmp_path))]
+    assert again == ['downloaded'] + ['unchanged'] * 9
+    with open(filename, 'rb') as f:
+        assert f.read() == content(assets[0]['path'])
+
+
+def first_asset(api: Nexus) -> dict:
+    return next(iter(api.iter_assets('maven-releases')))
+
+
+def test_interrupted_downloads_resume(fake, tmp_path):
+    filename = str(tmp_path / 'asset')
+    with Nexus(fake.url, 'admin', 'admin') as api:
+        asset = first_asset(api)
+        expected = content(asset['path'])
+        with open(f'{filename}.part', 'wb') as f:
+            f.write(expected[:1000])
+        api.download_asset(asset, filename)
+    with open(filename, 'rb') as f:
+        assert f.read() == expected
+    assert not os.path.exists(f'{filename}.part')
+
+
+def test_a_resumed_download_is_checked_whole(fake, tmp_path):
+    filename = str(tmp_path / 'asset')
+    with Nexus(fake.url, 'admin', 'admin') as api:
+        asset = first_asset(api)
+        # Only the rest is fetched, so a bad start fails the checksum
+        with open(f'{filename}.part', 'wb') as f:
+            f.write(b'x' * 1000)
+        with pytest.raises(ChecksumMismatch):
+            api.download_asset(asset, filename)
+        assert not os.path.exists(f'{filename}.part')
+        with open(f'{filename}.part', 'wb') as f:
+            f.write(b'x' * 1000)
+        api.download_asset(asset, filename, resume=False)
+    with open(filename, 'rb') as f:
+        assert f.read() == content(asset['path'])
+
+
+def test_a_complete_part_is_not_fetched_again(fake, tmp_path):
+    filename = str(tmp_path / 'asset')
+    with Nexus(fake.url, 'admin', 'admin') as api:
+        asset = first_asset(api)
+        with open(f'{filename}.part', 'wb') as f:
+            f.write(content(asset['path']))
+        api.download_asset(asset, filename)
+    with open(filename, 'rb') as f:
+        assert f.read() == content(asset['path'])
+
+
+@pytest.mark.parametrize('path', ['../escape', 'a/../../escape', ''])
+def test_paths_outside_the_destination_are_refused(tmp_path, path):
+    with pytest.raises(ValueError, match='outside'):
+        local_path(str(tmp_path), path)
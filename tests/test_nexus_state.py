@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.nexus import state
+from devsecops.nexus.nexus import Nexus
+import io
+import pytest
+
+MANIFEST = """
+repositories:
+  - name: maven-releases
+  - name: team-releases
+  - name: team-proxy
+    kind: proxy
+    remote_url: https://repo1.maven.org/maven2/
+groups:
+  - name: team-public
+    members: [team-releases, team-proxy]
+roles:
+  - id: team-deployer
+    privileges: [nx-all]
+users:
+  - name: alice
+    password: secret
+    roles: [team-deployer]
+  - name: bob
+    password: secret
+"""
+
+
+def load(manifest: str = MANIFEST) -> dict:
+    return state.load_manifest(io.StringIO(manifest))
+
+
+def planned(plan) -> set:
+    return {(step.action, step.kind, step.name) for step in plan.steps}
+
+
+def test_manifest_problems_are_reported():
+    with pytest.raises(state.ManifestError, match='Unknown manifest'):
+        load('servers: []')
+    with pytest.raises(state.ManifestError, match='needs a remote_url'):
+        load('repositories: [{name: p, kind: proxy}]')
+    with pytest.raises(state.ManifestError, match='needs a password'):
+        load('users: [{name: carol}]')
+
+
+def test_apply_converges(fake_nexus):
+    with Nexus(fake_nexus.url, 'admin', 'admin') as api:
+        plan = state.make_plan(api, load())
+        assert planned(plan) == {
+            ('create', 'repository', 'team-releases'),
+            ('create', 'repository', 'team-proxy'),
+            ('create', 'group', 'team-public'),
+            ('create', 'role', 'team-deployer'),
+            ('create', 'user', 'alice'),
+            ('create', 'user', 'bob'),
+        }
+        results = state.apply_plan(plan, parallel=4)
+        assert [result.error for result in results] == [None] * 6
+    with Nexus(fake_nexus.url, 'admin', 'admin') as api:
+        assert state.make_plan(api, load()).steps == []
+    assert fake_nexus.users['alice']['roles'] == ['team-deployer']
+    # Users the manifest gives no roles get none, not administrator
+    assert fake_nexus.users['bob']['roles'] == []
+
+
+def test_users_without_roles_are_granted_theirs(fake_nexus):
+    fake_nexus.users['alice'] = {'userId': 'alice', 'source': 'default'}
+    with Nexus(fake_nexus.url, 'admin', 'admin') as api:
+        plan = state.make_plan(api, load(
+            'users: [{name: alice, password: secret, roles: [nx-admin]}]'
+        ))
+        assert planned(plan) == {('update', 'user', 'alice')}
+        assert [result.error for result in state.apply_plan(plan)] == [None]
+    assert fake_nexus.users['alice']['roles'] == ['nx-admin']
+
+
+def test_dependents_of_a_failed_repository_are_skipped(fake_nexus):
+    with Nexus(fake_nexus.url, 'admin', 'admin') as api:
+        plan = state.make_plan(api, load())
+        fake_nexus.repos['team-proxy'] = fake_nexus.repo('team-proxy',
+                                                         'maven2', 'proxy')
+        results = {(result.item.kind, result.item.name): result
+                   for result in state.apply_plan(plan)}
+    assert results[('repository', 'team-proxy')].error is not None
+    assert isinstance(results[('group', 'team-public')].error,
+                      state.ManifestError)
+    assert results[('user', 'alice')].error is None
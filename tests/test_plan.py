@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.plan import ManifestError, Plan, apply_plan, run_steps
+
+
+def make_plan(calls: list, fail: set = set()) -> Plan:
+    """
+    A plan of an organization, a repository and a robot in it, and a
+    permission for the robot on the repository, whose steps record the
+    order they ran in and fail if named in fail
+    """
+    def call(name: str) -> str:
+        calls.append(name)
+        if name in fail:
+            raise ValueError(f'{name} failed')
+        return name
+
+    plan = Plan()
+    plan.add(2, 'update', 'permission', 'org/repo org+bot', 'read', call,
+             ('permission',), [('repository', 'org/repo'),
+                               ('robot', 'org+bot')])
+    plan.add(1, 'create', 'repository', 'org/repo', None, call,
+             ('repository',), [('organization', 'org')])
+    plan.add(1, 'create', 'robot', 'org+bot', None, call, ('robot',),
+             [('organization', 'org')])
+    plan.add(0, 'create', 'organization', 'org', None, call,
+             ('organization',), [])
+    return plan
+
+
+def test_stages_run_in_order():
+    calls = []
+    results = apply_plan(make_plan(calls), parallel=4)
+    assert calls[0] == 'organization'
+    assert set(calls[1:3]) == {'repository', 'robot'}
+    assert calls[3] == 'permission'
+    assert [result.value for result in results] == \
+        [result.item.kind for result in results]
+    assert all(result.error is None for result in results)
+
+
+def test_dependents_of_failed_steps_are_skipped():
+    calls = []
+    results = {result.item.kind: result
+               for result in apply_plan(make_plan(calls, {'robot'}))}
+    assert 'permission' not in calls
+    assert isinstance(results['robot'].error, ValueError)
+    assert results['repository'].error is None
+    error = results['permission'].error
+    assert isinstance(error, ManifestError)
+    assert 'robot org+bot' in str(error)
+
+
+def test_steps_returning_none_count_as_failed():
+    calls = []
+    plan = make_plan(calls)
+    plan.steps = [step._replace(call=lambda name: calls.append(name))
+                  if step.kind == 'organization' else step
+                  for step in plan.steps]
+    results = apply_plan(plan)
+    assert calls == ['organization']
+    assert all(isinstance(result.error, ManifestError)
+               for result in results if result.item.stage > 0)
+
+
+def test_steps_run_through_the_given_runner():
+    batches = []
+
+    def run(steps, parallel):
+        batches.append(sorted(step.kind for step in steps))
+        return run_steps(steps, parallel)
+
+    apply_plan(make_plan([]), run=run)
+    assert batches == [['organization'], ['repository', 'robot'],
+                       ['permission']]
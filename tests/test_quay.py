@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from benchmarks import fakes
+from click.testing import CliRunner
+from devsecops.base.plan import apply_plan
+from devsecops.cli import main
+from devsecops.quay import state
+from devsecops.quay.quay import Quay, UnexpectedApiResponse
+import pytest
+import re
+
+
+@pytest.fixture
+def fake():
+    fake = fakes.FakeQuay(size=1)
+    fake.url = fake.start()
+    yield fake
+    fake.stop()
+
+
+def refuse(fake, method: str, pattern: str) -> None:
+    """Have the fake answer 403 to requests matching pattern, ahead of the
+    route that would have handled them"""
+    fake.routes.insert(0, (method, re.compile(f'^{pattern}$'),
+                           lambda request: fakes.error(403, 'Forbidden'),
+                           False))
+
+
+def quay(fake, *args):
+    return CliRunner().invoke(main, ['quay', *args, fake.url, '-U', 'admin',
+                                     '-P', 'admin'])
+
+
+def test_mutators_raise_the_servers_reply(fake):
+    with Quay(fake.url, 'admin', 'admin') as api:
+        with pytest.raises(UnexpectedApiResponse, match='already exists'):
+            api.add_user('user00000', 'secret')
+        with pytest.raises(UnexpectedApiResponse, match='already exists'):
+            api.add_org('org00000')
+        with pytest.raises(UnexpectedApiResponse, match='Not Found'):
+            api.add_app('missing', 'app')
+        refuse(fake, 'PUT', '/api/v1/repository/.*')
+        with pytest.raises(UnexpectedApiResponse, match='Forbidden'):
+            api.set_permission('org00000', 'repo00000', 'user00000')
+
+
+def test_lookups_return_none_only_for_missing_items(fake):
+    with Quay(fake.url, 'admin', 'admin') as api:
+        assert api.get_user('user00000') is not None
+        assert api.get_user('missing') is None
+        assert api.get_org('org00000') is not None
+        assert api.get_org('missing') is None
+        api.add_robot('org00000', 'bot')
+        assert api.get_robot('org00000', 'bot') is not None
+        assert api.get_robot('org00000', 'missing') is None
+        refuse(fake, 'GET', '/api/v1/(users|organization)/.*')
+        for lookup in (lambda: api.get_user('user00000'),
+                       lambda: api.get_org('org00000'),
+                       lambda: api.get_robot('org00000', 'bot')):
+            with pytest.raises(UnexpectedApiResponse, match='Forbidden'):
+                lookup()
+
+
+def test_add_user_reports_each_user(fake):
+    refuse(fake, 'POST', '/api/v1/user')
+    fake.users['taken'] = {'username': 'taken'}
+    result = quay(fake, 'add-user', '-u', 'taken,refused', '-p', 'a,b')
+    assert result.stdout.splitlines() == ['taken ok', 'refused failed']
+    assert 'Error adding refused:' in result.output
+    assert result.exit_code == 1
+
+
+def test_add_org_reports_each_org(fake):
+    fake.users['user-named'] = {'username': 'user-named'}
+    result = quay(fake, 'add-org', '-o', 'org00000,new-org,user-named')
+    assert result.stdout.splitlines() == ['org00000 ok', 'new-org added',
+                                          'user-named failed']
+    assert 'Error adding user-named:' in result.output
+    assert result.exit_code == 1
+
+
+def test_add_app_fails_with_the_servers_reply(fake):
+    result = quay(fake, 'add-app', '-o', 'missing', '-a', 'app')
+    assert 'Error adding app:' in result.output
+    assert result.exit_code == 1
+
+
+def test_apply_records_refused_permissions(fake):
+    refuse(fake, 'PUT', '/api/v1/repository/.*')
+    desired = state.load_manifest(
+        'organizations:\n'
+        '  - name: org00000\n'
+        '    repositories:\n'
+        '      - name: repo00000\n'
+        '        permissions: {user00000: write}\n'
+    )
+    with Quay(fake.url, 'admin', 'admin') as api:
+        results = apply_plan(state.make_plan(api, desired))
+    assert [result.item.kind for result in results] == ['permission']
+    assert isinstance(results[0].error, UnexpectedApiResponse)
+    assert 'Forbidden' in str(results[0].error)
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from benchmarks import fakes
+from devsecops.base.base_handler import UnexpectedApiResponse
+from devsecops.base.retry import RetryPolicy
+from devsecops.nexus.nexus import Nexus
+from devsecops.sonarqube.sonarqube import SIGN_IN_POLICY, SonarQube
+import pytest
+import requests
+
+
+class LateAdminSonarQube(fakes.FakeSonarQube):
+    """
+    Fake SonarQube that turns down the first few sign-ins, as a fresh
+    instance does before it has created its built-in admin user
+    """
+
+    def __init__(self, refusals: int, **kwargs) -> None:
+        self.refusals = refusals
+        super().__init__(**kwargs)
+
+    def validate(self, request: fakes.Request) -> tuple:
+        with self.lock:
+            if self.refusals:
+                self.refusals -= 1
+                return 200, {'valid': False}
+        return super().validate(request)
+
+
+def response(status: int, headers: dict = {}) -> requests.Response:
+    result = requests.Response()
+    result.status_code = status
+    result.headers.update(headers)
+    return result
+
+
+def test_backoff_grows_exponentially_up_to_max_backoff():
+    policy = RetryPolicy(max_attempts=10, backoff_factor=0.5, max_backoff=3,
+                         jitter=False)
+    assert [policy.backoff(attempt) for attempt in range(1, 6)] == \
+        [0.5, 1, 2, 3, 3]
+
+
+def test_jitter_stays_within_backoff():
+    policy = RetryPolicy(backoff_factor=1)
+    assert all(0 <= policy.backoff(3) <= 4 for _ in range(100))
+
+
+def test_next_delay_stops_after_max_attempts():
+    policy = RetryPolicy(max_attempts=3, jitter=False)
+    assert policy.next_delay(2) == 1
+    assert policy.next_delay(3) is None
+
+
+def test_retry_after_takes_precedence():
+    policy = RetryPolicy(jitter=False)
+    assert policy.next_delay(1, response=response(503, {
+        'Retry-After': '7'
+    })) == 7
+
+
+def test_no_retry_past_the_deadline():
+    policy = RetryPolicy(backoff_factor=2, jitter=False)
+    assert policy.next_delay(1, remaining=1.5) is None
+    assert policy.next_delay(1, remaining=2.5) == 2
+
+
+def test_only_idempotent_or_safe_requests_are_retried():
+    policy = RetryPolicy()
+    unavailable = response(503)
+    assert policy.retryable('get', response=unavailable)
+    assert not policy.retryable('post', response=unavailable)
+    assert policy.retryable('post', safe=True, response=unavailable)
+    assert not policy.retryable('get', response=response(500))
+    assert policy.retryable('post', error=requests.exceptions.ConnectTimeout())
+
+
+def test_requests_are_retried_up_to_max_attempts(fake_nexus):
+    policy = RetryPolicy(max_attempts=3, backoff_factor=0)
+    with Nexus(fake_nexus.url, 'admin', 'admin',
+               retry_policy=policy) as api:
+        fake_nexus.reset(error_rate=1.0)
+        with pytest.raises(UnexpectedApiResponse, match='injected failure'):
+            api.list_roles()
+        assert fake_nexus.stats()['requests'] == 3
+
+
+def test_retries_recover_from_injected_failures(fake_nexus):
+    policy = RetryPolicy(max_attempts=20, backoff_factor=0)
+    with Nexus(fake_nexus.url, 'admin', 'admin',
+               retry_policy=policy) as api:
+        fake_nexus.reset(error_rate=0.5)
+        assert {role['id'] for role in api.list_roles()} == \
+            {'nx-admin', 'nx-anonymous'}
+
+
+def test_sign_in_waits_as_long_as_it_always_has_for_sonarqube():
+    delays = []
+    attempt = 1
+    while True:
+        delay = SIGN_IN_POLICY.next_delay(attempt)
+        if delay is None:
+            break
+        delays.append(delay)
+        attempt += 1
+    assert sum(delays) >= 12
+
+
+@pytest.mark.parametrize('refusals, signed_in', [(4, True), (5, False)])
+def test_sonarqube_sign_in_outlasts_a_late_admin_user(refusals, signed_in):
+    fake = LateAdminSonarQube(refusals)
+    url = fake.start()
+    # The same number of attempts as SIGN_IN_POLICY, without the waiting
+    policy = RetryPolicy(max_attempts=SIGN_IN_POLICY.max_attempts,
+                         backoff_factor=0, jitter=False)
+    try:
+        api = SonarQube(url, 'admin', 'admin', sign_in_policy=policy)
+        if signed_in:
+            with api:
+                assert api.search_users('user') == []
+        else:
+            with pytest.raises(UnexpectedApiResponse,
+                               match='Unable to log in'):
+                api.sign_in()
+    finally:
+        fake.stop()
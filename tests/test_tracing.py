@@ -0,0 +1,27 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base.tracing import logging_sink, tracer
+from devsecops.nexus.nexus import Nexus
+
+DEBUG = 3
+
+
+def test_the_logging_sink_is_added_once(fake_nexus):
+    api = Nexus(fake_nexus.url, 'admin', 'admin', verbosity=DEBUG)
+    api.set_verbosity(DEBUG)
+    api.set_verbosity(DEBUG)
+    try:
+        assert tracer.sinks.count(logging_sink) == 1
+    finally:
+        api.set_verbosity(0)
+
+
+def test_the_logging_sink_stays_while_any_handler_is_at_debug(fake_nexus):
+    quiet = Nexus(fake_nexus.url, 'admin', 'admin', verbosity=DEBUG)
+    loud = Nexus(fake_nexus.url, 'admin', 'admin', verbosity=DEBUG)
+    quiet.set_verbosity(0)
+    assert logging_sink in tracer.sinks
+    loud.set_verbosity(1)
+    assert logging_sink not in tracer.sinks
+    assert not tracer.enabled
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: BSD-2-Clause
+
+from devsecops.base import multipart
+from devsecops.base.multipart import MultipartBody, file_checksums
+from devsecops.nexus.nexus import Nexus
+from devsecops.nexus.upload import maven_upload, raw_uploads
+from email.parser import BytesParser
+import email.policy
+import hashlib
+import pytest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    (tmp_path / 'docs').mkdir()
+    (tmp_path / 'docs' / 'guide.txt').write_bytes(b'guide\n' * 1000)
+    (tmp_path / 'notes.txt').write_bytes('notes, ☃\n'.encode('utf-8'))
+    (tmp_path / 'app-1.0.jar').write_bytes(bytes(range(256)) * 64)
+    return tmp_path
+
+
+def parse(body: MultipartBody) -> dict:
+    message = BytesParser(policy=email.policy.HTTP).parsebytes(
+        f'Content-Type: {body.content_type}\r\n\r\n'.encode('utf-8') +
+        b''.join(body)
+    )
+    return {part.get_param('name', header='content-disposition'):
+            part.get_payload(decode=True) for part in message.iter_parts()}
+
+
+def test_multipart_body_has_its_declared_length(tree, monkeypatch):
+    # Small chunks so that files span several of them
+    monkeypatch.setattr(multipart, 'CHUNK_SIZE', 1000)
+    file = str(tree / 'app-1.0.jar')
+    body = MultipartBody([('raw.directory', '/'), ('quote"d', 'x')],
+                         [('raw.asset1', 'app-1.0.jar', file)])
+    data = b''.join(body)
+    assert len(body) == len(data)
+    # It can be sent again, as a retry would
+    assert b''.join(body) == data
+    parts = parse(body)
+    assert parts['raw.asset1'] == (tree / 'app-1.0.jar').read_bytes()
+    assert parts['raw.directory'] == b'/'
+    assert body.checksums[file]['sha256'] == \
+        hashlib.sha256(parts['raw.asset1']).hexdigest()
+    assert body.checksums[file] == file_checksums(file)
+
+
+def test_raw_uploads_keep_relative_paths(tree):
+    uploads = raw_uploads([str(tree / 'docs'), str(tree / 'notes.txt')],
+                          '/site')
+    assert [upload.path for upload in uploads] == \
+        ['site/guide.txt', 'site/notes.txt']
+    uploads = raw_uploads([str(tree)], 'site')
+    assert [upload.path for upload in uploads] == \
+        ['site/app-1.0.jar', 'site/notes.txt', 'site/docs/guide.txt']
+
+
+def test_maven_uploads_take_coordinates_from_the_file_name(tree):
+    upload = maven_upload(str(tree / 'app-1.0.jar'), 'org.example', 'app',
+                          '1.0')
+    assert upload.path == 'org/example/app/1.0/app-1.0.jar'
+    assert ('maven2.asset1.extension', 'jar') in upload.fields
+
+
+def test_uploads_reach_the_server_once(tree, fake_nexus):
+    uploads = raw_uploads([str(tree / 'docs'), str(tree / 'notes.txt')])
+    uploads.append(maven_upload(str(tree / 'app-1.0.jar'), 'org.example',
+                                'app', '1.0'))
+    with Nexus(fake_nexus.url, 'admin', 'admin') as api:
+        first = api.upload('raw-hosted', uploads[:2], parallel=2)
+        first += api.upload('maven-releases', uploads[2:])
+        again = api.upload('raw-hosted', uploads[:2], parallel=2)
+    assert [result.error for result in first] == [None] * 3
+    assert [result.value['action'] for result in first] == ['uploaded'] * 3
+    assert [result.value['action'] for result in again] == ['unchanged'] * 2
+    for upload, result in zip(uploads, first):
+        assert result.value['sha1'] == file_checksums(upload.file)['sha1']
+    assert fake_nexus.blobs[('raw-hosted', 'notes.txt')] == \
+        (tree / 'notes.txt').read_bytes()
+    assert fake_nexus.blobs[
+        ('maven-releases', 'org/example/app/1.0/app-1.0.jar')
+    ] == (tree / 'app-1.0.jar').read_bytes()